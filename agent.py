@@ -0,0 +1,186 @@
+import gzip
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+
+import requests
+
+MONITOR_MODE = os.getenv("MONITOR_MODE", "standalone")  # standalone, agent (invia a un collector) o collector
+
+
+def flatten(data, prefix="", out=None):
+    """
+    Dizionari annidati -> {"a/b/c": valore}; liste e valori semplici restano foglie.
+    Il separatore e' "/", che non puo' comparire nei nomi delle interfacce (il punto si', es. eth0.100).
+    """
+    out = {} if out is None else out
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            flatten(value, path + "/", out)
+        else:
+            out[path] = value
+    return out
+
+
+def unflatten(flat):
+    """Inverso di flatten()"""
+    data = {}
+    for path, value in flat.items():
+        node = data
+        *parents, leaf = path.split("/")
+        for key in parents:
+            node = node.setdefault(key, {})
+        node[leaf] = value
+    return data
+
+
+def delta_encode(previous, current):
+    """Differenze tra due stati appiattiti: (valori nuovi o cambiati, chiavi rimosse)"""
+    changed = {path: value for path, value in current.items()
+               if path not in previous or previous[path] != value}
+    removed = [path for path in previous if path not in current]
+    return changed, removed
+
+
+def apply_delta(state, changed, removed):
+    """Applica a uno stato appiattito il risultato di delta_encode()"""
+    for path in removed:
+        state.pop(path, None)
+    state.update(changed)
+    return state
+
+
+class AgentPusher:
+    """
+    Agente della modalita' multi-host: invia al collector lo stato del server e gli allarmi.
+
+    Ogni `interval` secondi (o subito, con almeno `min_spacing` secondi di distanza, quando c'e'
+    un allarme) un thread invia una POST con l'ultimo stato e tutti gli eventi accumulati, in
+    JSON compresso con gzip. Lo stato e' codificato come differenza rispetto all'ultimo stato
+    confermato dal collector (`base`); se il collector non ha quella base (riavvio, risposta
+    persa) risponde 409 e al giro successivo viene inviato lo stato completo. Gli eventi restano
+    in coda finche' non vengono confermati (al massimo `max_events`, poi si scartano i piu'
+    vecchi).
+    """
+
+    def __init__(self, url, token, name, state_func, interval=10.0, min_spacing=1.0, max_events=1000,
+                 timeout=10.0, full_every=360, session=None):
+        self.url = url.rstrip("/") + "/agent/push"
+        self.token = token
+        self.name = name
+        self.state_func = state_func  # Restituisce lo stato corrente (dizionario annidato)
+        self.interval = interval
+        self.min_spacing = min_spacing
+        self.timeout = timeout
+        self.full_every = full_every  # Invio completo periodico, anche senza errori
+        self.agent_id = uuid.uuid4().hex  # Cambia a ogni avvio: il collector riparte dallo stato completo
+        self.session = session or requests.Session()
+        self._events = deque(maxlen=max_events)  # (numero progressivo, evento)
+        self._event_seq = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._seq = 0
+        self._acked = None  # (seq, stato appiattito) confermato dal collector
+        self._pushes_since_full = 0
+        self._last_push = 0.0
+        self.counters = {"pushes": 0, "full": 0, "errors": 0, "resync": 0, "bytes": 0, "events": 0,
+                         "dropped_events": 0}
+
+    def add_event(self, message):
+        """Accoda un allarme per il collector e anticipa l'invio"""
+        with self._cond:
+            if len(self._events) == self._events.maxlen:
+                self.counters["dropped_events"] += 1
+            self._event_seq += 1
+            self._events.append((self._event_seq, {"ts": time.time(), "message": message}))
+            self._cond.notify()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="agent-pusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = self._last_push + self.interval
+                while not self._events and time.monotonic() < deadline:
+                    self._cond.wait(deadline - time.monotonic())
+                # Raggruppa gli allarmi arrivati a breve distanza
+                spacing = self._last_push + self.min_spacing - time.monotonic()
+            if spacing > 0:
+                time.sleep(spacing)
+            try:
+                status = self.push_once()
+            except Exception as e:
+                self.counters["errors"] += 1
+                print(f"Errore nell'invio al collector {self.url}: {e}")
+                status = None
+            if status not in (200, 409):
+                time.sleep(self.interval)  # Collector non raggiungibile: niente tentativi ravvicinati
+
+    def build_payload(self):
+        """Prossimo messaggio: (payload, stato appiattito, ultimo evento incluso)"""
+        state = flatten(self.state_func())
+        with self._cond:
+            events = list(self._events)
+        last_event = events[-1][0] if events else 0
+        self._seq += 1
+        payload = {"host": self.name, "agent_id": self.agent_id, "seq": self._seq, "interval": self.interval,
+                   "events": [event for _, event in events]}
+        if self._acked is None or self._pushes_since_full >= self.full_every:
+            payload.update(full=True, values=state)
+        else:
+            changed, removed = delta_encode(self._acked[1], state)
+            payload.update(full=False, base=self._acked[0], values=changed, removed=removed)
+        return payload, state, last_event
+
+    def push_once(self):
+        """Invia stato ed eventi; restituisce lo stato HTTP della risposta"""
+        payload, state, last_event = self.build_payload()
+        self._last_push = time.monotonic()
+        body = gzip.compress(json.dumps(payload, separators=(",", ":")).encode(), 6)
+        response = self.session.post(self.url, data=body, timeout=self.timeout, headers={
+            "Content-Type": "application/json", "Content-Encoding": "gzip", "X-Agent-Token": self.token})
+        self.counters["pushes"] += 1
+        self.counters["bytes"] += len(body)
+        if response.status_code in (200, 409):
+            # Gli eventi sono stati accettati anche se lo stato va reinviato per intero
+            self.counters["events"] += len(payload["events"])
+            with self._cond:
+                while self._events and self._events[0][0] <= last_event:
+                    self._events.popleft()
+        if response.status_code == 200:
+            if payload["full"]:
+                self.counters["full"] += 1
+                self._pushes_since_full = 0
+            else:
+                self._pushes_since_full += 1
+            self._acked = (payload["seq"], state)
+        elif response.status_code == 409:
+            self.counters["resync"] += 1
+            self._acked = None
+        else:
+            self.counters["errors"] += 1
+            print(f"Il collector ha risposto {response.status_code}: {response.text[:200]}")
+        return response.status_code
+
+    def stats(self):
+        with self._cond:
+            return dict(self.counters, pending_events=len(self._events))
+
+
+def create_agent(state_func):
+    """Agente configurato dalle variabili COLLECTOR_URL, AGENT_TOKEN, AGENT_NAME, AGENT_INTERVAL"""
+    url = os.getenv("COLLECTOR_URL")
+    token = os.getenv("AGENT_TOKEN")
+    if not url or not token:
+        print("Modalita' agente: COLLECTOR_URL e AGENT_TOKEN sono obbligatori")
+        return None
+    name = os.getenv("AGENT_NAME") or socket.gethostname()
+    return AgentPusher(url, token, name, state_func, interval=float(os.getenv("AGENT_INTERVAL", 10)))
@@ -0,0 +1,231 @@
+import threading
+import time
+
+TELEGRAM_MAX_LENGTH = 4096
+
+
+def split_message(parts, limit=TELEGRAM_MAX_LENGTH, separator="\n\n"):
+    """
+    Unisce piu' messaggi in blocchi di al massimo `limit` caratteri, spezzando solo tra un
+    messaggio e l'altro (un singolo messaggio troppo lungo viene spezzato per righe o, al limite,
+    per caratteri).
+    """
+    chunks = []
+    current = ""
+    for part in parts:
+        pieces = [part]
+        if len(part) > limit:
+            pieces = []
+            for line in part.split("\n"):
+                while len(line) > limit:
+                    pieces.append(line[:limit])
+                    line = line[limit:]
+                if pieces and len(pieces[-1]) + 1 + len(line) <= limit:
+                    pieces[-1] += "\n" + line
+                else:
+                    pieces.append(line)
+        for piece in pieces:
+            if not current:
+                current = piece
+            elif len(current) + len(separator) + len(piece) <= limit:
+                current += separator + piece
+            else:
+                chunks.append(current)
+                current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class AlertState:
+    """Stato di un allarme (metrica o sorgente SSH)"""
+    __slots__ = ("firing", "last_sent", "suppressed", "summary")
+
+    def __init__(self, firing=False, last_sent=None, suppressed=0, summary=None):
+        self.firing = firing
+        self.last_sent = last_sent  # Istante (clock) dell'ultimo messaggio inviato
+        self.suppressed = suppressed  # Eventi soppressi durante il cooldown
+        self.summary = summary  # Formato del riepilogo degli eventi soppressi
+
+    def in_cooldown(self, now, cooldown):
+        return self.last_sent is not None and now - self.last_sent < cooldown
+
+
+class AlertManager:
+    """
+    Macchina a stati degli allarmi con isteresi, cooldown e digest.
+
+    - Soglie: l'allarme parte sulla transizione OK -> sopra soglia; finche' resta sopra soglia
+      viene ripetuto al massimo una volta per cooldown; il rientro viene notificato solo quando
+      il valore scende sotto (soglia - isteresi).
+    - Eventi (es. accessi SSH per IP): il primo viene inviato subito, senza attendere il digest;
+      i successivi entro il cooldown vengono contati e riassunti in un unico messaggio alla
+      scadenza.
+    - Gli altri messaggi prodotti nella stessa finestra vengono uniti in un digest, spezzato al
+      limite di 4096 caratteri di Telegram.
+
+    Gli stati tornati a riposo (non attivi, senza eventi soppressi e con cooldown scaduto) vengono
+    scartati da tick(), cosi' le chiavi per IP non si accumulano durante attacchi distribuiti.
+
+    Con uno StateStore (`store`) ogni messaggio viene aggiunto allo storico e lo stato degli
+    allarmi sopravvive ai riavvii (vedi restore()), cosi' cooldown e allarmi attivi non
+    ripartono da zero.
+    """
+
+    def __init__(self, send_func, cooldown=600, hysteresis=5, digest_window=5, clock=time.monotonic,
+                 store=None):
+        self.send_func = send_func
+        self.store = store
+        self.cooldown = cooldown
+        self.hysteresis = hysteresis
+        self.digest_window = digest_window
+        self.clock = clock
+        self.states = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def configure(self, config):
+        """Aggiorna i parametri dalla configurazione"""
+        self.cooldown = config.get("alert_cooldown", self.cooldown)
+        self.hysteresis = config.get("alert_hysteresis", self.hysteresis)
+        self.digest_window = config.get("alert_digest_window", self.digest_window)
+
+    def restore(self):
+        """Ricarica dallo store lo stato degli allarmi salvato prima dell'ultimo arresto"""
+        if self.store is None:
+            return
+        now, wall = self.clock(), time.time()
+        with self._lock:
+            for key, (firing, last_sent, suppressed, summary) in self.store.load_alert_states().items():
+                # Lo store usa istanti assoluti, il gestore il proprio clock (monotono)
+                if last_sent is not None:
+                    last_sent = now - (wall - last_sent)
+                self.states[key] = AlertState(firing, last_sent, suppressed, summary)
+
+    def _persist(self, key, state):
+        # Chiamato con il lock acquisito
+        if self.store is None:
+            return
+        last_sent = None
+        if state.last_sent is not None:
+            last_sent = time.time() - (self.clock() - state.last_sent)
+        self.store.set_alert_state(key, state.firing, last_sent, state.suppressed, state.summary)
+
+    def _state(self, key):
+        state = self.states.get(key)
+        if state is None:
+            state = self.states[key] = AlertState()
+        return state
+
+    def check_threshold(self, key, value, threshold, fire_message, recover_message, hysteresis=None):
+        """
+        Valuta una metrica rispetto alla soglia e accoda gli eventuali messaggi.
+        `hysteresis` sostituisce il margine configurato (utile per metriche non percentuali).
+        """
+        hysteresis = self.hysteresis if hysteresis is None else hysteresis
+        now = self.clock()
+        with self._lock:
+            state = self._state(key)
+            if value > threshold:
+                if not state.firing or not state.in_cooldown(now, self.cooldown):
+                    state.firing = True
+                    state.last_sent = now
+                    self._queue(fire_message, key)
+                    self._persist(key, state)
+            elif state.firing and value < threshold - hysteresis:
+                state.firing = False
+                self._queue(recover_message, key)
+                self._persist(key, state)
+
+    def event(self, key, message, summary_format=None):
+        """
+        Notifica un evento puntuale: inviato subito se la chiave non e' in cooldown, altrimenti
+        conteggiato. `summary_format` (con {count}) descrive gli eventi soppressi.
+        """
+        now = self.clock()
+        with self._lock:
+            state = self._state(key)
+            if not state.in_cooldown(now, self.cooldown):
+                state.last_sent = now
+                self._queue(message, key, immediate=True)
+                self._persist(key, state)
+                return True
+            state.suppressed += 1
+            state.summary = summary_format
+            self._persist(key, state)
+            return False
+
+    def notify(self, message):
+        """Accoda un messaggio senza cooldown (es. riavvio del server)"""
+        with self._lock:
+            self._queue(message)
+
+    def tick(self):
+        """
+        Da chiamare periodicamente: riassume gli eventi soppressi con cooldown scaduto e scarta
+        gli stati a riposo.
+        """
+        now = self.clock()
+        with self._lock:
+            idle = []
+            for key, state in self.states.items():
+                if state.in_cooldown(now, self.cooldown):
+                    continue
+                if state.suppressed:
+                    summary = state.summary or "{count} ulteriori eventi per " + str(key)
+                    self._queue(summary.format(count=state.suppressed), key)
+                    state.suppressed = 0
+                    state.summary = None
+                    state.last_sent = now
+                    self._persist(key, state)
+                elif not state.firing:
+                    idle.append(key)  # Equivalente a uno stato nuovo
+            for key in idle:
+                del self.states[key]
+                if self.store is not None:
+                    self.store.delete_alert_state(key)
+
+    def state_count(self):
+        """Stati degli allarmi tenuti in memoria"""
+        with self._lock:
+            return len(self.states)
+
+    def _queue(self, message, key=None, immediate=False):
+        # Chiamato con il lock acquisito
+        if self.store is not None:
+            self.store.add_alert(key, message)
+        if immediate:
+            # Eventi di sicurezza: nessuna attesa, indipendentemente dal digest
+            for chunk in split_message([message]):
+                self.send_func(chunk)
+            return
+        self._pending.append(message)
+        if self.digest_window <= 0:
+            self._flush_locked()
+        elif self._timer is None:
+            self._timer = threading.Timer(self.digest_window, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def pending_count(self):
+        """Messaggi in attesa del prossimo digest"""
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Invia subito i messaggi in attesa come digest"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        if len(pending) > 1:
+            pending[0] = f"*Riepilogo allarmi* ({len(pending)})\n\n" + pending[0]
+        for chunk in split_message(pending):
+            self.send_func(chunk)
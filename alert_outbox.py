@@ -0,0 +1,186 @@
+import heapq
+import random
+import threading
+import time
+from collections import deque
+
+from telegram.error import RetryAfter, BadRequest, Unauthorized
+
+
+class TokenBucket:
+    """Token bucket: `rate` token al secondo, fino a `capacity` token accumulabili"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now=None):
+        """Secondi da attendere prima che sia disponibile un token"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self, now=None):
+        self._refill(time.monotonic() if now is None else now)
+        self.tokens -= 1
+
+
+class OutboxMessage:
+    __slots__ = ("chat_id", "text", "parse_mode", "attempts", "enqueued_at")
+
+    def __init__(self, chat_id, text, parse_mode):
+        self.chat_id = chat_id
+        self.text = text
+        self.parse_mode = parse_mode
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+
+class AlertOutbox:
+    """
+    Coda di uscita in-process per i messaggi Telegram.
+
+    enqueue() ritorna subito; un thread dedicato invia i messaggi rispettando i limiti di
+    Telegram (globale e per chat, con token bucket), ritenta gli errori temporanei con backoff
+    esponenziale e jitter e rispetta RetryAfter. La coda e' limitata: quando e' piena il
+    messaggio piu' vecchio viene scartato e conteggiato.
+    """
+
+    def __init__(self, send_func, maxsize=500, global_rate=30.0, chat_rate=1.0, chat_burst=3,
+                 group_rate=20 / 60, max_retries=5, base_delay=1.0, max_delay=60.0, instruments=None):
+        self.send_func = send_func
+        self.instruments = instruments  # Instrumentation: durata degli invii e ritardo dall'accodamento
+        self.maxsize = maxsize
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets = {}
+        self._queue = deque()
+        self._retry = []  # heap di (istante, sequenza, messaggio)
+        self._retry_seq = 0
+        self._paused_until = 0.0  # Impostato da RetryAfter: sospende tutti gli invii
+        self._cond = threading.Condition()
+        self._thread = None
+        self.counters = {"enqueued": 0, "sent": 0, "dropped": 0, "failed": 0, "retries": 0}
+
+    def stats(self):
+        with self._cond:
+            return dict(self.counters, depth=len(self._queue) + len(self._retry))
+
+    def enqueue(self, chat_id, text, parse_mode=None):
+        """Accoda un messaggio senza bloccare; restituisce False se e' stato necessario scartarne uno"""
+        self.start()
+        dropped = False
+        with self._cond:
+            if len(self._queue) + len(self._retry) >= self.maxsize:
+                if self._queue:
+                    self._queue.popleft()
+                else:
+                    heapq.heappop(self._retry)
+                self.counters["dropped"] += 1
+                dropped = True
+            self._queue.append(OutboxMessage(chat_id, text, parse_mode))
+            self.counters["enqueued"] += 1
+            self._cond.notify()
+        if dropped:
+            print("Coda messaggi Telegram piena: scartato il messaggio piu' vecchio")
+        return not dropped
+
+    def start(self):
+        if self._thread is None:
+            with self._cond:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="alert-outbox", daemon=True)
+                    self._thread.start()
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # I gruppi (chat id negativi) hanno un limite piu' basso
+            is_group = str(chat_id).startswith("-")
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = self._chat_buckets[chat_id] = TokenBucket(rate, self.chat_burst)
+        return bucket
+
+    def _next_message(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._retry and self._retry[0][0] <= now:
+                    return heapq.heappop(self._retry)[2]
+                if self._queue:
+                    return self._queue.popleft()
+                self._cond.wait(self._retry[0][0] - now if self._retry else None)
+
+    def _schedule_retry(self, message, delay):
+        with self._cond:
+            self._retry_seq += 1
+            heapq.heappush(self._retry, (time.monotonic() + delay, self._retry_seq, message))
+            self.counters["retries"] += 1
+
+    def _backoff(self, attempts):
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)  # jitter
+
+    def _wait_for_tokens(self, chat_id):
+        bucket = self._chat_bucket(chat_id)
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+        while True:
+            delay = max(self._global_bucket.delay(), bucket.delay())
+            if delay <= 0:
+                break
+            time.sleep(delay)
+        now = time.monotonic()
+        self._global_bucket.consume(now)
+        bucket.consume(now)
+
+    def _run(self):
+        while True:
+            message = self._next_message()
+            self._wait_for_tokens(message.chat_id)
+            message.attempts += 1
+            start = time.monotonic()
+            try:
+                self.send_func(message.chat_id, message.text, message.parse_mode)
+            except RetryAfter as e:
+                # Limite superato: Telegram indica quanto attendere
+                print(f"Limite Telegram raggiunto, nuovo tentativo tra {e.retry_after}s")
+                self._paused_until = time.monotonic() + float(e.retry_after)
+                self._schedule_retry(message, float(e.retry_after))
+                continue
+            except (BadRequest, Unauthorized) as e:
+                # Errore permanente (messaggio non valido, token revocato): inutile riprovare
+                print(f"Errore invio messaggio Telegram (non recuperabile): {e}")
+                with self._cond:
+                    self.counters["failed"] += 1
+                continue
+            except Exception as e:  # NetworkError, TimedOut e altri errori temporanei
+                if message.attempts < self.max_retries:
+                    delay = self._backoff(message.attempts)
+                    print(f"Errore invio messaggio Telegram (tentativo {message.attempts}/{self.max_retries}), "
+                          f"nuovo tentativo tra {delay:.1f}s: {e}")
+                    self._schedule_retry(message, delay)
+                else:
+                    print(f"Errore invio messaggio Telegram (tutti i tentativi falliti): {e}")
+                    with self._cond:
+                        self.counters["failed"] += 1
+                continue
+            if self.instruments is not None:
+                end = time.monotonic()
+                self.instruments.observe("telegram.send", end - start)
+                self.instruments.observe("telegram.delay", end - message.enqueued_at)
+            with self._cond:
+                self.counters["sent"] += 1
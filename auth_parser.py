@@ -0,0 +1,166 @@
+import re
+from collections import namedtuple
+from datetime import datetime, date, timedelta
+
+# Evento di accesso SSH estratto da auth.log
+SSHLogin = namedtuple("SSHLogin", ["timestamp", "hostname", "username", "source_ip", "method", "raw_timestamp"])
+# Tentativo di accesso SSH fallito; kind: "failed", "invalid_user" o "preauth_closed";
+# port (porta di origine, se presente) identifica con l'IP la connessione a cui appartiene la riga
+SSHFailure = namedtuple("SSHFailure", ["timestamp", "hostname", "username", "source_ip", "kind", "raw_timestamp",
+                                       "port"], defaults=(None,))
+
+_MONTHS = {m: i for i, m in enumerate(
+    (b"Jan", b"Feb", b"Mar", b"Apr", b"May", b"Jun", b"Jul", b"Aug", b"Sep", b"Oct", b"Nov", b"Dec"), 1)}
+
+_TIMESTAMP = (rb'(?:(?P<syslog>[A-Z][a-z]{2}\s+\d{1,2}\s+\d{2}:\d{2}:\d{2})'
+              rb'|(?P<rfc3339>\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?))')
+
+# Esempio syslog:   May 19 09:08:01 hostname sshd[1234]: Accepted password for username from 192.168.1.1 port 12345 ssh2
+# Esempio RFC 3339: 2024-05-19T09:08:01.123456+02:00 hostname sshd[1234]: Accepted publickey for username from ...
+_ACCEPTED_PATTERN = re.compile(
+    _TIMESTAMP +
+    rb'\s+(?P<host>\S+)\s+sshd\[\d+\]:\s+Accepted\s+(?P<method>\S+)\s+for\s+(?P<user>\S+)\s+from\s+(?P<ip>\S+)')
+
+# Tentativi falliti, es.:
+#   sshd[1234]: Failed password for [invalid user ]root from 203.0.113.5 port 4242 ssh2
+#   sshd[1234]: Invalid user admin from 203.0.113.5 port 4242
+#   sshd[1234]: Connection closed by authenticating user root 203.0.113.5 port 4242 [preauth]
+_FAILED_PATTERN = re.compile(
+    _TIMESTAMP +
+    rb'\s+(?P<host>\S+)\s+sshd\[\d+\]:\s+(?:'
+    rb'Failed \S+ for (?:invalid user )?(?P<f_user>\S*) from (?P<f_ip>\S+)(?: port (?P<f_port>\d+))?'
+    rb'|Invalid user (?P<i_user>\S*) from (?P<i_ip>\S+)(?: port (?P<i_port>\d+))?'
+    rb'|Connection closed by (?:authenticating|invalid) user (?P<c_user>\S*) (?P<c_ip>\S+) port (?P<c_port>\d+))')
+
+
+class AuthLogParser:
+    """
+    Parser delle righe di auth.log, ottimizzato per log dominati da rumore (PAM, cron, sudo).
+
+    Lavora direttamente su bytes e a blocchi: le righe senza "sshd[" o senza una delle parole
+    chiave ("Accepted ", "Failed ", "Invalid user ", "Connection closed by ") vengono scartate
+    con una semplice ricerca di sottostringa, prima di qualsiasi regex.
+    La data delle intestazioni syslog ("May 19") viene risolta una sola volta e memorizzata;
+    l'anno mancante viene dedotto tenendo conto del cambio d'anno.
+    """
+
+    def __init__(self, now=datetime.now):
+        self._now = now
+        self._date_cache = {}
+        self._cache_day = None
+        self._last_timestamp = (None, None)  # Ultima intestazione syslog convertita e risultato
+        # Righe esaminate, righe sshd, ricerche e match delle due regex
+        self.counters = {"lines": 0, "sshd": 0, "accepted_searches": 0, "accepted_matches": 0,
+                         "failed_searches": 0, "failed_matches": 0}
+
+    def parse_batch(self, lines, failures=True):
+        """
+        Restituisce gli eventi SSH presenti in una lista di righe bytes: accessi (SSHLogin) e,
+        con `failures`, tentativi falliti (SSHFailure), nell'ordine del log.
+        """
+        today = self._now().date()
+        if today != self._cache_day:
+            # L'anno dedotto dipende dalla data corrente: le cache valgono per un solo giorno
+            self._date_cache.clear()
+            self._last_timestamp = (None, None)
+            self._cache_day = today
+        events = []
+        search_accepted = _ACCEPTED_PATTERN.search
+        search_failed = _FAILED_PATTERN.search
+        sshd = accepted_searches = failed_searches = failures_found = 0
+        for line in lines:
+            # Prefiltro economico: la grande maggioranza delle righe si ferma qui
+            if b"sshd[" not in line:
+                continue
+            sshd += 1
+            if b"Accepted " in line:
+                accepted_searches += 1
+                match = search_accepted(line)
+                if match is None:
+                    continue
+                syslog_ts, rfc3339_ts, host, method, user, ip = match.groups()
+                timestamp, raw_ts = self._parse_timestamp(syslog_ts, rfc3339_ts)
+                events.append(SSHLogin(timestamp, host.decode(errors="replace"), user.decode(errors="replace"),
+                                       ip.decode(errors="replace"), method.decode(errors="replace"), raw_ts))
+            elif failures and (b"Failed " in line or b"Invalid user " in line or b"Connection closed by " in line):
+                failed_searches += 1
+                match = search_failed(line)
+                if match is None:
+                    continue
+                failures_found += 1
+                (syslog_ts, rfc3339_ts, host, f_user, f_ip, f_port, i_user, i_ip, i_port,
+                 c_user, c_ip, c_port) = match.groups()
+                if f_ip is not None:
+                    kind, user, ip, port = "failed", f_user, f_ip, f_port
+                elif i_ip is not None:
+                    kind, user, ip, port = "invalid_user", i_user, i_ip, i_port
+                else:
+                    kind, user, ip, port = "preauth_closed", c_user, c_ip, c_port
+                timestamp, raw_ts = self._parse_timestamp(syslog_ts, rfc3339_ts)
+                events.append(SSHFailure(timestamp, host.decode(errors="replace"), user.decode(errors="replace"),
+                                         ip.decode(errors="replace"), kind, raw_ts,
+                                         int(port) if port is not None else None))
+        counters = self.counters
+        counters["lines"] += len(lines)
+        counters["sshd"] += sshd
+        counters["accepted_searches"] += accepted_searches
+        counters["accepted_matches"] += len(events) - failures_found
+        counters["failed_searches"] += failed_searches
+        counters["failed_matches"] += failures_found
+        return events
+
+    def _parse_timestamp(self, syslog_ts, rfc3339_ts):
+        """(datetime oppure None, timestamp originale come stringa)"""
+        if syslog_ts is not None:
+            # Durante un attacco molte righe consecutive hanno lo stesso secondo
+            raw, parsed = self._last_timestamp
+            if raw != syslog_ts:
+                parsed = (self._parse_syslog(syslog_ts), syslog_ts.decode())
+                self._last_timestamp = (syslog_ts, parsed)
+            return parsed
+        return self._parse_rfc3339(rfc3339_ts), rfc3339_ts.decode()
+
+    def _resolve_date(self, month_day):
+        """Converte "May 19" in una data completa, usando la cache per prefisso"""
+        today = self._cache_day
+        resolved = self._date_cache.get(month_day)
+        if resolved is None:
+            month_name, day = month_day.split()
+            month = _MONTHS[month_name]
+            day = int(day)
+            resolved = None
+            # syslog non include l'anno: una data "nel futuro" appartiene all'anno precedente
+            # (es. righe del 31 dicembre lette il 1 gennaio). Il 29 febbraio puo' risalire a piu' anni fa.
+            for year in range(today.year, today.year - 5, -1):
+                try:
+                    candidate = date(year, month, day)
+                except ValueError:
+                    continue
+                if candidate <= today + timedelta(days=1):
+                    resolved = candidate
+                    break
+            self._date_cache[month_day] = resolved
+        return resolved
+
+    def _parse_syslog(self, raw):
+        try:
+            month_day, clock = raw.rsplit(None, 1)
+            resolved = self._resolve_date(b" ".join(month_day.split()))
+            if resolved is None:
+                return None
+            return datetime(resolved.year, resolved.month, resolved.day,
+                            int(clock[0:2]), int(clock[3:5]), int(clock[6:8]))
+        except (KeyError, ValueError) as e:
+            print(f"Errore nella lettura della data {raw!r}: {e}")
+            return None
+
+    def _parse_rfc3339(self, raw):
+        try:
+            timestamp = datetime.fromisoformat(raw.decode())
+        except ValueError as e:
+            print(f"Errore nella lettura della data {raw!r}: {e}")
+            return None
+        if timestamp.tzinfo is not None:
+            # Converte nell'ora locale, come le intestazioni syslog
+            timestamp = timestamp.astimezone().replace(tzinfo=None)
+        return timestamp
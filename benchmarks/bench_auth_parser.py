@@ -0,0 +1,130 @@
+"""
+Benchmark del parsing di auth.log su un log sintetico (per default 1 GB).
+
+Genera un file con prevalenza di rumore PAM/cron/sudo e una piccola quota di righe sshd,
+poi lo legge con LogTailer + AuthLogParser e riporta righe/s e MB/s. Per confronto misura
+anche il parser originale (decode + regex per riga + strptime) su un campione.
+
+Uso: python benchmarks/bench_auth_parser.py [--size-mb 1024] [--keep]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth_parser import AuthLogParser
+from log_tailer import LogTailer
+
+NOISE_TEMPLATES = [
+    "{ts} {host} CRON[{pid}]: pam_unix(cron:session): session opened for user root(uid=0) by (uid=0)",
+    "{ts} {host} CRON[{pid}]: pam_unix(cron:session): session closed for user root",
+    "{ts} {host} sudo:   deploy : TTY=pts/0 ; PWD=/home/deploy ; USER=root ; COMMAND=/usr/bin/systemctl status nginx",
+    "{ts} {host} sudo: pam_unix(sudo:session): session opened for user root(uid=0) by deploy(uid=1000)",
+    "{ts} {host} systemd-logind[{pid}]: New session 1234 of user deploy.",
+    "{ts} {host} sshd[{pid}]: pam_unix(sshd:session): session opened for user deploy(uid=1000) by (uid=0)",
+    "{ts} {host} sshd[{pid}]: Received disconnect from {ip} port {port}:11: disconnected by user",
+]
+ACCEPTED_TEMPLATE = "{ts} {host} sshd[{pid}]: Accepted {method} for {user} from {ip} port {port} ssh2"
+
+
+def build_block(rng, lines=20000, accepted_ratio=0.002):
+    """Costruisce un blocco di righe sintetiche da ripetere fino alla dimensione richiesta"""
+    out = []
+    for i in range(lines):
+        ts = f"May {rng.randint(1, 28):2d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"
+        fields = dict(ts=ts, host="bastion01", pid=rng.randint(100, 99999),
+                      ip=f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+                      port=rng.randint(1024, 65535), method=rng.choice(["password", "publickey"]),
+                      user=rng.choice(["root", "deploy", "admin"]))
+        template = ACCEPTED_TEMPLATE if rng.random() < accepted_ratio else rng.choice(NOISE_TEMPLATES)
+        out.append(template.format(**fields))
+    return ("\n".join(out) + "\n").encode()
+
+
+def generate_log(path, size_mb, seed=1):
+    block = build_block(random.Random(seed))
+    target = size_mb * 1024 * 1024
+    written = 0
+    with open(path, "wb") as f:
+        while written < target:
+            f.write(block)
+            written += len(block)
+    return written
+
+
+def legacy_parse(lines):
+    """Implementazione originale di check_auth_log (regex ricompilata, strptime per ogni match)"""
+    ssh_pattern = re.compile(r'(\w+\s+\d+\s+\d+:\d+:\d+)\s+(\S+)\s+sshd\[\d+\]:\s+Accepted\s+\S+\s+for\s+(\S+)\s+from\s+(\S+)')
+    found = 0
+    for line in lines:
+        match = ssh_pattern.search(line)
+        if match:
+            datetime.strptime(f"{match.group(1)} {datetime.now().year}", "%b %d %H:%M:%S %Y")
+            found += 1
+    return found
+
+
+def run(size_mb, keep=False, workdir=None):
+    workdir = workdir or tempfile.mkdtemp(prefix="bench-auth-")
+    log_path = os.path.join(workdir, "auth.log")
+    state_path = os.path.join(workdir, "position.json")
+
+    start = time.perf_counter()
+    size = generate_log(log_path, size_mb)
+    generate_time = time.perf_counter() - start
+
+    tailer = LogTailer(log_path, state_path)
+    parser = AuthLogParser()
+    lines = events = 0
+    start = time.perf_counter()
+    for batch in tailer.read_batches():
+        lines += len(batch)
+        events += len(parser.parse_batch(batch))
+    elapsed = time.perf_counter() - start
+    tailer.close()
+
+    with open(log_path, "rb") as f:
+        sample = f.read(8 * 1024 * 1024).decode().splitlines()
+    start = time.perf_counter()
+    legacy_parse(sample)
+    legacy_elapsed = time.perf_counter() - start
+
+    if not keep:
+        os.unlink(log_path)
+        if os.path.exists(state_path):
+            os.unlink(state_path)
+        os.rmdir(workdir)
+
+    return {
+        "size_mb": size / (1024 * 1024),
+        "generate_s": generate_time,
+        "lines": lines,
+        "events": events,
+        "elapsed_s": elapsed,
+        "lines_per_s": lines / elapsed,
+        "mb_per_s": size / (1024 * 1024) / elapsed,
+        "legacy_lines_per_s": len(sample) / legacy_elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=1024)
+    parser.add_argument("--keep", action="store_true", help="non cancellare il log generato")
+    args = parser.parse_args()
+
+    result = run(args.size_mb, args.keep)
+    print(f"Log sintetico: {result['size_mb']:.0f} MB, {result['lines']:,} righe "
+          f"({result['events']:,} accessi), generato in {result['generate_s']:.1f} s")
+    print(f"Tailer + parser: {result['lines_per_s']:,.0f} righe/s, {result['mb_per_s']:.1f} MB/s")
+    print(f"Parser originale: {result['legacy_lines_per_s']:,.0f} righe/s")
+
+
+if __name__ == "__main__":
+    main()
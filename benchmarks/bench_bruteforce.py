@@ -0,0 +1,113 @@
+"""
+Benchmark del rilevatore di attacchi brute-force su tentativi SSH falliti sintetici.
+
+Genera righe "Failed password" / "Invalid user" / "Connection closed by authenticating user"
+provenienti da una botnet di molti IP (per default 1 milione) piu' alcuni attaccanti insistenti,
+poi misura parser + BruteForceDetector (righe/s) e, separatamente, la memoria occupata dai
+contatori, che resta limitata dalla capacita' LRU indipendentemente dal numero di IP.
+
+Uso: python benchmarks/bench_bruteforce.py [--lines 2000000] [--ips 1000000] [--max-ips 20000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth_parser import AuthLogParser, SSHFailure
+from bruteforce import BruteForceDetector
+
+FAILED_TEMPLATES = [
+    "{ts} bastion01 sshd[{pid}]: Failed password for {user} from {ip} port {port} ssh2",
+    "{ts} bastion01 sshd[{pid}]: Failed password for invalid user {user} from {ip} port {port} ssh2",
+    "{ts} bastion01 sshd[{pid}]: Invalid user {user} from {ip} port {port}",
+    "{ts} bastion01 sshd[{pid}]: Connection closed by authenticating user {user} {ip} port {port} [preauth]",
+]
+NOISE = "{ts} bastion01 CRON[{pid}]: pam_unix(cron:session): session closed for user root"
+USERS = ["root", "admin", "test", "oracle", "ubuntu", "postgres", "git", "user"]
+
+
+def random_ip(rng, pool):
+    """Uno dei `pool` IP della botnet, sparsi su tutto lo spazio IPv4 pubblico"""
+    n = (rng.randrange(pool) * 2654435761) & 0xFFFFFFFF
+    return f"{11 + (n >> 24) % 200}.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}"
+
+
+def generate_lines(count, ip_pool, seed=1, hot_ips=5, hot_ratio=0.05, noise_ratio=0.3):
+    """Righe bytes con timestamp crescenti (circa 1000 righe al secondo di log)"""
+    rng = random.Random(seed)
+    hot = [f"198.51.100.{i + 1}" for i in range(hot_ips)]
+    lines = []
+    for i in range(count):
+        second = i // 1000
+        ts = f"May 19 {second // 3600 % 24:02d}:{second // 60 % 60:02d}:{second % 60:02d}"
+        if rng.random() < noise_ratio:
+            lines.append(NOISE.format(ts=ts, pid=rng.randint(100, 99999)).encode())
+            continue
+        ip = rng.choice(hot) if rng.random() < hot_ratio else random_ip(rng, ip_pool)
+        template = rng.choice(FAILED_TEMPLATES)
+        lines.append(template.format(ts=ts, pid=rng.randint(100, 99999), user=rng.choice(USERS),
+                                     ip=ip, port=rng.randint(1024, 65535)).encode())
+    return lines
+
+
+def feed(detector, parser, lines, batch_size=4096):
+    failures = alerts = 0
+    for start in range(0, len(lines), batch_size):
+        for event in parser.parse_batch(lines[start:start + batch_size]):
+            if isinstance(event, SSHFailure):
+                failures += 1
+                timestamp = event.timestamp.timestamp() if event.timestamp is not None else 0
+                alerts += len(detector.observe(event.source_ip, event.username, timestamp, event.kind, event.port))
+    return failures, alerts
+
+
+def run(count, ip_pool, max_ips):
+    lines = generate_lines(count, ip_pool)
+
+    detector = BruteForceDetector(max_ips=max_ips)
+    parser = AuthLogParser()
+    start = time.perf_counter()
+    failures, alerts = feed(detector, parser, lines)
+    elapsed = time.perf_counter() - start
+
+    # Memoria dei soli contatori, con un rilevatore nuovo
+    memory_detector = BruteForceDetector(max_ips=max_ips)
+    tracemalloc.start()
+    feed(memory_detector, AuthLogParser(), lines[:min(len(lines), 500000)])
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "lines": len(lines),
+        "failures": failures,
+        "alerts": alerts,
+        "elapsed_s": elapsed,
+        "lines_per_s": len(lines) / elapsed,
+        "failures_per_s": failures / elapsed,
+        "stats": detector.stats(),
+        "memory_mb": current / (1024 * 1024),
+        "memory_peak_mb": peak / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=2000000)
+    parser.add_argument("--ips", type=int, default=1000000, help="dimensione della botnet simulata")
+    parser.add_argument("--max-ips", type=int, default=20000, help="capacita' della tabella per IP")
+    args = parser.parse_args()
+
+    result = run(args.lines, args.ips, args.max_ips)
+    print(f"{result['lines']:,} righe, {result['failures']:,} tentativi falliti, {result['alerts']} allarmi")
+    print(f"Parser + rilevatore: {result['lines_per_s']:,.0f} righe/s ({result['failures_per_s']:,.0f} tentativi/s)")
+    for scope, stats in result["stats"].items():
+        print(f"  {scope:6}: {stats['tracked']:,} chiavi in memoria, {stats['evicted']:,} scartate (LRU)")
+    print(f"Memoria dei contatori (500k righe): {result['memory_mb']:.1f} MB, picco {result['memory_peak_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Prova di carico della modalita' multi-host (agenti -> collector).
+
+Avvia in locale il collector (endpoint /agent/push su un server werkzeug multi-thread) e simula
+centinaia di agenti che inviano stati sintetici: il primo invio e' completo, i successivi sono
+differenze rispetto all'ultimo stato confermato. Riporta invii al secondo, latenze e bytes per
+invio completo e differenziale.
+
+Uso: python benchmarks/bench_collector.py [--agents 300] [--rounds 10] [--workers 32]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from werkzeug.serving import make_server
+
+from agent import AgentPusher
+from collector import HostRegistry, create_blueprint
+
+TOKEN = "bench"
+
+
+def synthetic_state(rng, nics=8, disks=6, processes=20):
+    """Stato con la stessa struttura di exposition.snapshot_to_dict"""
+    def memory():
+        return {"total": 16 * 1024 ** 3, "available": rng.randrange(1, 16) * 1024 ** 3,
+                "percent": round(rng.uniform(0, 100), 1), "used": rng.randrange(1, 16) * 1024 ** 3}
+    return {
+        "timestamp": time.time(),
+        "cpu_percent": round(rng.uniform(0, 100), 1),
+        "memory": memory(),
+        "swap": memory(),
+        "load_avg": [round(rng.uniform(0, 4), 2) for _ in range(3)],
+        "uptime": 86400.0,
+        "network": {
+            "total": {"bytes_sent": rng.randrange(1 << 40), "bytes_recv": rng.randrange(1 << 40),
+                      "rx_bytes": rng.uniform(0, 1e6), "tx_bytes": rng.uniform(0, 1e6)},
+            "interfaces": {f"eth{i}": {"bytes_sent": rng.randrange(1 << 40), "bytes_recv": rng.randrange(1 << 40),
+                                       "rx_bytes": rng.uniform(0, 1e6), "tx_bytes": rng.uniform(0, 1e6)}
+                           for i in range(nics)},
+        },
+        "disks": [{"mountpoint": f"/data{i}", "fstype": "ext4", "total": 1 << 40, "used": 1 << 39,
+                   "percent": 50.0, "inodes_percent": 10.0, "eta": None} for i in range(disks)],
+        "quarantined": [],
+        "processes": [{"pid": 1000 + i, "name": f"worker-{i}", "username": "www-data", "cpu_percent": 1.0,
+                       "memory_percent": 0.5, "rss": 50 << 20, "io_rate": 0.0, "num_fds": 40}
+                      for i in range(processes)],
+    }
+
+
+class SyntheticHost:
+    """Stato che cambia solo in parte tra un invio e l'altro, come su un server reale"""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.state = synthetic_state(self.rng)
+
+    def __call__(self):
+        fresh = synthetic_state(self.rng)
+        self.state.update(timestamp=fresh["timestamp"], cpu_percent=fresh["cpu_percent"], memory=fresh["memory"],
+                          load_avg=fresh["load_avg"])
+        self.state["network"]["total"] = fresh["network"]["total"]
+        nic = self.rng.choice(list(fresh["network"]["interfaces"]))
+        self.state["network"]["interfaces"][nic] = fresh["network"]["interfaces"][nic]
+        return self.state
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=32, help="Invii concorrenti")
+    parser.add_argument("--event-ratio", type=float, default=0.05, help="Frazione di invii con un allarme")
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # Niente log per ogni richiesta
+    registry = HostRegistry()
+    forwarded = []
+    app = Flask(__name__)
+    app.register_blueprint(create_blueprint(registry, TOKEN, lambda host, events: forwarded.extend(events)))
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    agents = [AgentPusher(url, TOKEN, f"host-{i:04d}", SyntheticHost(i)) for i in range(args.agents)]
+    rng = random.Random(0)
+    latencies = {True: [], False: []}
+    sizes = {True: [], False: []}
+    lock = threading.Lock()
+
+    def push(agent):
+        if rng.random() < args.event_ratio:
+            agent.add_event("🔴 CPU alta: 97%")
+        full = agent._acked is None
+        bytes_before = agent.counters["bytes"]
+        start = time.perf_counter()
+        status = agent.push_once()
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies[full].append(elapsed)
+            sizes[full].append(agent.counters["bytes"] - bytes_before)
+        return status
+
+    start = time.perf_counter()
+    statuses = []
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for _ in range(args.rounds):
+            statuses.extend(pool.map(push, agents))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    total = len(statuses)
+    print(f"{args.agents} agenti x {args.rounds} invii, {args.workers} concorrenti: "
+          f"{total / elapsed:,.0f} invii/s ({elapsed:.2f} s)")
+    print(f"Risposte non 200: {sum(1 for status in statuses if status != 200)}, "
+          f"host registrati: {len(registry.names())}, allarmi inoltrati: {len(forwarded)}")
+    for full, label in ((True, "completo"), (False, "differenziale")):
+        if latencies[full]:
+            print(f"Invio {label:13}: {len(latencies[full]):6d} invii, "
+                  f"p50 {percentile(latencies[full], 0.5) * 1000:6.2f} ms, "
+                  f"p95 {percentile(latencies[full], 0.95) * 1000:6.2f} ms, "
+                  f"{sum(sizes[full]) / len(sizes[full]):8.0f} bytes/invio (gzip)")
+
+
+if __name__ == "__main__":
+    main()
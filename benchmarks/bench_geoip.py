@@ -0,0 +1,184 @@
+"""
+Benchmark dell'arricchimento offline degli IP (geoip.py).
+
+Genera un database sintetico di reti IPv4 e IPv6 sia in CSV sia in formato MaxMind DB (.mmdb,
+scritto qui con un writer minimale), misura la compilazione dell'indice CSV e le ricerche al
+secondo con e senza cache LRU, e verifica che i due formati diano gli stessi risultati.
+
+Uso: python benchmarks/bench_geoip.py [--networks 50000] [--lookups 100000] [--cache 4096]
+"""
+import argparse
+import ipaddress
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geoip import GeoIPDatabase, MMDB_METADATA_MARKER
+
+COUNTRIES = ["IT", "DE", "FR", "US", "CN", "RU", "BR", "NL", "GB", "IN"]
+
+
+def synthetic_networks(count, rng):
+    """Reti /24 IPv4 (da 11.0.0.0) e /48 IPv6 (da 2a00::) disgiunte, con paese, ASN e organizzazione"""
+    networks = []
+    for i in range(count):
+        if i % 10:
+            network = ipaddress.ip_network(((11 << 24) + i * 256, 24))
+        else:
+            network = ipaddress.ip_network(((0x2a00 << 112) + (i << 80), 48))
+        asn = 1000 + rng.randrange(count // 4 + 1)
+        networks.append((network, rng.choice(COUNTRIES), asn, f"Example Net {asn}"))
+    return networks
+
+
+def write_csv(path, networks):
+    with open(path, "w") as f:
+        f.write("# inizio,fine,paese,asn,organizzazione\n")
+        for network, country, asn, org in networks:
+            f.write(f"{network.network_address},{network.broadcast_address},{country},AS{asn},{org}\n")
+
+
+def _encode(value):
+    """Codifica minimale del formato dati MaxMind DB (stringhe, interi senza segno, mappe)"""
+    if isinstance(value, str):
+        data, kind = value.encode(), 2
+    elif isinstance(value, int):
+        data, kind = value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big"), 6 if value < 1 << 32 else 9
+    else:
+        data, kind = b"".join(_encode(k) + _encode(v) for k, v in value.items()), 7
+    size = len(value) if kind == 7 else len(data)
+    assert size < 285
+    extra = b"" if size < 29 else bytes([size - 29])
+    size = min(size, 29)
+    control = bytes([(kind << 5) | size]) if kind < 8 else bytes([size, kind - 7])
+    return control + extra + data
+
+
+def write_mmdb(path, networks, record_size=28):
+    """Albero IPv6 (IPv4 sotto ::/96) con record da `record_size` bit e una sezione dati deduplicata"""
+    root = [None, None]
+    data_section = bytearray()
+    offsets = {}
+    for network, country, asn, org in networks:
+        key = (country, asn, org)
+        if key not in offsets:
+            offsets[key] = len(data_section)
+            data_section += _encode({"country": {"iso_code": country}, "autonomous_system_number": asn,
+                                     "autonomous_system_organization": org})
+        value = int(network.network_address)  # Un IPv4 a.b.c.d corrisponde a ::a.b.c.d
+        bits = network.prefixlen + (96 if network.version == 4 else 0)
+        node = root
+        for i in range(bits):
+            bit = (value >> (127 - i)) & 1
+            if i == bits - 1:
+                node[bit] = ("data", offsets[key])
+            else:
+                if not isinstance(node[bit], list):
+                    node[bit] = [None, None]
+                node = node[bit]
+    # Numerazione dei nodi in ampiezza
+    order, index = [root], {id(root): 0}
+    for node in order:
+        for child in node:
+            if isinstance(child, list):
+                index[id(child)] = len(order)
+                order.append(child)
+    node_count = len(order)
+
+    def record(child):
+        if child is None:
+            return node_count
+        if isinstance(child, list):
+            return index[id(child)]
+        return node_count + 16 + child[1]
+
+    tree = bytearray()
+    for node in order:
+        left, right = record(node[0]), record(node[1])
+        if record_size == 24:
+            tree += left.to_bytes(3, "big") + right.to_bytes(3, "big")
+        elif record_size == 28:
+            tree += (left & 0xFFFFFF).to_bytes(3, "big") + bytes([((left >> 24) << 4) | (right >> 24)]) + \
+                    (right & 0xFFFFFF).to_bytes(3, "big")
+        else:
+            tree += struct.pack(">II", left, right)
+    metadata = _encode({"node_count": node_count, "record_size": record_size, "ip_version": 6,
+                        "database_type": "Synthetic", "binary_format_major_version": 2})
+    with open(path, "wb") as f:
+        f.write(tree + b"\0" * 16 + data_section + MMDB_METADATA_MARKER + metadata)
+
+
+def random_ips(networks, count, rng):
+    """Indirizzi casuali: 90% nelle reti del database, 10% fuori"""
+    ips = []
+    for _ in range(count):
+        if rng.random() < 0.9:
+            network = rng.choice(networks)[0]
+            ips.append(str(network.network_address + rng.randrange(min(network.num_addresses, 1 << 32))))
+        else:
+            ips.append(str(ipaddress.ip_address((100 << 24) + rng.randrange(1 << 24))))
+    return ips
+
+
+def measure(db, ips):
+    start = time.perf_counter()
+    for ip in ips:
+        db.lookup(ip)
+    return len(ips) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--networks", type=int, default=50000)
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--cache", type=int, default=4096, help="Dimensione della cache LRU")
+    parser.add_argument("--hot", type=int, default=500, help="IP distinti nel test con cache (attacchi ripetuti)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    networks = synthetic_networks(args.networks, rng)
+    ips = random_ips(networks, args.lookups, rng)
+    hot = [rng.choice(ips[:args.hot]) for _ in range(args.lookups)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["GEOIP_INDEX_DIR"] = directory
+        csv_path = os.path.join(directory, "ranges.csv")
+        mmdb_path = os.path.join(directory, "ranges.mmdb")
+        write_csv(csv_path, networks)
+        write_mmdb(mmdb_path, networks)
+
+        results = {}
+        for label, path in (("CSV (indice)", csv_path), ("MMDB", mmdb_path)):
+            start = time.perf_counter()
+            db = GeoIPDatabase([path], cache_size=0)
+            db.refresh()
+            opened = time.perf_counter() - start
+            cold = measure(db, ips)
+            cached_db = GeoIPDatabase([path], cache_size=args.cache)
+            cached_db.refresh()
+            cached = measure(cached_db, hot)
+            results[label] = [db.lookup(ip) for ip in ips[:5000]]
+            print(f"{label:12}: apertura {opened * 1000:8.1f} ms ({os.path.getsize(path):,} bytes), "
+                  f"{cold:10,.0f} ricerche/s senza cache, {cached:10,.0f} ricerche/s con cache "
+                  f"({cached_db.counters['hits'] / len(hot):.0%} hit)")
+
+        found = sum(1 for info in results["MMDB"] if info is not None)
+        mismatches = sum(1 for a, b in zip(results["CSV (indice)"], results["MMDB"]) if a != b)
+        print(f"Verifica su {len(results['MMDB'])} IP: {found} trovati, {mismatches} differenze tra CSV e MMDB")
+
+        start = time.perf_counter()
+        db = GeoIPDatabase([csv_path])
+        db.refresh()
+        os.utime(csv_path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        reloaded = db.refresh()
+        print(f"Ricarica dopo modifica del CSV: {reloaded}, {(time.perf_counter() - start) * 1000:.1f} ms "
+              f"(ricompilazione dell'indice)")
+
+
+if __name__ == "__main__":
+    main()
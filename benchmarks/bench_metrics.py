@@ -0,0 +1,72 @@
+"""
+Benchmark dell'esposizione delle metriche (/metrics, /api/snapshot).
+
+Confronta il costo di serializzare (e comprimere) le metriche ad ogni richiesta con quello della
+versione pre-serializzata una volta per campionamento (MetricsExporter). L'istantanea reale
+viene arricchita con interfacce e processi sintetici per simulare insiemi di etichette grandi.
+
+Uso: python benchmarks/bench_metrics.py [--nics 50] [--processes 200] [--requests 2000]
+"""
+import argparse
+import gzip
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exposition import MetricsExporter, render_metrics
+from net_rates import NicRate
+from procfs import NetIO
+from sampler import ResourceSampler
+from top_processes import ProcessRow
+
+
+def build_snapshot(nics, processes):
+    snapshot = ResourceSampler().sample()
+    per_nic = dict(snapshot.net_per_nic)
+    rates = dict(snapshot.net_rates)
+    for i in range(nics):
+        per_nic[f"veth{i:04x}"] = NetIO(i * 1000, i * 2000, i, i * 2, 0, 0, 0, 0)
+        rates[f"veth{i:04x}"] = NicRate(i * 10.0, i * 20.0, 1.0, 2.0)
+    rows = [ProcessRow(1000 + i, f"worker-{i}", "www-data", i % 100 / 3, 0.5, 50 * 1024 * 1024 + i, 0.0, 40)
+            for i in range(processes)]
+    return snapshot._replace(net_per_nic=per_nic, net_rates=rates), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nics", type=int, default=50)
+    parser.add_argument("--processes", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    snapshot, rows = build_snapshot(args.nics, args.processes)
+    exporter = MetricsExporter(lambda: rows)
+
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        gzip.compress(render_metrics(snapshot, rows).encode(), 6)
+    per_request = (time.perf_counter() - start) / args.requests
+
+    start = time.perf_counter()
+    updates = max(1, args.requests // 20)
+    for _ in range(updates):
+        exporter.update(snapshot)
+    per_update = (time.perf_counter() - start) / updates
+
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        body = exporter.rendered.metrics_gzip
+    per_cached = (time.perf_counter() - start) / args.requests
+
+    rendered = exporter.rendered
+    print(f"Metriche: {len(rendered.metrics):,} bytes ({len(rendered.metrics_gzip):,} con gzip), "
+          f"JSON {len(rendered.json):,} bytes ({len(rendered.json_gzip):,} con gzip)")
+    print(f"Serializzazione + gzip ad ogni richiesta: {per_request * 1e6:10.1f} us/richiesta")
+    print(f"Pre-serializzazione (testo + JSON, gzip):  {per_update * 1e6:10.1f} us/campionamento")
+    print(f"Lettura dei bytes pre-serializzati:       {per_cached * 1e6:10.3f} us/richiesta ({len(body)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark dei backend di campionamento: lettura diretta di /proc (ProcfsBackend) contro psutil.
+
+Ogni backend viene eseguito in un processo figlio separato, cosi' tempo CPU e RSS massimo
+non si influenzano a vicenda. Misura anche il recupero dell'IP locale con "hostname -I"
+(un processo per chiamata) rispetto alla cache di HostIdentity.
+
+Uso: python benchmarks/bench_sampler.py [--samples 5000] [--proc-root /proc]
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from procfs import ProcfsBackend, PsutilBackend, HostIdentity
+
+
+def _open_fds():
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return -1
+
+
+def _run_backend(kind, samples, proc_root, results):
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    backend = ProcfsBackend(proc_root) if kind == "procfs" else PsutilBackend()
+    backend.sample()
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for _ in range(samples):
+        backend.sample()
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    results.put({
+        "backend": kind,
+        "us_per_sample": elapsed / samples * 1e6,
+        "cpu_us_per_sample": cpu / samples * 1e6,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "rss_growth_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before,
+        "open_fds": _open_fds(),
+    })
+
+
+def run_backends(samples, proc_root):
+    context = multiprocessing.get_context("fork")
+    results = []
+    for kind in ("psutil", "procfs"):
+        queue = context.Queue()
+        child = context.Process(target=_run_backend, args=(kind, samples, proc_root, queue))
+        child.start()
+        results.append(queue.get())
+        child.join()
+    return results
+
+
+def run_local_ip(calls=50):
+    result = {}
+    if shutil.which("hostname"):
+        start = time.perf_counter()
+        for _ in range(calls):
+            subprocess.run(["hostname", "-I"], capture_output=True, text=True)
+        result["hostname -I"] = (time.perf_counter() - start) / calls * 1000
+    identity = HostIdentity()
+    identity.refresh()
+    start = time.perf_counter()
+    for _ in range(calls):
+        identity.refresh()
+    result["HostIdentity"] = (time.perf_counter() - start) / calls * 1000
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=5000)
+    parser.add_argument("--proc-root", default="/proc")
+    args = parser.parse_args()
+
+    for result in run_backends(args.samples, args.proc_root):
+        print(f"{result['backend']:7}: {result['us_per_sample']:8.1f} us/campione, "
+              f"CPU {result['cpu_us_per_sample']:8.1f} us/campione, RSS max {result['max_rss_kb'] / 1024:.1f} MB "
+              f"(+{result['rss_growth_kb'] / 1024:.1f} MB), fd aperti {result['open_fds']}")
+    for name, value in run_local_ip().items():
+        print(f"IP locale con {name}: {value:.4f} ms/chiamata")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark della classifica dei processi con 5000 processi sintetici.
+
+Confronta TopProcessEngine (due scansioni, una sola attesa, heap) con il costo stimato
+dell'implementazione originale (cpu_percent(interval=0.1) per ogni processo) e misura anche
+una scansione reale dei processi di questo host.
+
+Uso: python benchmarks/bench_top_processes.py [--processes 5000] [--rounds 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from top_processes import TopProcessEngine
+
+CpuTimes = namedtuple("CpuTimes", ["user", "system"])
+MemInfo = namedtuple("MemInfo", ["rss"])
+IOCounters = namedtuple("IOCounters", ["read_bytes", "write_bytes"])
+
+
+class _NullContext:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeProcess:
+    """Processo sintetico con contatori che crescono ad ogni lettura"""
+
+    def __init__(self, pid, rng):
+        self.pid = pid
+        self._rng = rng
+        self._cpu = rng.random() * 100
+        self._io = rng.randint(0, 10 ** 9)
+        self._created = 1_000_000 + pid
+
+    def oneshot(self):
+        return _NullContext()
+
+    def create_time(self):
+        return self._created
+
+    def cpu_times(self):
+        self._cpu += self._rng.random() * 0.05
+        return CpuTimes(self._cpu * 0.7, self._cpu * 0.3)
+
+    def io_counters(self):
+        self._io += self._rng.randint(0, 100000)
+        return IOCounters(self._io // 2, self._io // 2)
+
+    def memory_info(self):
+        return MemInfo(self._rng.randint(1, 500) * 1024 * 1024)
+
+    def num_fds(self):
+        return self._rng.randint(3, 2000)
+
+    def name(self):
+        return f"proc-{self.pid}"
+
+    def username(self):
+        return "root"
+
+
+def run(processes, rounds, sort_by="cpu"):
+    rng = random.Random(1)
+    fake = [FakeProcess(pid, rng) for pid in range(1, processes + 1)]
+    engine = TopProcessEngine(sample_interval=0.5, process_iter=lambda: iter(fake))
+
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        engine.top(10, sort_by)
+        timings.append(time.perf_counter() - start)
+        time.sleep(0.3)  # Simula richieste distanziate: la scansione precedente viene riusata
+
+    real_engine = TopProcessEngine(sample_interval=0.5)
+    start = time.perf_counter()
+    real_engine.top(10, sort_by)
+    real_time = time.perf_counter() - start
+
+    return {
+        "processes": processes,
+        "first_call_s": timings[0],
+        "warm_call_s": min(timings[1:]) if len(timings) > 1 else timings[0],
+        "legacy_estimate_s": processes * 0.1,
+        "real_host_s": real_time,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--sort-by", default="cpu", choices=["cpu", "rss", "io", "fds"])
+    args = parser.parse_args()
+
+    result = run(args.processes, args.rounds, args.sort_by)
+    print(f"Processi sintetici: {result['processes']}")
+    print(f"Prima richiesta (due scansioni + attesa): {result['first_call_s']:.3f} s")
+    print(f"Richieste successive (scansione riusata): {result['warm_call_s']:.3f} s")
+    print(f"Implementazione originale (solo attese): ~{result['legacy_estimate_s']:.0f} s")
+    print(f"Host reale: {result['real_host_s']:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Suite di benchmark riproducibile dei percorsi principali del monitor, senza host ne' bot reali.
+
+Il monitor viene importato con PROC_ROOT, AUTH_LOG_FILE, STATE_DB e TELEGRAM_API_URL che
+puntano ai sostituti locali (benchmarks/standins.py): /proc finto, auth.log sintetico con
+rotazione e raffiche brute-force, Bot API locale con latenza e risposte 429. Scenari:
+
+- ip_in_range:   check_ip_in_range su IP casuali
+- network_info:  get_network_info con molte interfacce e socket
+- top_processes: get_top_processes su una tabella di processi sintetici
+- send_alert:    send_alert -> coda di uscita -> Bot API (latenza di consegna, 429)
+- auth_log:      check_auth_log su un flusso con rotazione e brute-force (righe/s, MB/s)
+- end_to_end:    riga "Accepted" scritta in auth.log -> messaggio ricevuto dalla Bot API
+
+Per ogni scenario riporta anche CPU (secondi e %) e RSS del processo del monitor, misurati
+solo nella parte eseguita dal monitor (la generazione dei dati sintetici resta fuori; la Bot API
+finta gira in un altro processo). I risultati possono essere salvati in JSON e confrontati con
+una baseline salvata in precedenza.
+
+Uso: python benchmarks/run_benchmarks.py [--output risultati.json] [--baseline baseline.json]
+     [--threshold 10] [--fail-on-regression] [--only auth_log,end_to_end]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psutil
+
+from standins import AuthLogStream, FakeTelegramServer, build_fake_proc, fake_process_iter, tick_fake_proc
+
+SCENARIOS = ("ip_in_range", "network_info", "top_processes", "send_alert", "auth_log", "end_to_end")
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {"p50_ms": pick(0.5) * 1000, "p95_ms": pick(0.95) * 1000, "p99_ms": pick(0.99) * 1000,
+            "max_ms": values[-1] * 1000}
+
+
+class ResourceMeter:
+    """CPU (utente + sistema) e tempo trascorso nei blocchi `with`, sommati; RSS alla fine"""
+
+    def __init__(self):
+        self.process = psutil.Process()
+        self.cpu_s = 0.0
+        self.wall_s = 0.0
+        self.last_s = 0.0  # Durata dell'ultimo blocco
+
+    def __enter__(self):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        self._cpu = usage.ru_utime + usage.ru_stime
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.last_s = time.perf_counter() - self._start
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        self.cpu_s += usage.ru_utime + usage.ru_stime - self._cpu
+        self.wall_s += self.last_s
+        return False
+
+    def result(self):
+        return {"cpu_s": self.cpu_s, "cpu_percent": self.cpu_s / max(self.wall_s, 1e-9) * 100,
+                "rss_mb": self.process.memory_info().rss / 2 ** 20,
+                "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def wait_until(condition, timeout, interval=0.05):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(interval)
+    return False
+
+
+def bench_ip_in_range(monitor, args, telegram, meter):
+    rng = random.Random(1)
+    ips = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+           for _ in range(args.ips)]
+    ips += [f"2001:db8::{rng.getrandbits(16):x}" for _ in range(args.ips // 10)]
+    with meter:
+        for ip in ips:
+            monitor.check_ip_in_range(ip)
+    return {"checks_per_s": len(ips) / meter.wall_s}
+
+
+def bench_network_info(monitor, args, telegram, meter):
+    timings = []
+    for tick in range(1, args.rounds + 1):
+        tick_fake_proc(args.proc_root, tick, args.nics)
+        with meter:
+            monitor.SAMPLER.sample()
+            start = time.perf_counter()
+            text = monitor.get_network_info()
+            timings.append(time.perf_counter() - start)
+    assert text.startswith("*Informazioni Rete*"), text
+    return {"calls_per_s": len(timings) / sum(timings), **percentiles(timings)}
+
+
+def bench_top_processes(monitor, args, telegram, meter):
+    from top_processes import TopProcessEngine
+    monitor.TOP_PROCESSES = TopProcessEngine(process_iter=fake_process_iter(args.processes))
+    timings = []
+    with meter:
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            monitor.get_top_processes(10)
+            timings.append(time.perf_counter() - start)
+            time.sleep(0.3)  # Richieste distanziate: la scansione precedente viene riusata
+    return {"processes": args.processes, "first_call_ms": timings[0] * 1000, **percentiles(timings[1:])}
+
+
+def delivery_latencies(telegram, sent, pattern):
+    """Latenze (s) tra `sent` {chiave: istante} e il primo messaggio ricevuto che contiene la chiave"""
+    latencies = {}
+    for record in telegram.records():
+        if record["status"] != 200:
+            continue
+        for key in pattern.findall(record["text"]):
+            if key in sent and key not in latencies:
+                latencies[key] = record["received"] - sent[key]
+    return latencies
+
+
+def bench_send_alert(monitor, args, telegram, meter):
+    import telegram_bot
+    telegram_bot.init_bot()  # Connessione e polling fuori dalla misura
+    sent = {}
+    enqueue = []
+    pattern = re.compile(r"bench-\d{4}")
+    with meter:
+        for i in range(args.alerts):
+            key = f"bench-{i:04d}"
+            start = time.perf_counter()
+            sent[key] = time.time()
+            telegram_bot.send_alert(f"*Benchmark* {key}")
+            enqueue.append(time.perf_counter() - start)
+        wait_until(lambda: len(delivery_latencies(telegram, sent, pattern)) == len(sent), args.timeout, 0.2)
+    latencies = delivery_latencies(telegram, sent, pattern)
+    rejected = sum(1 for record in telegram.records() if record["status"] == 429)
+    duration = max(latencies.values()) if latencies else float("nan")
+    return {"sent": len(sent), "delivered": len(latencies), "responses_429": rejected,
+            "enqueue_us": sum(enqueue) / len(enqueue) * 1e6, "delivered_per_s": len(latencies) / duration,
+            **{f"latency_{k}": v for k, v in percentiles(list(latencies.values())).items()}}
+
+
+def bench_auth_log(monitor, args, telegram, meter):
+    stream = AuthLogStream(args.auth_log, seed=2)
+    rng = random.Random(3)
+    chunks = []
+    for _ in range(max(1, args.log_lines // args.chunk)):
+        lines = stream.noise(args.chunk - args.chunk // 20)
+        # Raffiche brute-force: un IP insistente e una rete /24 distribuita
+        lines += stream.burst(args.chunk // 40, ip=f"185.{rng.randint(0, 255)}.{rng.randint(0, 255)}.7")
+        lines += stream.burst(args.chunk // 40, subnet=f"193.{rng.randint(0, 255)}.{rng.randint(0, 255)}")
+        rng.shuffle(lines)
+        chunks.append(lines)
+    elapsed = 0.0
+    for i, lines in enumerate(chunks):
+        stream.write(lines, logins=2)
+        if i == len(chunks) // 2:
+            stream.rotate()
+            stream.write(stream.noise(100))
+        with meter:
+            monitor.check_auth_log()
+        elapsed += meter.last_s
+    return {"lines": stream.lines, "lines_per_s": stream.lines / elapsed,
+            "mb_per_s": stream.bytes / elapsed / 2 ** 20, "rotations": 1}
+
+
+def bench_end_to_end(monitor, args, telegram, meter):
+    # Parte con la coda vuota: gli allarmi degli scenari precedenti non falsano le latenze
+    wait_until(lambda: monitor.ALERTS.pending_count() == 0 and monitor.get_outbox_stats()["depth"] == 0,
+               args.timeout, 0.2)
+    stream = AuthLogStream(args.auth_log, seed=4)
+    stream._login_seq = 10000  # IP diversi da quelli dello scenario auth_log
+    pattern = re.compile(r"45\.\d+\.\d+\.\d+")
+    with meter:
+        monitor.AUTH_LOG_WATCHER.start()
+        time.sleep(0.5)
+        for _ in range(args.logins):
+            stream.write(stream.noise(50), logins=1)
+            time.sleep(args.login_spacing)
+        wait_until(lambda: len(delivery_latencies(telegram, stream.logins, pattern)) == len(stream.logins),
+                   args.timeout, 0.2)
+    monitor.AUTH_LOG_WATCHER.stop()
+    latencies = delivery_latencies(telegram, stream.logins, pattern)
+    return {"logins": len(stream.logins), "delivered": len(latencies),
+            "digest_window_s": monitor.load_config()["alert_digest_window"],
+            **{f"latency_{k}": v for k, v in percentiles(list(latencies.values())).items()}}
+
+
+def flatten_metrics(results):
+    return {f"{scenario}.{name}": value for scenario, metrics in results["scenarios"].items()
+            for name, value in metrics.items() if isinstance(value, (int, float))}
+
+
+def direction(metric):
+    """+1 se un valore piu' alto e' meglio, -1 se e' peggio, 0 se solo informativo"""
+    name = metric.rsplit(".", 1)[-1]
+    if name.endswith("_per_s"):
+        return 1
+    if name.endswith("_ms") or name.endswith("_us") or name.startswith("cpu") or "rss" in name:
+        return -1
+    return 0
+
+
+def compare(results, baseline, threshold):
+    """Stampa le differenze rispetto alla baseline; restituisce le metriche peggiorate oltre soglia"""
+    current, previous = flatten_metrics(results), flatten_metrics(baseline)
+    regressions = []
+    changed = {key: (value, results["meta"]["args"].get(key)) for key, value in baseline["meta"]["args"].items()
+               if key not in ("output", "baseline", "only", "verbose", "timeout") and results["meta"]["args"].get(key) != value}
+    if changed:
+        print("\nATTENZIONE: parametri diversi dalla baseline, i valori non sono confrontabili: " +
+              ", ".join(f"{key} {old} -> {new}" for key, (old, new) in sorted(changed.items())))
+    print(f"\nConfronto con la baseline ({baseline['meta'].get('commit', '?')[:12]}, "
+          f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(baseline['meta']['timestamp']))}):")
+    for metric in sorted(current.keys() & previous.keys()):
+        old, new = previous[metric], current[metric]
+        if not old:
+            continue
+        change = (new - old) / abs(old) * 100
+        sign = direction(metric)
+        verdict = ""
+        if sign and change * sign < -threshold:
+            verdict = "  <-- peggiorato"
+            regressions.append(metric)
+        elif sign and change * sign > threshold:
+            verdict = "  migliorato"
+        print(f"  {metric:42} {old:14.3f} -> {new:14.3f} ({change:+7.1f}%){verdict}")
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=10,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Salva i risultati in JSON (da usare come baseline)")
+    parser.add_argument("--baseline", help="Confronta con risultati JSON salvati in precedenza")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Variazione (%%) considerata significativa")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Esce con codice 1 se qualcosa peggiora")
+    parser.add_argument("--only", help="Scenari da eseguire, separati da virgola")
+    parser.add_argument("--ips", type=int, default=100000)
+    parser.add_argument("--nics", type=int, default=50)
+    parser.add_argument("--sockets", type=int, default=20000)
+    parser.add_argument("--processes", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--alerts", type=int, default=20)
+    parser.add_argument("--log-lines", type=int, default=200000)
+    parser.add_argument("--chunk", type=int, default=10000, help="Righe per scrittura di auth.log")
+    parser.add_argument("--logins", type=int, default=10)
+    parser.add_argument("--login-spacing", type=float, default=0.5, help="Secondi tra gli accessi (end_to_end)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latenza della Bot API finta (s)")
+    parser.add_argument("--error-rate", type=float, default=0.1, help="Frazione di risposte 429")
+    parser.add_argument("--digest-window", type=float, help="alert_digest_window (predefinito: configurazione)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Attesa massima delle consegne (s)")
+    parser.add_argument("--verbose", action="store_true", help="Mostra anche l'output del monitor")
+    args = parser.parse_args()
+    selected = args.only.split(",") if args.only else list(SCENARIOS)
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"scenari sconosciuti: {', '.join(sorted(unknown))}")
+
+    # Percorsi assoluti: piu' avanti la directory corrente diventa quella temporanea
+    args.output = os.path.abspath(args.output) if args.output else None
+    args.baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    workdir = tempfile.mkdtemp(prefix="bench-monitor-")
+    args.proc_root = os.path.join(workdir, "proc")
+    args.auth_log = os.path.join(workdir, "auth.log")
+    build_fake_proc(args.proc_root, nics=args.nics, sockets=args.sockets)
+    open(args.auth_log, "w").close()
+    telegram = FakeTelegramServer(os.path.join(workdir, "telegram.jsonl"), latency=args.latency,
+                                  error_rate=args.error_rate).start()
+    os.environ.update(PROC_ROOT=args.proc_root, AUTH_LOG_FILE=args.auth_log, SAMPLER_BACKEND="procfs",
+                      STATE_DB=os.path.join(workdir, "state.db"), BOT_TOKEN="123456:bench", CHAT_ID="42",
+                      TELEGRAM_API_URL=telegram.base_url, MONITOR_MODE="standalone")
+    os.environ.pop("GEOIP_DB", None)
+    # config.json viene letto dalla directory corrente: quella del benchmark, non quella del progetto
+    os.chdir(workdir)
+    if args.digest_window is not None:
+        with open("config.json", "w") as f:
+            json.dump({"alert_digest_window": args.digest_window}, f)
+
+    # I messaggi del monitor (allarmi, accessi, ...) non si mescolano ai risultati
+    output = sys.stdout
+    if not args.verbose:
+        sys.stdout = open(os.devnull, "w")
+
+    import monitor
+    import telegram_bot
+
+    results = {"meta": {"timestamp": time.time(), "commit": git_commit(), "python": platform.python_version(),
+                        "platform": platform.platform(), "cpus": os.cpu_count(),
+                        "args": {k: v for k, v in vars(args).items() if k not in ("proc_root", "auth_log")}},
+               "scenarios": {}}
+    try:
+        for name in SCENARIOS:
+            if name not in selected:
+                continue
+            meter = ResourceMeter()
+            metrics = globals()[f"bench_{name}"](monitor, args, telegram, meter)
+            metrics.update(meter.result())
+            results["scenarios"][name] = metrics
+            print(f"{name:14} " + ", ".join(f"{key} {value:,.2f}" if isinstance(value, float) else f"{key} {value}"
+                                            for key, value in metrics.items()), file=output)
+    finally:
+        if telegram_bot.UPDATER is not None:
+            telegram_bot.UPDATER.stop()
+        telegram.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+        sys.stdout = output
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Risultati salvati in {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} metriche peggiorate oltre il {args.threshold:g}%")
+            if args.fail_on_regression:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
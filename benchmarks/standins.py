@@ -0,0 +1,235 @@
+"""
+Sostituti locali per i benchmark: nessun host reale e nessun bot Telegram reale.
+
+- AuthLogStream: auth.log sintetico scritto a blocchi, con rotazione e raffiche di tentativi
+  falliti (brute-force); registra l'istante di scrittura di ogni accesso SSH.
+- build_fake_proc / tick_fake_proc: albero /proc finto (stat, meminfo, loadavg, uptime,
+  net/dev con molte interfacce, net/route, tabelle dei socket) aggiornato sul posto.
+- fake_process_iter: tabella di processi sintetici con l'interfaccia di psutil.Process.
+- FakeTelegramServer: Bot API locale in un processo separato, con latenza e risposte 429
+  iniettate; registra l'istante di arrivo di ogni messaggio.
+"""
+import json
+import multiprocessing
+import os
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+from bench_auth_parser import NOISE_TEMPLATES, ACCEPTED_TEMPLATE
+from bench_proc_net import write_table
+from bench_top_processes import FakeProcess
+
+FAILED_TEMPLATE = "{ts} {host} sshd[{pid}]: Failed password for {user} from {ip} port {port} ssh2"
+INVALID_TEMPLATE = "{ts} {host} sshd[{pid}]: Failed password for invalid user {user} from {ip} port {port} ssh2"
+
+
+class AuthLogStream:
+    """
+    Scrive righe sintetiche in un auth.log: rumore (cron, sudo, PAM), accessi riusciti da IP
+    pubblici sempre diversi e raffiche di tentativi falliti dallo stesso IP o dalla stessa rete.
+    `logins` associa ogni IP di accesso all'istante (time.time) in cui la riga e' stata scritta.
+    """
+
+    def __init__(self, path, seed=1, hostname="bastion01"):
+        self.path = path
+        self.rng = random.Random(seed)
+        self.hostname = hostname
+        self.logins = {}
+        self.lines = 0
+        self.bytes = 0
+        self._login_seq = 0
+        open(path, "ab").close()
+
+    def _fields(self, **extra):
+        now = time.localtime()
+        fields = dict(ts=time.strftime("%b %e %H:%M:%S", now), host=self.hostname, pid=self.rng.randint(100, 99999),
+                      ip=f"{self.rng.randint(1, 223)}.{self.rng.randint(0, 255)}.{self.rng.randint(0, 255)}.1",
+                      port=self.rng.randint(1024, 65535), method=self.rng.choice(["password", "publickey"]),
+                      user=self.rng.choice(["root", "deploy", "admin", "oracle", "test"]))
+        fields.update(extra)
+        return fields
+
+    def next_login_ip(self):
+        """IP pubblico diverso per ogni accesso (45.0.0.0/8), per legare ogni messaggio alla sua riga"""
+        self._login_seq += 1
+        return f"45.{(self._login_seq >> 16) & 255}.{(self._login_seq >> 8) & 255}.{self._login_seq & 255}"
+
+    def noise(self, count):
+        return [self.rng.choice(NOISE_TEMPLATES).format(**self._fields()) for _ in range(count)]
+
+    def burst(self, count, ip=None, subnet=None):
+        """Tentativi falliti: da un solo IP, oppure da tutta una rete /24 (`subnet`="a.b.c")"""
+        lines = []
+        for _ in range(count):
+            source = ip or (f"{subnet}.{self.rng.randint(1, 254)}" if subnet else None)
+            template = INVALID_TEMPLATE if self.rng.random() < 0.3 else FAILED_TEMPLATE
+            lines.append(template.format(**self._fields(**({"ip": source} if source else {}))))
+        return lines
+
+    def write(self, lines, logins=0):
+        """Aggiunge le righe (e `logins` accessi riusciti, mescolati) con una sola scrittura"""
+        lines = list(lines)
+        login_ips = [self.next_login_ip() for _ in range(logins)]
+        for ip in login_ips:
+            lines.insert(self.rng.randint(0, len(lines)), ACCEPTED_TEMPLATE.format(**self._fields(ip=ip)))
+        data = ("\n".join(lines) + "\n").encode()
+        with open(self.path, "ab") as f:
+            f.write(data)
+        written_at = time.time()
+        for ip in login_ips:
+            self.logins[ip] = written_at
+        self.lines += len(lines)
+        self.bytes += len(data)
+        return login_ips
+
+    def rotate(self):
+        """Rotazione come logrotate senza copytruncate: rename in auth.log.1 e nuovo file vuoto"""
+        os.replace(self.path, self.path + ".1")
+        open(self.path, "wb").close()
+
+
+def _write(path, text):
+    # Sovrascrittura sul posto: i descrittori tenuti aperti (ProcFile) vedono il nuovo contenuto
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def tick_fake_proc(root, tick, nics=50):
+    """Aggiorna i contatori (CPU, traffico) come se fosse passato un intervallo di campionamento"""
+    user, system, idle = 1000 + tick * 30, 500 + tick * 10, 100000 + tick * 60
+    _write(os.path.join(root, "stat"), f"cpu  {user} 0 {system} {idle} 50 0 10 0 0 0\n"
+                                       f"cpu0 {user} 0 {system} {idle} 50 0 10 0 0 0\nintr 0\n")
+    _write(os.path.join(root, "uptime"), f"{86400 + tick * 5:.2f} 100000.00\n")
+    lines = ["Inter-|   Receive                                                |  Transmit",
+             " face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed"]
+    for i in range(nics):
+        name = "lo" if i == 0 else f"eth{i - 1}" if i < 3 else f"veth{i:04x}"
+        rx, tx = (i + 1) * (10 ** 6 + tick * 5000), (i + 1) * (10 ** 6 + tick * 3000)
+        lines.append(f"{name:>6}: {rx} {rx // 1000} 0 0 0 0 0 0 {tx} {tx // 1000} 0 0 0 0 0 0")
+    _write(os.path.join(root, "net", "dev"), "\n".join(lines) + "\n")
+
+
+def build_fake_proc(root, nics=50, sockets=20000, seed=1):
+    """Crea un /proc finto per ProcfsBackend, HostIdentity e il conteggio dei socket"""
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(root, "net"), exist_ok=True)
+    _write(os.path.join(root, "meminfo"), "MemTotal:       16384000 kB\nMemFree:         2048000 kB\n"
+                                          "MemAvailable:    8192000 kB\nBuffers:          512000 kB\n"
+                                          "Cached:          4096000 kB\nSReclaimable:     256000 kB\n"
+                                          "SwapTotal:       2097148 kB\nSwapFree:        1048574 kB\n")
+    _write(os.path.join(root, "loadavg"), "0.52 0.48 0.45 2/345 12345\n")
+    _write(os.path.join(root, "net", "route"), "Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask\n"
+                                               "eth0\t00000000\t0100A8C0\t0003\t0\t0\t100\t00000000\n")
+    write_table(os.path.join(root, "net", "tcp"), sockets, rng)
+    write_table(os.path.join(root, "net", "tcp6"), sockets // 10, rng, ipv6=True)
+    write_table(os.path.join(root, "net", "udp"), 100, rng)
+    write_table(os.path.join(root, "net", "udp6"), 10, rng, ipv6=True)
+    tick_fake_proc(root, 0, nics)
+
+
+def fake_process_iter(processes, seed=1):
+    """process_iter per TopProcessEngine: sempre gli stessi `processes` processi sintetici"""
+    rng = random.Random(seed)
+    table = [FakeProcess(1000 + i, rng) for i in range(processes)]
+    return lambda: iter(table)
+
+
+class _TelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _params(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            return json.loads(raw or b"{}")
+        return dict(parse_qsl(raw.decode()))
+
+    def do_GET(self):
+        self.do_POST()
+
+    def do_POST(self):
+        server = self.server
+        method = self.path.rsplit("/", 1)[-1].split("?")[0]
+        params = self._params()
+        if method == "getMe":
+            return self._reply(200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "bench",
+                                                            "username": "bench_bot"}})
+        if method == "getUpdates":
+            time.sleep(min(float(params.get("timeout") or 0), 1.0))  # Long polling abbreviato
+            return self._reply(200, {"ok": True, "result": []})
+        if method != "sendMessage":
+            return self._reply(200, {"ok": True, "result": True})
+        time.sleep(server.latency)
+        if server.rng.random() < server.error_rate:
+            server.record({"received": time.time(), "status": 429})
+            return self._reply(429, {"ok": False, "error_code": 429,
+                                     "description": f"Too Many Requests: retry after {server.retry_after}",
+                                     "parameters": {"retry_after": server.retry_after}})
+        server.message_id += 1
+        text = params.get("text", "")
+        server.record({"received": time.time(), "status": 200, "text": text})
+        self._reply(200, {"ok": True, "result": {"message_id": server.message_id, "date": int(time.time()),
+                                                 "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                                                 "text": text}})
+
+
+def _serve(port_queue, log_path, latency, error_rate, retry_after, seed):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _TelegramHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.retry_after = retry_after
+    server.rng = random.Random(seed)
+    server.message_id = 0
+    log = open(log_path, "a", buffering=1)
+    server.record = lambda entry: log.write(json.dumps(entry) + "\n")
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+class FakeTelegramServer:
+    """
+    Bot API locale (getMe, getUpdates, sendMessage, ...) in un processo separato, cosi' il suo
+    consumo di CPU non si somma a quello del monitor. Ogni sendMessage attende `latency`
+    secondi e con probabilita' `error_rate` risponde 429 con retry_after.
+    """
+
+    def __init__(self, log_path, latency=0.05, error_rate=0.1, retry_after=1, seed=1):
+        self.log_path = log_path
+        self.args = (latency, error_rate, retry_after, seed)
+        self.process = None
+        self.port = None
+
+    def start(self):
+        open(self.log_path, "w").close()
+        ports = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=_serve, args=(ports, self.log_path) + self.args, daemon=True)
+        self.process.start()
+        self.port = ports.get(timeout=10)
+        return self
+
+    @property
+    def base_url(self):
+        """Valore per TELEGRAM_API_URL"""
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    def records(self):
+        with open(self.log_path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join(5)
@@ -0,0 +1,191 @@
+import ipaddress
+import threading
+from array import array
+from collections import OrderedDict
+
+
+def subnet_of(ip, v4_prefix=24, v6_prefix=64):
+    """Rete di appartenenza di un indirizzo (es. 203.0.113.0/24), usata per aggregare le botnet"""
+    if ":" not in ip and v4_prefix == 24:
+        # Caso piu' frequente senza passare da ipaddress
+        return ip.rpartition(".")[0] + ".0/24"
+    try:
+        prefix = v6_prefix if ":" in ip else v4_prefix
+        return str(ipaddress.ip_network(f"{ip}/{prefix}", strict=False))
+    except ValueError:
+        return ip
+
+
+class _Entry:
+    """Contatore circolare di una chiave: un intervallo per slot, piu' il totale della finestra"""
+    __slots__ = ("last_bucket", "total", "alerted", "ring")
+
+    def __init__(self, bucket, zeros):
+        self.last_bucket = bucket
+        self.total = 0
+        self.alerted = False
+        self.ring = array("I", zeros)
+
+
+class SlidingCounter:
+    """
+    Conteggio degli eventi per chiave su una finestra scorrevole di `window` secondi.
+
+    La finestra e' divisa in `buckets` intervalli in un array circolare: aggiungere un evento
+    costa O(1) (gli intervalli scaduti vengono azzerati solo quando si avanza). Al massimo
+    `capacity` chiavi sono tenute in memoria; oltre, viene scartata quella usata meno di recente.
+    """
+
+    def __init__(self, window=600, buckets=10, capacity=20000):
+        self.window = window
+        self.buckets = buckets
+        self.capacity = capacity
+        self.width = window / buckets
+        self.evictions = 0
+        self._zeros = bytes(array("I", [0]).itemsize * buckets)
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key, timestamp, amount=1):
+        """Conta un evento e restituisce l'elemento aggiornato (totale nella finestra in .total)"""
+        bucket = int(timestamp // self.width)
+        buckets = self.buckets
+        entries = self._entries
+        entry = entries.get(key)
+        if entry is None:
+            entry = entries[key] = _Entry(bucket, self._zeros)
+            if len(entries) > self.capacity:
+                entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            entries.move_to_end(key)
+            last = entry.last_bucket
+            if bucket != last:
+                if bucket - last >= buckets:
+                    # Finestra interamente scaduta
+                    entry.ring = array("I", self._zeros)
+                    entry.total = 0
+                    entry.last_bucket = bucket
+                elif bucket > last:
+                    # Azzera gli intervalli usciti dalla finestra
+                    ring = entry.ring
+                    for b in range(last + 1, bucket + 1):
+                        slot = b % buckets
+                        entry.total -= ring[slot]
+                        ring[slot] = 0
+                    entry.last_bucket = bucket
+                elif last - bucket >= buckets:
+                    return entry  # Evento (fuori ordine) gia' uscito dalla finestra
+
+        entry.ring[bucket % buckets] += amount
+        entry.total += amount
+        return entry
+
+    def top(self, limit=10):
+        """Chiavi con piu' eventi nell'ultima finestra osservata"""
+        ranked = sorted(self._entries.items(), key=lambda item: item[1].total, reverse=True)
+        return [(key, entry.total) for key, entry in ranked[:limit] if entry.total]
+
+    def clear(self):
+        self._entries.clear()
+
+
+class BruteForceDetector:
+    """
+    Rileva gli attacchi a forza bruta da tentativi SSH falliti.
+
+    Conta i tentativi per indirizzo IP, per rete (/24 IPv4, /64 IPv6) e per nome utente su una
+    finestra scorrevole; quando un contatore supera la propria soglia restituisce un solo
+    evento, ripetuto solo dopo che il contatore e' sceso sotto meta' soglia. Una soglia pari a
+    0 disattiva il relativo controllo. La memoria e' limitata dalla capacita' delle tabelle.
+
+    sshd scrive piu' righe per lo stesso tentativo ("Invalid user", "Failed password for invalid
+    user", "Connection closed ... [preauth]"): le righe della stessa connessione (IP e porta)
+    vengono contate una sola volta per tentativo (vedi _is_attempt).
+    """
+
+    SCOPES = ("ip", "subnet", "user")
+
+    def __init__(self, window=600, buckets=10, ip_threshold=10, subnet_threshold=50, user_threshold=100,
+                 max_ips=20000, max_subnets=5000, max_users=5000, max_connections=20000):
+        self.buckets = buckets
+        self.capacities = {"ip": max_ips, "subnet": max_subnets, "user": max_users}
+        self.thresholds = {"ip": ip_threshold, "subnet": subnet_threshold, "user": user_threshold}
+        self.max_connections = max_connections
+        # (IP, porta) -> "invalid" (contata da "Invalid user", il primo "Failed" e' gia' incluso)
+        # oppure "counted"; le connessioni meno recenti vengono scartate oltre max_connections
+        self._connections = OrderedDict()
+        self._connection_evictions = 0
+        self._lock = threading.Lock()
+        self._build(window)
+
+    def _build(self, window):
+        self.window = window
+        self.counters = {scope: SlidingCounter(window, self.buckets, self.capacities[scope])
+                         for scope in self.SCOPES}
+
+    def configure(self, config):
+        """Aggiorna soglie e finestra dalla configurazione (un cambio di finestra azzera i contatori)"""
+        with self._lock:
+            self.thresholds = {
+                "ip": config.get("bruteforce_ip_threshold", self.thresholds["ip"]),
+                "subnet": config.get("bruteforce_subnet_threshold", self.thresholds["subnet"]),
+                "user": config.get("bruteforce_user_threshold", self.thresholds["user"]),
+            }
+            window = config.get("bruteforce_window", self.window)
+            if window != self.window and window > 0:
+                self._build(window)
+
+    def _is_attempt(self, kind, source_ip, port):
+        """Vero se la riga corrisponde a un nuovo tentativo; chiamato con il lock acquisito"""
+        if kind is None:
+            return True
+        connections = self._connections
+        connection = (source_ip, port)
+        state = connections.pop(connection, None)
+        if kind == "preauth_closed":
+            # Conta solo le connessioni senza altre righe (es. server con la sola chiave pubblica)
+            return state is None
+        connections[connection] = "invalid" if kind == "invalid_user" else "counted"
+        if len(connections) > self.max_connections:
+            connections.popitem(last=False)
+            self._connection_evictions += 1
+        # Il primo "Failed ... invalid user" segue la riga "Invalid user", gia' contata
+        return not (kind == "failed" and state == "invalid")
+
+    def observe(self, source_ip, username, timestamp, kind=None, port=None, now=None):
+        """
+        Registra una riga di tentativo fallito (`kind` e `port` come in SSHFailure; senza `kind`
+        ogni riga e' un tentativo). Restituisce la lista degli (ambito, chiave, conteggio) che
+        hanno appena superato la soglia. Con `now`, le righe piu' vecchie della finestra (es.
+        arretrato riletto all'avvio) vengono ignorate.
+        """
+        crossed = []
+        if now is not None and now - timestamp > self.window:
+            return crossed
+        keys = (("ip", source_ip), ("subnet", subnet_of(source_ip)), ("user", username))
+        with self._lock:
+            if not self._is_attempt(kind, source_ip, port):
+                return crossed
+            for scope, key in keys:
+                threshold = self.thresholds[scope]
+                if threshold <= 0 or not key:
+                    continue
+                entry = self.counters[scope].add(key, timestamp)
+                if entry.total >= threshold:
+                    if not entry.alerted:
+                        entry.alerted = True
+                        crossed.append((scope, key, entry.total))
+                elif entry.alerted and entry.total < threshold / 2:
+                    entry.alerted = False
+        return crossed
+
+    def stats(self):
+        """Chiavi in memoria e chiavi scartate per ambito"""
+        with self._lock:
+            stats = {scope: {"tracked": len(counter), "evicted": counter.evictions}
+                     for scope, counter in self.counters.items()}
+            stats["connections"] = {"tracked": len(self._connections), "evicted": self._connection_evictions}
+            return stats
@@ -0,0 +1,223 @@
+import gzip
+import hmac
+import json
+import math
+import re
+import threading
+import time
+
+from flask import Blueprint, request, jsonify
+from telegram.utils.helpers import escape_markdown
+
+from agent import apply_delta, unflatten
+from net_rates import format_rate
+from disks import format_eta
+
+MAX_BODY = 4 * 1024 * 1024  # Dimensione massima di una richiesta decompressa
+HOST_NAME_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,40}$")  # Entra nei 64 bytes dei callback Telegram
+
+
+class RemoteHost:
+    """Ultimo stato ricevuto da un agente"""
+    __slots__ = ("name", "agent_id", "seq", "state", "interval", "last_seen", "pushes", "bytes", "events")
+
+    def __init__(self, name):
+        self.name = name
+        self.agent_id = None
+        self.seq = None
+        self.state = {}  # Stato appiattito (vedi agent.flatten)
+        self.interval = 10.0
+        self.last_seen = None
+        self.pushes = 0
+        self.bytes = 0
+        self.events = 0
+
+
+class HostRegistry:
+    """
+    Stato degli host che inviano dati al collector (modalita' multi-host).
+
+    apply() accetta un invio di un agente: uno stato completo lo sostituisce, una differenza
+    viene applicata solo se `base` coincide con l'ultimo invio accettato dallo stesso agente;
+    altrimenti la risposta e' 409 e l'agente reinvia lo stato completo. Gli eventi vengono
+    sempre restituiti al chiamante, anche quando lo stato va reinviato.
+    """
+
+    def __init__(self, max_hosts=1000):
+        self.max_hosts = max_hosts
+        self.hosts = {}
+        self._lock = threading.Lock()
+
+    def apply(self, payload, size=0, now=None):
+        """Restituisce (stato HTTP, corpo della risposta, eventi)"""
+        now = time.time() if now is None else now
+        name = payload.get("host")
+        if not isinstance(name, str) or not HOST_NAME_PATTERN.match(name):
+            return 400, {"error": "nome host non valido"}, []
+        # Validati prima di toccare lo stato: un payload malformato non deve lasciare un host a meta'
+        values = payload.get("values", {})
+        removed = payload.get("removed", [])
+        events = payload.get("events", [])
+        if not isinstance(values, dict) or not isinstance(events, list) or not isinstance(removed, list) \
+                or not all(isinstance(path, str) for path in removed):
+            return 400, {"error": "richiesta non valida"}, []
+        interval = payload.get("interval")
+        if interval is not None:
+            try:
+                interval = float(interval)
+            except (TypeError, ValueError):
+                return 400, {"error": "intervallo non valido"}, []
+            if not math.isfinite(interval) or interval <= 0:
+                return 400, {"error": "intervallo non valido"}, []
+        events = [event for event in events if isinstance(event, dict) and "message" in event]
+        with self._lock:
+            host = self.hosts.get(name)
+            if host is None:
+                if len(self.hosts) >= self.max_hosts:
+                    return 503, {"error": "troppi host registrati"}, []
+                host = self.hosts[name] = RemoteHost(name)
+            host.last_seen = now
+            host.pushes += 1
+            host.bytes += size
+            host.events += len(events)
+            if interval is not None:
+                host.interval = interval
+            seq = payload.get("seq")
+            if payload.get("full"):
+                host.state = dict(values)
+            elif payload.get("agent_id") != host.agent_id or payload.get("base") != host.seq:
+                # Base sconosciuta (riavvio del collector o dell'agente, risposta persa)
+                host.seq = None
+                return 409, {"resync": True}, events
+            else:
+                apply_delta(host.state, values, removed)
+            host.agent_id = payload.get("agent_id")
+            host.seq = seq
+        return 200, {"ack": seq}, events
+
+    def names(self):
+        with self._lock:
+            return sorted(self.hosts)
+
+    def get(self, name):
+        """(stato annidato, istante dell'ultimo invio) di un host, oppure None"""
+        with self._lock:
+            host = self.hosts.get(name)
+            if host is None or not host.state:
+                return None
+            return unflatten(host.state), host.last_seen
+
+    def silent(self, now=None, factor=3):
+        """Per ogni host: (nome, secondi dall'ultimo invio, limite oltre il quale e' considerato assente)"""
+        now = time.time() if now is None else now
+        with self._lock:
+            return [(host.name, now - host.last_seen, host.interval * factor)
+                    for host in self.hosts.values() if host.last_seen is not None]
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {host.name: {"last_seen": host.last_seen, "age": now - host.last_seen if host.last_seen else None,
+                                "pushes": host.pushes, "bytes": host.bytes, "events": host.events,
+                                "values": len(host.state), "interval": host.interval}
+                    for host in self.hosts.values()}
+
+
+def create_blueprint(registry, token, on_events):
+    """
+    Endpoint POST /agent/push per gli agenti. `on_events(host, eventi)` riceve gli allarmi
+    inoltrati; le richieste senza il token condiviso (header X-Agent-Token) vengono rifiutate.
+    """
+    blueprint = Blueprint("collector", __name__)
+
+    @blueprint.route("/agent/push", methods=["POST"])
+    def agent_push():
+        if not token or not hmac.compare_digest(request.headers.get("X-Agent-Token", ""), token):
+            return jsonify({"error": "token non valido"}), 401
+        if (request.content_length or 0) > MAX_BODY:
+            return jsonify({"error": "richiesta troppo grande"}), 413
+        body = request.get_data()
+        size = len(body)
+        try:
+            if request.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+                if len(body) > MAX_BODY:
+                    return jsonify({"error": "richiesta troppo grande"}), 413
+            payload = json.loads(body)
+        except (OSError, EOFError, ValueError):
+            return jsonify({"error": "richiesta non valida"}), 400
+        if not isinstance(payload, dict):
+            return jsonify({"error": "richiesta non valida"}), 400
+        status, response, events = registry.apply(payload, size)
+        if events:
+            on_events(payload["host"], events)
+        return jsonify(response), status
+
+    return blueprint
+
+
+# --- Testi per il bot, dallo stato ricevuto da un agente ---
+
+def _header(name, last_seen):
+    age = int(time.time() - last_seen)
+    return f"*{escape_markdown(name)}* (dati di {age} s fa)\n"
+
+
+def format_resources(name, data, last_seen):
+    memory, swap = data["memory"], data["swap"]
+    load = data.get("load_avg")
+    load_str = f"Load avg: {load[0]:.2f}, {load[1]:.2f}, {load[2]:.2f}" if load else "Load avg: non disponibile"
+    days, rest = divmod(int(data["uptime"]), 86400)
+    hours, rest = divmod(rest, 3600)
+    return (_header(name, last_seen) +
+            f"*Risorse di Sistema*\n"
+            f"CPU: *{data['cpu_percent']}%*\n"
+            f"RAM: *{memory['percent']}%* ({memory['used'] // (1024*1024)} MB / {memory['total'] // (1024*1024)} MB)\n"
+            f"Swap: *{swap['percent']}%* ({swap['used'] // (1024*1024)} MB / {swap['total'] // (1024*1024)} MB)\n"
+            f"{load_str}\n"
+            f"Uptime: {days}d {hours}h {rest // 60}m")
+
+
+def format_disks(name, data, last_seen):
+    lines = [_header(name, last_seen) + "*Informazioni Disco*"]
+    for disk in data.get("disks", []):
+        line = (f"{escape_markdown(disk['mountpoint'])} ({disk['fstype']}): *{disk['percent']}%* "
+                f"({disk['used'] / (1024**3):.1f} / {disk['total'] / (1024**3):.1f} GB)")
+        if disk.get("inodes_percent") is not None:
+            line += f", inode {disk['inodes_percent']}%"
+        if disk.get("eta") is not None:
+            line += f", pieno tra {format_eta(disk['eta'])}"
+        lines.append(line)
+    for mountpoint in data.get("quarantined", []):
+        lines.append(f"{escape_markdown(mountpoint)}: ⚠️ non risponde")
+    return "\n".join(lines)
+
+
+def format_network(name, data, last_seen):
+    network = data["network"]
+    total = network["total"]
+    lines = [_header(name, last_seen) + "*Informazioni Rete*",
+             f"Traffico attuale: ↓ {format_rate(total.get('rx_bytes', 0))} ↑ {format_rate(total.get('tx_bytes', 0))}",
+             f"Dati inviati: {total['bytes_sent'] / (1024**2):.2f} MB",
+             f"Dati ricevuti: {total['bytes_recv'] / (1024**2):.2f} MB",
+             "*Velocita' per interfaccia*:"]
+    interfaces = sorted(network.get("interfaces", {}).items(),
+                        key=lambda item: item[1].get("rx_bytes", 0) + item[1].get("tx_bytes", 0), reverse=True)
+    for nic, info in interfaces[:5]:
+        lines.append(f"{escape_markdown(nic)}: ↓ {format_rate(info.get('rx_bytes', 0))} "
+                     f"↑ {format_rate(info.get('tx_bytes', 0))}")
+    return "\n".join(lines)
+
+
+def format_processes(name, data, last_seen, limit=5, sort_by="cpu"):
+    """Processi principali inviati dall'agente (i primi per CPU dell'ultima classifica)"""
+    key = {"cpu": "cpu_percent", "rss": "rss", "io": "io_rate", "fds": "num_fds"}[sort_by]
+    processes = sorted(data.get("processes", []), key=lambda row: row[key], reverse=True)[:limit]
+    if not processes:
+        return _header(name, last_seen) + "Nessuna classifica dei processi ricevuta"
+    result = _header(name, last_seen) + f"*Top {limit} Processi*\n```\n"
+    result += f"{'PID':>7} {'CPU%':>6} {'RSS MB':>7} {'FD':>5} {'USER':12} {'NAME'}\n" + "-" * 50 + "\n"
+    for row in processes:
+        result += (f"{row['pid']:7d} {row['cpu_percent']:6.1f} {row['rss'] / (1024*1024):7.1f} "
+                   f"{row['num_fds']:5d} {row['username'][:12]:12} {row['name']}\n")
+    return result + "```"
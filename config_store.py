@@ -0,0 +1,329 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from collections.abc import Mapping
+
+from fswatch import create_inotify, IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE, IN_DELETE, IN_ATTRIB, IN_Q_OVERFLOW
+
+CONFIG_FILE = "config.json"
+
+DEFAULT_EXCLUDED_IPS = ["127.0.0.1", "192.168.0.0/16", "10.0.0.0/8", "172.16.0.0/12"]
+
+# Intervallo (secondi) di ogni controllo periodico eseguito dallo scheduler
+DEFAULT_CHECK_INTERVALS = {
+    "sample": 5,     # Campionamento delle risorse
+    "cpu": 10,
+    "ram": 10,
+    "disk": 30,
+    "network": 10,
+    "reboot": 30,
+    "auth_log": 30,  # Controllo di sicurezza di auth.log (le modifiche arrivano gia' via inotify)
+    "alerts": 5,     # Riepiloghi degli allarmi soppressi durante i cooldown
+    "processes": 60, # Classifica dei processi esportata in /metrics
+    "agents": 30,    # Agenti remoti silenziosi (solo in modalita' collector)
+    "geoip": 60,     # Ricarica dei database GeoIP (solo con GEOIP_DB)
+}
+
+DEFAULT_CONFIG = {
+    "cpu_threshold": 80,
+    "ram_threshold": 80,
+    "disk_threshold": 90,  # Soglia di spazio usato (%) per ogni punto di montaggio
+    "inode_threshold": 90,  # Soglia di inode usati (%) per ogni punto di montaggio (0 = disattivato)
+    "disk_mount_thresholds": {},  # Soglie per mount: {"/data": {"disk": 95, "inodes": 80}}
+    "net_threshold": 0,  # Soglia sul traffico totale (bytes/s, rx+tx); 0 = disattivato
+    "notify_ssh": True,
+    "notify_sftp": False,
+    "notify_reboot": True,
+    "excluded_ips": DEFAULT_EXCLUDED_IPS,
+    "top_processes": 5,
+    "alert_cooldown": 600,  # Secondi di silenzio dopo un allarme per la stessa metrica/sorgente
+    "alert_hysteresis": 5,  # Punti percentuali sotto soglia necessari per il messaggio di rientro
+    "alert_digest_window": 5,  # Secondi in cui gli allarmi di soglia vengono raccolti (SSH e brute-force partono subito)
+    "net_iface_thresholds": {},  # Soglie per interfaccia (bytes/s, rx+tx); net_threshold vale per il totale
+    "use_sock_diag": False,  # Conta i socket via netlink sock_diag invece di /proc/net
+    "notify_bruteforce": True,  # Allarmi sui tentativi SSH falliti
+    "bruteforce_window": 600,  # Finestra (secondi) dei contatori dei tentativi falliti
+    "bruteforce_ip_threshold": 10,  # Tentativi per singolo IP nella finestra (0 = disattivato)
+    "bruteforce_subnet_threshold": 50,  # Tentativi per rete /24 (IPv4) o /64 (IPv6)
+    "bruteforce_user_threshold": 100,  # Tentativi per nome utente, da qualsiasi IP
+    "check_intervals": DEFAULT_CHECK_INTERVALS,
+    "allow_profiling": False,  # Consente di avviare il profiler a campionamento da bot e web
+}
+
+
+def _freeze(value):
+    """Rende immutabili liste e dizionari annidati"""
+    if isinstance(value, dict):
+        return ConfigSnapshot({k: _freeze(v) for k, v in value.items()}, 0)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    """Converte uno snapshot (o parte di esso) in strutture JSON serializzabili"""
+    if isinstance(value, Mapping):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+def validate_config(raw):
+    """
+    Valida una configurazione grezza e la completa con i valori predefiniti.
+    Le chiavi sconosciute vengono mantenute; solleva ValueError se un valore non e' valido.
+    """
+    if not isinstance(raw, Mapping):
+        raise ValueError("la configurazione deve essere un oggetto JSON")
+
+    config = dict(DEFAULT_CONFIG)
+    config.update(_thaw(raw))
+
+    for key in ("cpu_threshold", "ram_threshold", "disk_threshold", "inode_threshold", "net_threshold",
+                "top_processes",
+                "alert_cooldown", "alert_hysteresis", "alert_digest_window", "bruteforce_window",
+                "bruteforce_ip_threshold", "bruteforce_subnet_threshold", "bruteforce_user_threshold"):
+        try:
+            config[key] = int(config[key])
+        except (TypeError, ValueError):
+            raise ValueError(f"{key} deve essere un numero intero")
+        if config[key] < 0:
+            raise ValueError(f"{key} non puo' essere negativo")
+    config["top_processes"] = max(1, min(20, config["top_processes"]))
+
+    if config["bruteforce_window"] == 0:
+        raise ValueError("bruteforce_window deve essere maggiore di zero")
+
+    for key in ("notify_ssh", "notify_sftp", "notify_reboot", "use_sock_diag", "notify_bruteforce",
+                "allow_profiling"):
+        config[key] = bool(config[key])
+
+    iface_thresholds = config["net_iface_thresholds"]
+    if isinstance(iface_thresholds, str):
+        # Formato del form: "eth0=1000000, eth1=500000"
+        pairs = [item.split("=", 1) for item in iface_thresholds.split(",") if item.strip()]
+        if any(len(pair) != 2 for pair in pairs):
+            raise ValueError("net_iface_thresholds deve avere il formato interfaccia=bytes/s")
+        iface_thresholds = {name.strip(): value.strip() for name, value in pairs}
+    if not isinstance(iface_thresholds, Mapping):
+        raise ValueError("net_iface_thresholds deve essere un oggetto")
+    try:
+        config["net_iface_thresholds"] = {str(k): int(v) for k, v in iface_thresholds.items()}
+    except (TypeError, ValueError):
+        raise ValueError("le soglie per interfaccia devono essere numeri interi")
+
+    mount_thresholds = config["disk_mount_thresholds"]
+    if isinstance(mount_thresholds, str):
+        # Formato del form: "/data=95, /var/lib/docker=90:80" (spazio[:inode])
+        parsed = {}
+        for item in mount_thresholds.split(","):
+            if not item.strip():
+                continue
+            mountpoint, sep, values = item.rpartition("=")
+            if not sep or not mountpoint.strip():
+                raise ValueError("disk_mount_thresholds deve avere il formato mount=spazio[:inode]")
+            disk, _, inodes = values.partition(":")
+            parsed[mountpoint.strip()] = {"disk": disk.strip(), **({"inodes": inodes.strip()} if inodes.strip() else {})}
+        mount_thresholds = parsed
+    if not isinstance(mount_thresholds, Mapping) or not all(isinstance(v, Mapping) for v in mount_thresholds.values()):
+        raise ValueError("disk_mount_thresholds deve essere un oggetto {mount: {disk, inodes}}")
+    try:
+        config["disk_mount_thresholds"] = {
+            str(mountpoint): {kind: int(value) for kind, value in limits.items() if kind in ("disk", "inodes")}
+            for mountpoint, limits in mount_thresholds.items()}
+    except (TypeError, ValueError):
+        raise ValueError("le soglie per mount devono essere numeri interi")
+
+    intervals = config["check_intervals"]
+    if not isinstance(intervals, Mapping):
+        raise ValueError("check_intervals deve essere un oggetto")
+    try:
+        # I controlli non indicati mantengono l'intervallo predefinito
+        intervals = {**DEFAULT_CHECK_INTERVALS, **{str(k): int(v) for k, v in intervals.items()}}
+    except (TypeError, ValueError):
+        raise ValueError("gli intervalli dei controlli devono essere numeri interi")
+    if any(value < 1 for value in intervals.values()):
+        raise ValueError("gli intervalli dei controlli devono essere di almeno 1 secondo")
+    config["check_intervals"] = intervals
+
+    excluded_ips = config["excluded_ips"]
+    if isinstance(excluded_ips, str):
+        excluded_ips = excluded_ips.split(",")
+    config["excluded_ips"] = [str(ip).strip() for ip in excluded_ips if str(ip).strip()]
+
+    return config
+
+
+class ConfigSnapshot(Mapping):
+    """Vista immutabile di una configurazione validata, con il numero di versione"""
+
+    __slots__ = ("_data", "version")
+
+    def __init__(self, data, version):
+        self._data = data
+        self.version = version
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f"ConfigSnapshot(v{self.version}, {self._data!r})"
+
+    def to_dict(self):
+        return _thaw(self)
+
+
+class ConfigStore:
+    """
+    Servizio di configurazione condiviso.
+
+    Mantiene in memoria un unico snapshot immutabile e validato di config.json; i lettori
+    ottengono lo snapshot corrente con get() senza mai riparsare il JSON. Il file viene
+    riletto solo quando cambiano inode/mtime/dimensione: con inotify quando disponibile,
+    altrimenti con un polling tramite stat.
+    """
+
+    def __init__(self, path, poll_interval=2.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._snapshot = None
+        self._file_key = None
+        self._version = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def version(self):
+        return self.get().version
+
+    def get(self):
+        """Restituisce lo snapshot corrente (caricandolo al primo accesso)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            self.refresh()
+            snapshot = self._snapshot
+        return snapshot
+
+    def _stat_key(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _publish(self, config, file_key):
+        self._version += 1
+        self._file_key = file_key
+        self._snapshot = ConfigSnapshot(
+            {k: _freeze(v) for k, v in config.items()}, self._version)
+
+    def refresh(self):
+        """Ricarica il file solo se e' cambiato; restituisce True se lo snapshot e' stato aggiornato"""
+        with self._lock:
+            file_key = self._stat_key()
+            if self._snapshot is not None and file_key == self._file_key:
+                return False
+
+            if file_key is None:
+                if self._snapshot is None:
+                    print(f"File di configurazione {self.path} non trovato, uso i valori predefiniti")
+                    self._publish(dict(DEFAULT_CONFIG), None)
+                    return True
+                self._file_key = None
+                return False
+
+            try:
+                with open(self.path) as f:
+                    config = validate_config(json.load(f))
+            except (OSError, ValueError) as e:
+                # Mantiene lo snapshot precedente se il file non e' leggibile o non e' valido
+                print(f"Errore nel caricamento della configurazione: {e}")
+                if self._snapshot is None:
+                    self._publish(dict(DEFAULT_CONFIG), file_key)
+                    return True
+                self._file_key = file_key
+                return False
+
+            self._publish(config, file_key)
+            print(f"Configurazione caricata (versione {self._version})")
+            return True
+
+    def save(self, new_config):
+        """
+        Valida e salva una nuova configurazione in modo atomico (file temporaneo + fsync + rename)
+        e la rende subito visibile ai lettori incrementando la versione.
+        """
+        config = validate_config(new_config)
+        directory = os.path.dirname(os.path.abspath(self.path))
+
+        with self._lock:
+            fd, tmp_path = tempfile.mkstemp(prefix=".config-", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(config, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                try:
+                    os.replace(tmp_path, self.path)
+                except OSError as e:
+                    # Es. config.json montato come singolo file in Docker: rename non possibile
+                    print(f"Rename atomico non riuscito ({e}), scrivo direttamente il file")
+                    with open(self.path, "w") as f:
+                        json.dump(config, f, indent=2)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    os.unlink(tmp_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+
+            self._publish(config, self._stat_key())
+            return self._snapshot
+
+    def start_watching(self):
+        """Avvia (una sola volta) il thread che osserva il file di configurazione"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._watch_loop, name="config-watcher", daemon=True)
+            self._thread.start()
+
+    def _watch_loop(self):
+        self.get()
+        inotify = create_inotify()
+        if inotify is not None:
+            try:
+                # Osserva la directory: il salvataggio atomico sostituisce l'inode del file
+                inotify.add_watch(os.path.dirname(os.path.abspath(self.path)),
+                                  IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_ATTRIB)
+            except OSError as e:
+                print(f"Impossibile osservare la configurazione con inotify: {e}")
+                inotify.close()
+                inotify = None
+
+        name = os.path.basename(self.path)
+        while True:
+            try:
+                if inotify is not None:
+                    events = inotify.read_events(timeout=60)
+                    if not events or any(n == name or m & IN_Q_OVERFLOW for _, m, n in events):
+                        self.refresh()
+                else:
+                    time.sleep(self.poll_interval)
+                    self.refresh()
+            except Exception as e:
+                print(f"Errore nel controllo della configurazione: {e}")
+                time.sleep(self.poll_interval)
+
+
+CONFIG_STORE = ConfigStore(CONFIG_FILE)
@@ -0,0 +1,314 @@
+import os
+import queue
+import select
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+# Punto di montaggio letto da /proc/self/mountinfo (campi compatibili con psutil.disk_partitions)
+Mount = namedtuple("Mount", ["device", "mountpoint", "fstype", "opts", "dev_id", "remote"])
+
+# Utilizzo di un punto di montaggio: i primi quattro campi come psutil.disk_usage
+DiskUsage = namedtuple("DiskUsage", [
+    "total", "used", "free", "percent",
+    "inodes_total", "inodes_used", "inodes_free", "inodes_percent",  # inodes_percent None se non gestiti
+    "fill_rate",  # Bytes/s di crescita (regressione sugli ultimi campioni), None se non stimabile
+    "eta",        # Secondi stimati al riempimento, None se lo spazio non sta crescendo
+])
+
+# Filesystem di rete: possono bloccare statvfs indefinitamente se il server non risponde
+REMOTE_FSTYPES = frozenset(("nfs", "nfs4", "cifs", "smb3", "smbfs", "ceph", "glusterfs", "9p",
+                            "fuse.sshfs", "fuse.glusterfs", "fuse.s3fs", "fuse.rclone", "davfs"))
+
+
+def _unescape(field):
+    """Decodifica le sequenze ottali di mountinfo (es. \\040 per lo spazio)"""
+    if "\\" not in field:
+        return field
+    out, i = [], 0
+    while i < len(field):
+        if field[i] == "\\" and field[i + 1:i + 4].isdigit():
+            out.append(chr(int(field[i + 1:i + 4], 8)))
+            i += 4
+        else:
+            out.append(field[i])
+            i += 1
+    return "".join(out)
+
+
+def _physical_fstypes(path="/proc/filesystems"):
+    """Filesystem con un dispositivo a blocchi (quelli non marcati "nodev"), come psutil"""
+    try:
+        with open(path) as f:
+            return frozenset(line.split()[0] for line in f if line.strip() and not line.startswith("nodev"))
+    except OSError:
+        return frozenset(("ext2", "ext3", "ext4", "xfs", "btrfs", "vfat", "zfs", "f2fs", "jfs", "reiserfs"))
+
+
+class MountTable:
+    """
+    Elenco dei punti di montaggio da controllare, riletto solo quando cambia la tabella.
+
+    Il descrittore di /proc/self/mountinfo resta aperto: il kernel lo segnala con POLLPRI ad
+    ogni mount/umount, quindi finche' non cambia nulla partitions() non legge ne' analizza il
+    file. Vengono tenuti i filesystem fisici (esclusi i dispositivi loop), quelli di rete e la
+    radice "/" anche se virtuale (overlay in Docker); dei bind mount dello stesso dispositivo
+    resta il primo.
+    """
+
+    def __init__(self, path="/proc/self/mountinfo"):
+        self.path = path
+        self.version = 0
+        self._physical = _physical_fstypes()
+        self._fd = None
+        self._poll = None
+        self._mounts = None
+        self._lock = threading.Lock()
+
+    def _changed(self):
+        if self._fd is None:
+            try:
+                self._fd = os.open(self.path, os.O_RDONLY)
+                self._poll = select.poll()
+                self._poll.register(self._fd, select.POLLPRI | select.POLLERR)
+            except OSError:
+                self._fd = None
+                return True  # Nessuna notifica: rilegge ogni volta
+            return True
+        try:
+            return bool(self._poll.poll(0))
+        except OSError:
+            return True
+
+    def _read(self):
+        chunks = []
+        offset = 0
+        while True:
+            data = os.pread(self._fd, 65536, offset) if self._fd is not None else b""
+            if not data:
+                break
+            chunks.append(data)
+            offset += len(data)
+        if self._fd is None:
+            with open(self.path, "rb") as f:
+                chunks.append(f.read())
+        return b"".join(chunks).decode(errors="replace")
+
+    def _parse(self, text):
+        mounts = []
+        seen = set()
+        for line in text.splitlines():
+            # id parent major:minor root mountpoint opzioni [campi opzionali] - fstype sorgente super_opzioni
+            left, _, right = line.partition(" - ")
+            fields = left.split()
+            tail = right.split()
+            if len(fields) < 6 or len(tail) < 2:
+                continue
+            dev_id, mountpoint, opts = fields[2], _unescape(fields[4]), fields[5]
+            fstype, device = tail[0], _unescape(tail[1])
+            remote = fstype in REMOTE_FSTYPES or fstype.startswith("nfs")
+            root = mountpoint == "/"
+            # La radice resta sempre, qualunque sia il tipo (es. overlay nei container Docker)
+            if not remote and not root and (fstype not in self._physical or "loop" in device):
+                continue
+            if dev_id in seen and not root:
+                continue  # Bind mount di un dispositivo gia' presente
+            seen.add(dev_id)
+            mounts.append(Mount(device, mountpoint, fstype, opts, dev_id, remote))
+        return mounts
+
+    def partitions(self):
+        """Punti di montaggio correnti (lista condivisa, da non modificare)"""
+        with self._lock:
+            if self._changed() or self._mounts is None:
+                try:
+                    self._mounts = self._parse(self._read())
+                except OSError as e:
+                    print(f"Errore nella lettura di {self.path}: {e}")
+                    if self._mounts is None:
+                        self._mounts = []
+                self.version += 1
+            return self._mounts
+
+
+class _StatvfsPool:
+    """
+    Thread (daemon) che eseguono os.statvfs. A differenza di ThreadPoolExecutor i thread non
+    vengono attesi alla chiusura del processo, quindi un mount bloccato non impedisce l'uscita;
+    se tutti i thread sono occupati (es. da mount bloccati) ne viene avviato un altro, fino a
+    `max_workers`.
+    """
+
+    def __init__(self, workers=2, max_workers=8):
+        self.workers = workers
+        self.max_workers = max_workers
+        self._queue = queue.Queue()
+        self._threads = 0
+        self._busy = 0
+        self._lock = threading.Lock()
+
+    def submit(self, path):
+        future = Future()
+        with self._lock:
+            waiting = self._busy + self._queue.qsize()
+            if self._threads < self.workers or (waiting >= self._threads and self._threads < self.max_workers):
+                self._threads += 1
+                threading.Thread(target=self._worker, name="statvfs", daemon=True).start()
+        self._queue.put((path, future))
+        return future
+
+    def _worker(self):
+        while True:
+            path, future = self._queue.get()
+            with self._lock:
+                self._busy += 1
+            try:
+                future.set_result(os.statvfs(path))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._busy -= 1
+
+
+class _MountState:
+    """Stato di un punto di montaggio tra un controllo e l'altro"""
+    __slots__ = ("pending", "quarantined_until", "backoff", "samples")
+
+    def __init__(self, rate_samples):
+        self.pending = None  # Future di una statvfs non ancora terminata
+        self.quarantined_until = 0.0
+        self.backoff = 0.0
+        self.samples = deque(maxlen=rate_samples)  # (istante, bytes usati)
+
+
+class DiskCollector:
+    """
+    Raccoglie l'utilizzo (spazio e inode) di tutti i punti di montaggio senza mai bloccarsi.
+
+    Le statvfs partono in parallelo in un pool di thread e ciascuna ha `timeout` secondi: un
+    mount che non risponde (es. NFS/CIFS irraggiungibile) viene messo in quarantena e
+    ricontrollato dopo `quarantine` secondi, raddoppiati ad ogni nuovo blocco fino a
+    `max_quarantine`; finche' la statvfs precedente non termina non ne parte un'altra, quindi
+    un mount bloccato occupa al piu' un thread. Dai campioni successivi viene stimata la
+    velocita' di riempimento (regressione lineare sugli ultimi `rate_window` secondi) e il
+    tempo rimanente al riempimento.
+    """
+
+    def __init__(self, mount_table=None, timeout=2.0, quarantine=60.0, max_quarantine=900.0,
+                 rate_window=3600.0, rate_samples=240, clock=time.monotonic):
+        self.mounts = mount_table or MountTable()
+        self.timeout = timeout
+        self.quarantine = quarantine
+        self.max_quarantine = max_quarantine
+        self.rate_window = rate_window
+        self.rate_samples = rate_samples
+        self.clock = clock
+        self._pool = _StatvfsPool()
+        self._states = {}
+        self._lock = threading.Lock()
+        self._last = None  # (istante, [(Mount, DiskUsage)], [Mount in quarantena])
+
+    def _usage(self, state, st, now):
+        total = st.f_blocks * st.f_frsize
+        free = st.f_bavail * st.f_frsize
+        used = (st.f_blocks - st.f_bfree) * st.f_frsize
+        # Come psutil: la percentuale esclude i blocchi riservati a root
+        percent = round(used * 100 / (used + free), 1) if used + free > 0 else 0.0
+        inodes_used = st.f_files - st.f_ffree
+        inodes_percent = None
+        if st.f_files > 0:
+            inodes_percent = round(inodes_used * 100 / (inodes_used + st.f_favail), 1) \
+                if inodes_used + st.f_favail > 0 else 0.0
+
+        samples = state.samples
+        if samples and now - samples[-1][0] < 1:
+            samples.pop()  # Campioni troppo ravvicinati: tiene il piu' recente
+        samples.append((now, used))
+        while now - samples[0][0] > self.rate_window:
+            samples.popleft()
+        fill_rate = eta = None
+        if len(samples) >= 2 and samples[-1][0] - samples[0][0] >= 30:
+            fill_rate = _slope(samples)
+            if fill_rate > 0:
+                eta = free / fill_rate
+        return DiskUsage(total, used, free, percent, st.f_files, inodes_used, st.f_favail, inodes_percent,
+                         fill_rate, eta)
+
+    def collect(self):
+        """Nuova lettura di tutti i mount; restituisce ([(Mount, DiskUsage)], [Mount in quarantena])"""
+        with self._lock:
+            now = self.clock()
+            mounts = self.mounts.partitions()
+            active = {mount.mountpoint for mount in mounts}
+            for mountpoint in [mp for mp in self._states if mp not in active]:
+                del self._states[mountpoint]  # Smontato: dimentica lo storico
+
+            submitted = []
+            quarantined = []
+            for mount in mounts:
+                state = self._states.get(mount.mountpoint)
+                if state is None:
+                    state = self._states[mount.mountpoint] = _MountState(self.rate_samples)
+                if state.pending is not None and not state.pending.done():
+                    quarantined.append(mount)  # La statvfs precedente e' ancora bloccata
+                    continue
+                if state.quarantined_until > now:
+                    quarantined.append(mount)
+                    continue
+                state.pending = self._pool.submit(mount.mountpoint)
+                submitted.append((mount, state))
+
+            results = []
+            deadline = now + self.timeout
+            for mount, state in submitted:
+                try:
+                    st = state.pending.result(timeout=max(0.0, deadline - self.clock()))
+                except FutureTimeout:
+                    state.backoff = min(self.max_quarantine, state.backoff * 2 or self.quarantine)
+                    state.quarantined_until = self.clock() + state.backoff
+                    quarantined.append(mount)
+                    print(f"Mount {mount.mountpoint} non risponde entro {self.timeout:g} s: "
+                          f"in quarantena per {state.backoff:g} s")
+                    continue
+                except OSError:
+                    state.pending = None
+                    continue  # Es. mount rimosso nel frattempo o permessi insufficienti
+                state.pending = None
+                state.backoff = 0.0
+                results.append((mount, self._usage(state, st, self.clock())))
+
+            self._last = (now, results, quarantined)
+            return results, quarantined
+
+    def get(self, max_age=None):
+        """Ultima lettura; ne fa una nuova se manca o e' piu' vecchia di `max_age` secondi"""
+        last = self._last
+        if last is None or (max_age is not None and self.clock() - last[0] > max_age):
+            return self.collect()
+        return last[1], last[2]
+
+
+def _slope(samples):
+    """Pendenza (bytes/s) della retta di regressione dei campioni (istante, valore)"""
+    n = len(samples)
+    t0 = samples[0][0]
+    mean_t = sum(t - t0 for t, _ in samples) / n
+    mean_v = sum(v for _, v in samples) / n
+    num = sum((t - t0 - mean_t) * (v - mean_v) for t, v in samples)
+    den = sum((t - t0 - mean_t) ** 2 for t, _ in samples)
+    return num / den if den > 0 else 0.0
+
+
+def format_eta(seconds):
+    """Tempo al riempimento in forma compatta (es. 3g 4h, 2h 10m, 45m)"""
+    seconds = int(seconds)
+    days, rest = divmod(seconds, 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes = rest // 60
+    if days:
+        return f"{days}g {hours}h"
+    if hours:
+        return f"{hours}h {minutes}m"
+    return f"{max(1, minutes)}m"
@@ -0,0 +1,240 @@
+import gzip
+import json
+import threading
+from collections import namedtuple
+
+PREFIX = "server_monitor_"
+
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Contenuto pre-serializzato di un campionamento (testo Prometheus, OpenMetrics e JSON, in chiaro e compressi)
+Rendered = namedtuple("Rendered", ["timestamp", "version", "metrics", "metrics_gzip", "openmetrics", "openmetrics_gzip",
+                                   "json", "json_gzip"])
+
+
+def _escape(value):
+    """Valore di un'etichetta secondo il formato di esposizione (\\, " e a capo)"""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class _Family:
+    """Famiglia di metriche in costruzione: intestazione (HELP/TYPE) e campioni"""
+    __slots__ = ("name", "kind", "help", "samples")
+
+    def __init__(self, name, kind, help_text):
+        self.name = PREFIX + name
+        self.kind = kind
+        self.help = help_text
+        self.samples = []
+
+    def add(self, value, suffix=None, **labels):
+        if value is None:
+            return
+        if suffix is None:
+            suffix = "_total" if self.kind == "counter" else ""
+        if labels:
+            label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            self.samples.append(f"{self.name}{suffix}{{{label_text}}} {_format_value(value)}")
+        else:
+            self.samples.append(f"{self.name}{suffix} {_format_value(value)}")
+
+    def render(self, out, openmetrics=False):
+        if not self.samples:
+            return
+        # OpenMetrics: la famiglia di un contatore ha il nome base e i campioni il suffisso _total;
+        # nel formato testo 0.0.4 HELP/TYPE devono usare lo stesso nome dei campioni
+        name = self.name if openmetrics or self.kind != "counter" else self.name + "_total"
+        out.append(f"# HELP {name} {self.help}")
+        out.append(f"# TYPE {name} {self.kind}")
+        out.extend(self.samples)
+
+
+def render_metrics(snapshot, processes=(), stats=None, openmetrics=False):
+    """
+    Esposizione di un'istantanea nel formato testo di Prometheus (0.0.4) oppure, con
+    `openmetrics`, in OpenMetrics; `stats` (Instrumentation.snapshot()) aggiunge le metriche
+    interne del monitor.
+    """
+    families = []
+
+    def family(name, kind, help_text):
+        f = _Family(name, kind, help_text)
+        families.append(f)
+        return f
+
+    family("sample_timestamp_seconds", "gauge", "Istante del campionamento").add(snapshot.timestamp)
+    family("cpu_usage_percent", "gauge", "Utilizzo della CPU").add(snapshot.cpu_percent)
+    family("uptime_seconds", "gauge", "Tempo dall'avvio del sistema").add(snapshot.uptime)
+
+    memory = snapshot.memory
+    family("memory_total_bytes", "gauge", "RAM totale").add(memory.total)
+    family("memory_available_bytes", "gauge", "RAM disponibile").add(memory.available)
+    family("memory_used_bytes", "gauge", "RAM usata").add(memory.used)
+    family("memory_usage_percent", "gauge", "Utilizzo della RAM").add(memory.percent)
+    swap = snapshot.swap
+    family("swap_total_bytes", "gauge", "Swap totale").add(swap.total)
+    family("swap_used_bytes", "gauge", "Swap usata").add(swap.used)
+
+    if snapshot.load_avg is not None:
+        load = family("load_average", "gauge", "Carico medio del sistema")
+        for period, value in zip(("1m", "5m", "15m"), snapshot.load_avg):
+            load.add(value, period=period)
+
+    counters = [
+        (family("network_receive_bytes", "counter", "Bytes ricevuti"), "bytes_recv"),
+        (family("network_transmit_bytes", "counter", "Bytes inviati"), "bytes_sent"),
+        (family("network_receive_packets", "counter", "Pacchetti ricevuti"), "packets_recv"),
+        (family("network_transmit_packets", "counter", "Pacchetti inviati"), "packets_sent"),
+        (family("network_receive_errors", "counter", "Errori in ricezione"), "errin"),
+        (family("network_transmit_errors", "counter", "Errori in trasmissione"), "errout"),
+        (family("network_receive_drops", "counter", "Pacchetti scartati in ricezione"), "dropin"),
+        (family("network_transmit_drops", "counter", "Pacchetti scartati in trasmissione"), "dropout"),
+    ]
+    for nic, nic_counters in snapshot.net_per_nic.items():
+        for f, field in counters:
+            f.add(getattr(nic_counters, field), interface=nic)
+    rx_rate = family("network_receive_rate_bytes_per_second", "gauge", "Velocita' di ricezione (media mobile)")
+    tx_rate = family("network_transmit_rate_bytes_per_second", "gauge", "Velocita' di trasmissione (media mobile)")
+    for nic, rate in snapshot.net_rates.items():
+        rx_rate.add(rate.rx_bytes, interface=nic)
+        tx_rate.add(rate.tx_bytes, interface=nic)
+
+    fs_size = family("filesystem_size_bytes", "gauge", "Dimensione del filesystem")
+    fs_used = family("filesystem_used_bytes", "gauge", "Spazio usato")
+    fs_free = family("filesystem_free_bytes", "gauge", "Spazio disponibile (utenti non root)")
+    fs_percent = family("filesystem_usage_percent", "gauge", "Spazio usato in percentuale")
+    fs_inodes = family("filesystem_inodes", "gauge", "Inode totali")
+    fs_inodes_used = family("filesystem_inodes_used", "gauge", "Inode usati")
+    fs_rate = family("filesystem_fill_rate_bytes_per_second", "gauge", "Velocita' di riempimento stimata")
+    fs_eta = family("filesystem_seconds_until_full", "gauge", "Tempo stimato al riempimento")
+    for mount, usage in snapshot.partitions:
+        labels = {"mountpoint": mount.mountpoint, "device": mount.device, "fstype": mount.fstype}
+        fs_size.add(usage.total, **labels)
+        fs_used.add(usage.used, **labels)
+        fs_free.add(usage.free, **labels)
+        fs_percent.add(usage.percent, **labels)
+        if usage.inodes_total:
+            fs_inodes.add(usage.inodes_total, **labels)
+            fs_inodes_used.add(usage.inodes_used, **labels)
+        fs_rate.add(usage.fill_rate, **labels)
+        fs_eta.add(usage.eta, **labels)
+    fs_hung = family("filesystem_unresponsive", "gauge", "Mount in quarantena (statvfs oltre il timeout)")
+    for mount in snapshot.quarantined:
+        fs_hung.add(1, mountpoint=mount.mountpoint, device=mount.device, fstype=mount.fstype)
+
+    proc_cpu = family("process_cpu_percent", "gauge", "CPU dei processi principali")
+    proc_rss = family("process_resident_memory_bytes", "gauge", "Memoria residente dei processi principali")
+    proc_fds = family("process_open_fds", "gauge", "Descrittori aperti dei processi principali")
+    for row in processes:
+        labels = {"pid": row.pid, "name": row.name, "user": row.username}
+        proc_cpu.add(row.cpu_percent, **labels)
+        proc_rss.add(row.rss, **labels)
+        proc_fds.add(row.num_fds, **labels)
+
+    if stats is not None:
+        _self_metrics(stats, family)
+
+    out = []
+    for f in families:
+        f.render(out, openmetrics)
+    if openmetrics:
+        out.append("# EOF")
+    return "\n".join(out) + "\n"
+
+
+def _self_metrics(stats, family):
+    """Latenze, contatori e risorse del processo del monitor"""
+    latency = family("self_latency_seconds", "histogram", "Durata delle fasi interne del monitor")
+    for phase, histogram in stats["histograms"].items():
+        cumulative = 0
+        for bound, count in histogram["buckets"]:
+            cumulative += count
+            latency.add(cumulative, "_bucket", phase=phase, le=repr(bound))
+        latency.add(histogram["count"], "_bucket", phase=phase, le="+Inf")
+        latency.add(histogram["count"], "_count", phase=phase)
+        latency.add(histogram["sum"], "_sum", phase=phase)
+    events = family("self_events", "counter", "Eventi elaborati dal monitor (righe, bytes, ...)")
+    for name, meter in stats["meters"].items():
+        events.add(meter["total"], name=name)
+    queues = family("self_queue_depth", "gauge", "Elementi in attesa nelle code interne")
+    for name, value in stats["gauges"].items():
+        if isinstance(value, (int, float)):
+            queues.add(value, name=name)
+    process = stats["process"]
+    family("self_cpu_seconds", "counter", "Tempo CPU del processo del monitor").add(process["cpu_seconds"])
+    family("self_resident_memory_bytes", "gauge", "Memoria residente del processo del monitor").add(process["rss"])
+    family("self_threads", "gauge", "Thread del processo del monitor").add(process["threads"])
+
+
+def snapshot_to_dict(snapshot, processes=()):
+    """Istantanea in strutture JSON serializzabili"""
+    return {
+        "timestamp": snapshot.timestamp,
+        "cpu_percent": snapshot.cpu_percent,
+        "memory": snapshot.memory._asdict(),
+        "swap": snapshot.swap._asdict(),
+        "load_avg": list(snapshot.load_avg) if snapshot.load_avg is not None else None,
+        "uptime": snapshot.uptime,
+        "network": {
+            "total": {**snapshot.net._asdict(), **snapshot.net_rate_total._asdict()},
+            "interfaces": {nic: {**counters._asdict(),
+                                 **(snapshot.net_rates[nic]._asdict() if nic in snapshot.net_rates else {})}
+                           for nic, counters in snapshot.net_per_nic.items()},
+        },
+        "disks": [{**mount._asdict(), **usage._asdict()} for mount, usage in snapshot.partitions],
+        "quarantined": [mount.mountpoint for mount in snapshot.quarantined],
+        "processes": [row._asdict() for row in processes],
+    }
+
+
+def representation_etag(rendered, field, compressed):
+    """ETag (senza virgolette) di una rappresentazione: formato e compressione cambiano i bytes"""
+    return f"{rendered.version}-{field}-gz" if compressed else f"{rendered.version}-{field}"
+
+
+class MetricsExporter:
+    """
+    Esposizione delle metriche per Prometheus (/metrics) e in JSON (/api/snapshot).
+
+    update() viene chiamato dal campionatore a ogni nuova istantanea: testo (nei due formati) e
+    JSON vengono serializzati e compressi con gzip una volta sola, e le richieste restituiscono
+    i bytes gia' pronti senza campionare ne' serializzare nulla, qualunque sia il numero di scrape.
+    """
+
+    def __init__(self, processes_func=None, stats_func=None, compresslevel=6):
+        self.processes_func = processes_func  # Processi principali da includere (lista di ProcessRow)
+        self.stats_func = stats_func  # Metriche interne (Instrumentation.snapshot)
+        self.compresslevel = compresslevel
+        self.rendered = None
+        self._lock = threading.Lock()
+
+    def update(self, snapshot):
+        processes = self.processes_func() if self.processes_func is not None else ()
+        stats = self.stats_func() if self.stats_func is not None else None
+        metrics = render_metrics(snapshot, processes, stats).encode()
+        openmetrics = render_metrics(snapshot, processes, stats, openmetrics=True).encode()
+        body = json.dumps(snapshot_to_dict(snapshot, processes), separators=(",", ":")).encode()
+        rendered = Rendered(
+            timestamp=snapshot.timestamp,
+            version=f"{snapshot.timestamp:.6f}",
+            metrics=metrics,
+            # mtime=0: stesso contenuto, stessi bytes compressi
+            metrics_gzip=gzip.compress(metrics, self.compresslevel, mtime=0),
+            openmetrics=openmetrics,
+            openmetrics_gzip=gzip.compress(openmetrics, self.compresslevel, mtime=0),
+            json=body,
+            json_gzip=gzip.compress(body, self.compresslevel, mtime=0),
+        )
+        with self._lock:
+            # Un campione vecchio arrivato in ritardo non sostituisce uno piu' recente
+            if self.rendered is None or rendered.timestamp >= self.rendered.timestamp:
+                self.rendered = rendered
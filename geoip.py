@@ -0,0 +1,399 @@
+import csv
+import hashlib
+import ipaddress
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+
+IpInfo = namedtuple("IpInfo", ["country", "asn", "org"])
+
+MMDB_METADATA_MARKER = b"\xab\xcd\xefMaxMind.com"
+INDEX_MAGIC = b"SMGEOIP1"
+INDEX_HEADER = struct.Struct(">8sQQII")  # magic, dimensione e mtime del CSV, numero di intervalli, offset dei testi
+INDEX_RECORD = struct.Struct(">16s16sI")  # inizio, fine (IPv6 a 128 bit, IPv4 come ::ffff:a.b.c.d), offset dei dati
+IPV4_MAPPED = 0xFFFF << 32
+
+
+def _key(address):
+    """Indirizzo come 16 bytes big-endian: l'ordine dei bytes e' l'ordine degli indirizzi"""
+    value = int(address) + IPV4_MAPPED if address.version == 4 else int(address)
+    return value.to_bytes(16, "big")
+
+
+class MMDBReader:
+    """
+    Lettore di database MaxMind DB (.mmdb: GeoLite2/GeoIP2, DB-IP, ipinfo) senza dipendenze.
+
+    Il file e' mappato in memoria: una ricerca percorre l'albero binario del file (un nodo per
+    bit dell'indirizzo) e decodifica solo il record trovato. Nessuna parte del database viene
+    caricata in memoria all'apertura.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        marker = self._mm.rfind(MMDB_METADATA_MARKER, max(0, len(self._mm) - 128 * 1024))
+        if marker < 0:
+            raise ValueError(f"{path}: metadati MaxMind DB non trovati")
+        self._data_start = marker + len(MMDB_METADATA_MARKER)  # I metadati usano lo stesso formato dei dati
+        self.metadata, _ = self._decode(self._data_start)
+        self.node_count = self.metadata["node_count"]
+        self.record_size = self.metadata["record_size"]
+        self.ip_version = self.metadata["ip_version"]
+        if self.record_size not in (24, 28, 32):
+            raise ValueError(f"{path}: dimensione dei record non supportata ({self.record_size})")
+        self._node_bytes = self.record_size // 4
+        self._data_start = self._node_bytes * self.node_count + 16
+        # Gli IPv4 in un albero IPv6 si trovano sotto ::/96
+        self._ipv4_start = 0
+        if self.ip_version == 6:
+            for _ in range(96):
+                if self._ipv4_start >= self.node_count:
+                    break
+                self._ipv4_start = self._read_node(self._ipv4_start, 0)
+
+    def _read_node(self, node, bit):
+        offset = node * self._node_bytes
+        mm = self._mm
+        if self.record_size == 24:
+            offset += bit * 3
+            return int.from_bytes(mm[offset:offset + 3], "big")
+        if self.record_size == 28:
+            middle = mm[offset + 3]
+            if bit:
+                return ((middle & 0x0F) << 24) | int.from_bytes(mm[offset + 4:offset + 7], "big")
+            return ((middle & 0xF0) << 20) | int.from_bytes(mm[offset:offset + 3], "big")
+        offset += bit * 4
+        return int.from_bytes(mm[offset:offset + 4], "big")
+
+    def lookup(self, address):
+        """Record (dizionario) della rete che contiene l'indirizzo, oppure None"""
+        if address.version == 4:
+            node, bits, value = self._ipv4_start, 32, int(address)
+        elif self.ip_version == 6:
+            node, bits, value = 0, 128, int(address)
+        else:
+            return None
+        for shift in range(bits - 1, -1, -1):
+            if node >= self.node_count:
+                break
+            node = self._read_node(node, (value >> shift) & 1)
+        if node <= self.node_count:
+            return None  # node_count indica "nessun dato"
+        record, _ = self._decode(self._data_start + node - self.node_count - 16)
+        return record
+
+    def _decode(self, offset):
+        """Decodifica un valore del formato MaxMind DB: (valore, offset successivo)"""
+        mm = self._mm
+        control = mm[offset]
+        offset += 1
+        kind = control >> 5
+        if kind == 1:  # Puntatore (relativo all'inizio della sezione dati)
+            size = (control >> 3) & 0x3
+            if size == 0:
+                pointer = ((control & 0x7) << 8) | mm[offset]
+            elif size == 1:
+                pointer = (((control & 0x7) << 16) | int.from_bytes(mm[offset:offset + 2], "big")) + 2048
+            elif size == 2:
+                pointer = (((control & 0x7) << 24) | int.from_bytes(mm[offset:offset + 3], "big")) + 526336
+            else:
+                pointer = int.from_bytes(mm[offset:offset + 4], "big")
+            value, _ = self._decode(self._data_start + pointer)
+            return value, offset + size + 1
+        if kind == 0:  # Tipo esteso
+            kind = 7 + mm[offset]
+            offset += 1
+        size = control & 0x1F
+        if size >= 29:
+            extra = size - 28
+            size = (29, 285, 65821)[extra - 1] + int.from_bytes(mm[offset:offset + extra], "big")
+            offset += extra
+        if kind == 2:
+            return mm[offset:offset + size].decode("utf-8"), offset + size
+        if kind == 7:
+            result = {}
+            for _ in range(size):
+                key, offset = self._decode(offset)
+                result[key], offset = self._decode(offset)
+            return result, offset
+        if kind == 11:
+            result = []
+            for _ in range(size):
+                item, offset = self._decode(offset)
+                result.append(item)
+            return result, offset
+        if kind in (5, 6, 9, 10):  # Interi senza segno
+            return int.from_bytes(mm[offset:offset + size], "big"), offset + size
+        if kind == 8:
+            return int.from_bytes(mm[offset:offset + size].rjust(4, b"\0"), "big", signed=True), offset + size
+        if kind == 3:
+            return struct.unpack(">d", mm[offset:offset + 8])[0], offset + 8
+        if kind == 15:
+            return struct.unpack(">f", mm[offset:offset + 4])[0], offset + 4
+        if kind == 14:
+            return bool(size), offset
+        if kind == 4:
+            return bytes(mm[offset:offset + size]), offset + size
+        raise ValueError(f"{self.path}: tipo di dato MaxMind DB non valido ({kind})")
+
+    def info(self, address):
+        record = self.lookup(address)
+        if not record:
+            return None
+        country = record.get("country")
+        if isinstance(country, dict):
+            country = country.get("iso_code")
+        asn = record.get("autonomous_system_number") or record.get("asn")
+        if isinstance(asn, str):
+            asn = int(asn[2:]) if asn.upper().startswith("AS") and asn[2:].isdigit() else None
+        org = record.get("autonomous_system_organization") or record.get("as_name") or record.get("org")
+        return IpInfo(country or None, asn or None, org or None)
+
+
+def _parse_range_rows(path):
+    """
+    Righe di un database CSV: "inizio,fine,paese,asn,organizzazione" oppure "rete_cidr,paese,asn,org".
+    Con estensione .tsv viene letto il formato di iptoasn.com ("inizio fine asn paese organizzazione").
+    Righe vuote, commenti (#) e intestazioni vengono ignorati.
+    """
+    tsv = path.endswith(".tsv")
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        for row in csv.reader(f, delimiter="\t" if tsv else ","):
+            if not row or row[0].startswith("#"):
+                continue
+            try:
+                if "/" in row[0]:
+                    network = ipaddress.ip_network(row[0].strip(), strict=False)
+                    start, end, fields = network.network_address, network.broadcast_address, row[1:]
+                else:
+                    start, end = ipaddress.ip_address(row[0].strip()), ipaddress.ip_address(row[1].strip())
+                    fields = row[2:]
+            except (ValueError, IndexError):
+                continue  # Intestazione o riga non valida
+            fields = [field.strip() for field in fields] + [""] * 3
+            if tsv:
+                asn, country, org = fields[:3]
+            else:
+                country, asn, org = fields[:3]
+            asn = asn[2:] if asn.upper().startswith("AS") else asn
+            yield (_key(start), _key(end), country if country not in ("", "None", "-", "ZZ") else None,
+                   int(asn) if asn.isdigit() and int(asn) else None, org if org not in ("", "Not routed") else None)
+
+
+def build_range_index(source, index_path):
+    """
+    Compila un database CSV in un indice binario ordinato: intestazione, record a dimensione
+    fissa (inizio, fine, offset) e testi deduplicati. Scrittura atomica (file temporaneo + rename).
+    """
+    stat = os.stat(source)
+    rows = sorted(_parse_range_rows(source))
+    strings = bytearray()
+    offsets = {}
+    records = bytearray()
+    for start, end, country, asn, org in rows:
+        data = (country, asn, org)
+        offset = offsets.get(data)
+        if offset is None:
+            encoded = json.dumps(data, separators=(",", ":")).encode()
+            offset = offsets[data] = len(strings)
+            strings += struct.pack(">H", len(encoded)) + encoded
+        records += INDEX_RECORD.pack(start, end, offset)
+    header = INDEX_HEADER.pack(INDEX_MAGIC, stat.st_size, stat.st_mtime_ns, len(rows),
+                               INDEX_HEADER.size + len(records))
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(index_path)), prefix=".geoip-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(records)
+            f.write(strings)
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return len(rows)
+
+
+class RangeIndex:
+    """
+    Database a intervalli (CSV) letto tramite l'indice compilato da build_range_index().
+
+    L'indice viene ricompilato solo quando il CSV cambia (dimensione o mtime registrati
+    nell'intestazione) ed e' mappato in memoria: una ricerca e' una ricerca binaria sui
+    record a dimensione fissa, senza caricare il database. Il nome del file dell'indice
+    dipende dal percorso completo, dalla dimensione e dall'mtime del CSV, cosi' database con
+    lo stesso nome in cartelle diverse non si sovrascrivono a vicenda.
+    """
+
+    def __init__(self, path, index_dir=None):
+        self.path = path
+        index_dir = index_dir or os.getenv("GEOIP_INDEX_DIR") or tempfile.gettempdir()
+        stat = os.stat(path)
+        prefix = f"{os.path.basename(path)}.{hashlib.sha1(os.path.realpath(path).encode()).hexdigest()[:12]}."
+        version = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:8]
+        self.index_path = os.path.join(index_dir, prefix + version + ".idx")
+        if not self._index_valid():
+            count = build_range_index(path, self.index_path)
+            print(f"Indice GeoIP compilato: {count} intervalli da {path}")
+            # Indici delle versioni precedenti dello stesso CSV
+            for name in os.listdir(index_dir):
+                if name.startswith(prefix) and name.endswith(".idx") and name != os.path.basename(self.index_path):
+                    try:
+                        os.unlink(os.path.join(index_dir, name))
+                    except OSError:
+                        pass
+        with open(self.index_path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _, _, _, self.count, self._strings = INDEX_HEADER.unpack_from(self._mm, 0)
+
+    def _index_valid(self):
+        try:
+            stat = os.stat(self.path)
+            with open(self.index_path, "rb") as f:
+                header = f.read(INDEX_HEADER.size)
+            magic, size, mtime_ns, _, _ = INDEX_HEADER.unpack(header)
+        except (OSError, struct.error):
+            return False
+        return magic == INDEX_MAGIC and size == stat.st_size and mtime_ns == stat.st_mtime_ns
+
+    def info(self, address):
+        key = _key(address)
+        mm = self._mm
+        record_size = INDEX_RECORD.size
+        base = INDEX_HEADER.size
+        # Ultimo intervallo con inizio <= indirizzo
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset = base + middle * record_size
+            if mm[offset:offset + 16] <= key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == 0:
+            return None
+        _, end, data = INDEX_RECORD.unpack_from(mm, base + (low - 1) * record_size)
+        if key > end:
+            return None
+        offset = self._strings + data
+        (length,) = struct.unpack_from(">H", mm, offset)
+        return IpInfo(*json.loads(mm[offset + 2:offset + 2 + length]))
+
+
+class GeoIPDatabase:
+    """
+    Arricchimento offline degli IP (paese, ASN, organizzazione) per gli allarmi SSH.
+
+    Legge uno o piu' database locali (.mmdb, oppure CSV/TSV a intervalli); i campi mancanti in
+    un database vengono presi dal successivo (es. GeoLite2-Country + GeoLite2-ASN). Gli IP
+    recenti restano in una cache LRU. refresh() riapre i database sostituiti su disco (da
+    chiamare periodicamente): le ricerche in corso continuano sulla versione precedente, per
+    cui i file vanno aggiornati con una sostituzione atomica (mv), non riscritti sul posto.
+    """
+
+    def __init__(self, paths=(), cache_size=4096):
+        self.paths = [path for path in paths if path]
+        self.cache_size = cache_size
+        self.counters = {"lookups": 0, "hits": 0, "reloads": 0, "errors": 0}
+        self._readers = []  # (percorso, firma del file, lettore)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.paths)
+
+    def refresh(self):
+        """Apre i database nuovi o modificati; True se qualcosa e' cambiato"""
+        current = {path: (signature, reader) for path, signature, reader in self._readers}
+        readers = []
+        changed = False
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                if path in current:
+                    print(f"Database GeoIP non piu' disponibile: {path}")
+                changed |= path in current
+                continue
+            signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+            if path in current and current[path][0] == signature:
+                readers.append((path, signature, current[path][1]))
+                continue
+            try:
+                reader = MMDBReader(path) if path.endswith(".mmdb") else RangeIndex(path)
+            except (OSError, ValueError, KeyError) as e:
+                self.counters["errors"] += 1
+                print(f"Errore nell'apertura del database GeoIP {path}: {e}")
+                if path in current:
+                    readers.append((path, current[path][0], current[path][1]))  # Resta la versione precedente
+                continue
+            print(f"Database GeoIP caricato: {path}")
+            readers.append((path, signature, reader))
+            changed = True
+        if changed:
+            with self._lock:
+                # I lettori sostituiti vengono chiusi dal garbage collector, dopo le ricerche in corso
+                self._readers = readers
+                self._cache.clear()
+                self.counters["reloads"] += 1
+        return changed
+
+    def lookup(self, ip):
+        """IpInfo dell'indirizzo, oppure None (IP privato, non valido o non presente)"""
+        with self._lock:
+            self.counters["lookups"] += 1
+            # La cache usa il testo dell'IP: un IP ripetuto non viene nemmeno analizzato
+            if ip in self._cache:
+                self._cache.move_to_end(ip)
+                self.counters["hits"] += 1
+                return self._cache[ip]
+            readers = self._readers
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        if not address.is_global:
+            return None
+        info = None
+        for _, _, reader in readers:
+            try:
+                found = reader.info(address)
+            except (ValueError, IndexError, struct.error) as e:
+                self.counters["errors"] += 1
+                print(f"Errore nella ricerca GeoIP di {ip}: {e}")
+                continue
+            if found is not None:
+                info = found if info is None else IpInfo(*(a or b for a, b in zip(info, found)))
+                if all(info):
+                    break
+        with self._lock:
+            if self.cache_size > 0 and readers is self._readers:
+                self._cache[ip] = info
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return info
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, cached=len(self._cache), databases=[path for path, _, _ in self._readers])
+
+
+def format_ip_info(info):
+    """Testo breve per i messaggi: "IT · AS3269 Telecom Italia" """
+    if info is None:
+        return ""
+    parts = []
+    if info.country:
+        parts.append(info.country)
+    if info.asn or info.org:
+        parts.append(" ".join(part for part in (f"AS{info.asn}" if info.asn else "", info.org or "") if part))
+    return " · ".join(parts)
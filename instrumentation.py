@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+
+import psutil
+
+# Limiti superiori (secondi) dei bucket degli istogrammi: da 100 us a circa 52 s, raddoppiando
+LATENCY_BUCKETS = tuple(0.0001 * 2 ** i for i in range(20))
+
+
+class Histogram:
+    """Istogramma di latenze a bucket fissi: osservare costa una ricerca binaria e un incremento"""
+    __slots__ = ("bounds", "counts", "count", "sum", "max", "_lock")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # L'ultimo bucket raccoglie i valori oltre il limite
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q, counts=None, count=None):
+        """Quantile stimato per interpolazione lineare nel bucket che lo contiene"""
+        counts = self.counts if counts is None else counts
+        count = self.count if count is None else count
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                low = self.bounds[index - 1] if index > 0 else 0.0
+                high = self.bounds[index] if index < len(self.bounds) else self.max
+                # Il massimo osservato limita la stima nel bucket piu' alto
+                return min(low + (high - low) * (rank - seen) / bucket_count, self.max)
+            seen += bucket_count
+        return self.max
+
+    def to_dict(self):
+        with self._lock:
+            counts, count, total, maximum = list(self.counts), self.count, self.sum, self.max
+        return {
+            "count": count,
+            "sum": total,
+            "avg": total / count if count else None,
+            "max": maximum,
+            "p50": self.quantile(0.5, counts, count),
+            "p95": self.quantile(0.95, counts, count),
+            "p99": self.quantile(0.99, counts, count),
+            "buckets": list(zip(self.bounds, counts)),  # Conteggi per bucket (non cumulativi)
+            "overflow": counts[-1],
+        }
+
+
+class Meter:
+    """Totale di un contatore e velocita' media sull'ultimo minuto (60 intervalli da 1 s)"""
+    __slots__ = ("total", "_slots", "_second", "_lock")
+
+    def __init__(self):
+        self.total = 0
+        self._slots = [0] * 60
+        self._second = 0
+        self._lock = threading.Lock()
+
+    def _advance(self, second):
+        # Chiamato con il lock acquisito: azzera gli intervalli usciti dalla finestra
+        if second - self._second >= 60:
+            self._slots = [0] * 60
+        else:
+            for s in range(self._second + 1, second + 1):
+                self._slots[s % 60] = 0
+        self._second = second
+
+    def mark(self, amount=1, now=None):
+        second = int(time.monotonic() if now is None else now)
+        with self._lock:
+            if second > self._second:
+                self._advance(second)
+            self._slots[second % 60] += amount
+            self.total += amount
+
+    def rate(self, now=None):
+        """Media al secondo sugli ultimi 60 secondi"""
+        second = int(time.monotonic() if now is None else now)
+        with self._lock:
+            if second > self._second:
+                self._advance(second)
+            return sum(self._slots) / 60
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Instrumentation:
+    """
+    Strumentazione interna del monitor: istogrammi delle latenze (fasi del campionamento,
+    controlli, invii Telegram), contatori con velocita' (righe e bytes di auth.log, match delle
+    regex) e valori letti al momento (profondita' delle code). Include CPU e memoria del
+    processo stesso.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.meters = {}
+        self.gauges = {}  # nome -> funzione senza argomenti
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._process = psutil.Process(os.getpid())
+        self._last_cpu = None  # (istante, tempo CPU del processo)
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    def observe(self, name, seconds):
+        self.histogram(name).observe(seconds)
+
+    def timer(self, name):
+        """Context manager che registra la durata del blocco nell'istogramma `name`"""
+        return _Timer(self.histogram(name))
+
+    def meter(self, name):
+        meter = self.meters.get(name)
+        if meter is None:
+            with self._lock:
+                meter = self.meters.setdefault(name, Meter())
+        return meter
+
+    def mark(self, name, amount=1):
+        self.meter(name).mark(amount)
+
+    def gauge(self, name, func):
+        """Registra un valore calcolato al momento della lettura (es. profondita' di una coda)"""
+        self.gauges[name] = func
+
+    def process_stats(self):
+        """CPU (media dall'ultima lettura), memoria, thread e descrittori del processo"""
+        proc = self._process
+        with proc.oneshot():
+            times = proc.cpu_times()
+            cpu_time = times.user + times.system
+            rss = proc.memory_info().rss
+            threads = proc.num_threads()
+            try:
+                fds = proc.num_fds()
+            except (psutil.AccessDenied, AttributeError):
+                fds = None
+        now = time.monotonic()
+        with self._lock:
+            previous, self._last_cpu = self._last_cpu, (now, cpu_time)
+        if previous is None:
+            cpu_percent = cpu_time / max(time.time() - self.started, 1e-6) * 100
+        else:
+            cpu_percent = (cpu_time - previous[1]) / max(now - previous[0], 1e-6) * 100
+        return {
+            "cpu_percent": round(cpu_percent, 2),
+            "cpu_seconds": cpu_time,
+            "rss": rss,
+            "threads": threads,
+            "fds": fds,
+            "uptime": time.time() - self.started,
+        }
+
+    def snapshot(self):
+        """Tutti i valori in strutture serializzabili"""
+        gauges = {}
+        for name, func in list(self.gauges.items()):
+            try:
+                gauges[name] = func()
+            except Exception as e:
+                gauges[name] = None
+                print(f"Errore nella lettura di {name}: {e}")
+        return {
+            "histograms": {name: h.to_dict() for name, h in sorted(self.histograms.items())},
+            "meters": {name: {"total": m.total, "rate": m.rate()} for name, m in sorted(self.meters.items())},
+            "gauges": gauges,
+            "process": self.process_stats(),
+        }
+
+
+# Istanza condivisa da monitor, scheduler, campionatore e coda Telegram
+INSTRUMENTS = Instrumentation()
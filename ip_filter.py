@@ -0,0 +1,72 @@
+import ipaddress
+from bisect import bisect_right
+
+
+class IPRangeMatcher:
+    """
+    Indice compilato degli IP/range esclusi.
+
+    Ogni voce (IP singolo o rete CIDR, IPv4 o IPv6) viene convertita una sola volta in un
+    intervallo intero [inizio, fine]; gli intervalli sovrapposti o adiacenti vengono fusi e
+    ordinati, cosi' la ricerca di un IP e' una singola ricerca binaria (O(log n)) invece di
+    una scansione lineare con riparsing di ogni rete.
+
+    L'oggetto e' immutabile dopo la costruzione: per cambiare la lista si costruisce un nuovo
+    matcher e si sostituisce il riferimento (assegnazione atomica).
+    """
+
+    __slots__ = ("entries", "invalid", "_starts", "_ends")
+
+    def __init__(self, entries):
+        self.entries = tuple(entries or ())
+        self.invalid = []
+        intervals = {4: [], 6: []}
+
+        for entry in self.entries:
+            entry = str(entry).strip()
+            if not entry:
+                continue
+            try:
+                network = ipaddress.ip_network(entry, strict=False)
+            except ValueError:
+                self.invalid.append(entry)
+                continue
+            intervals[network.version].append(
+                (int(network.network_address), int(network.broadcast_address)))
+
+        if self.invalid:
+            print(f"IP esclusi non validi ignorati: {', '.join(self.invalid)}")
+
+        self._starts = {}
+        self._ends = {}
+        for version, ranges in intervals.items():
+            starts, ends = [], []
+            for start, end in sorted(ranges):
+                # Fonde gli intervalli sovrapposti o contigui
+                if ends and start <= ends[-1] + 1:
+                    if end > ends[-1]:
+                        ends[-1] = end
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self._starts[version] = starts
+            self._ends[version] = ends
+
+    def __len__(self):
+        return len(self._starts[4]) + len(self._starts[6])
+
+    def contains_address(self, ip_obj):
+        """Verifica se un oggetto ipaddress e' coperto da uno degli intervalli"""
+        if ip_obj.version == 6 and ip_obj.ipv4_mapped is not None:
+            # sshd puo' loggare gli IPv4 come ::ffff:a.b.c.d
+            ip_obj = ip_obj.ipv4_mapped
+        starts = self._starts[ip_obj.version]
+        if not starts:
+            return False
+        value = int(ip_obj)
+        index = bisect_right(starts, value) - 1
+        return index >= 0 and value <= self._ends[ip_obj.version][index]
+
+    def __contains__(self, ip):
+        """Verifica se un IP (stringa) e' escluso; solleva ValueError se l'IP non e' valido"""
+        return self.contains_address(ipaddress.ip_address(ip))
@@ -0,0 +1,186 @@
+import json
+import os
+
+
+class LogTailer:
+    """
+    Lettore incrementale di un file di log, consapevole della rotazione.
+
+    Legge il file a blocchi di dimensione fissa con os.pread e restituisce solo righe complete:
+    l'eventuale riga finale incompleta viene tenuta in memoria fino alla chiamata successiva.
+    La posizione viene tracciata come (inode, offset), cosi' dopo una rotazione le righe
+    rimaste nel vecchio file (es. auth.log.1) vengono lette prima di passare al nuovo.
+    La memoria usata e' limitata a un blocco piu' una riga, indipendentemente dall'arretrato.
+
+    Il cursore viene salvato nello StateStore `store` con il nome `store_key`, insieme al numero
+    di rotazioni osservate; senza store si usa il file JSON `state_file`. Con entrambi, il file
+    viene letto solo se lo store non ha ancora un cursore (migrazione dal vecchio formato).
+    """
+
+    def __init__(self, path, state_file=None, chunk_size=64 * 1024, max_line_length=64 * 1024,
+                 rotated_suffixes=(".1",), store=None, store_key=None):
+        self.path = path
+        self.state_file = state_file
+        self.store = store
+        self.store_key = store_key or path
+        self.generation = 0  # Rotazioni osservate
+        self.chunk_size = chunk_size
+        self.max_line_length = max_line_length
+        self.rotated_suffixes = rotated_suffixes
+        self.offset = 0  # Posizione di lettura nel file aperto
+        self._fd = None
+        self._inode = None
+        self._partial = b""
+        self._restored = False
+
+    @property
+    def cursor(self):
+        """(inode, offset) dell'ultima riga completa consumata"""
+        return self._inode, self.offset - len(self._partial)
+
+    def _load_state(self):
+        """Legge il cursore salvato; accetta anche il vecchio formato con il solo offset"""
+        if self.store is not None:
+            saved = self.store.get_cursor(self.store_key)
+            if saved is not None:
+                inode, offset, self.generation = saved
+                return inode, offset
+        if self.state_file is None:
+            return None, 0
+        try:
+            with open(self.state_file) as f:
+                raw = f.read().strip()
+        except FileNotFoundError:
+            return None, 0
+        except Exception as e:
+            print(f"Errore nella lettura dell'ultima posizione: {e}")
+            return None, 0
+
+        try:
+            if raw.startswith("{"):
+                data = json.loads(raw)
+                return data.get("inode"), int(data.get("offset", 0))
+            return None, int(raw or "0")
+        except (ValueError, TypeError) as e:
+            print(f"Posizione salvata non valida ({e}), riparto dall'inizio")
+            return None, 0
+
+    def save_state(self):
+        """Salva il cursore: nello store (scrittura raggruppata) o nel file in modo atomico"""
+        inode, offset = self.cursor
+        if self.store is not None:
+            self.store.set_cursor(self.store_key, inode, offset, self.generation)
+            return
+        if self.state_file is None:
+            return
+        tmp_path = f"{self.state_file}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"inode": inode, "offset": offset}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            print(f"Errore nel salvataggio della posizione di lettura: {e}")
+
+    def _open(self, path, offset):
+        self.close()
+        self._fd = os.open(path, os.O_RDONLY)
+        st = os.fstat(self._fd)
+        self._inode = st.st_ino
+        # Se il file e' piu' corto della posizione salvata e' stato troncato
+        self.offset = offset if offset <= st.st_size else 0
+        self._partial = b""
+
+    def _restore(self):
+        """Riapre il file indicato dal cursore salvato, cercandolo anche tra i file ruotati"""
+        self._restored = True
+        inode, offset = self._load_state()
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            return
+
+        if inode is None or inode == current.st_ino:
+            self._open(self.path, offset)
+            return
+
+        # Il log e' stato ruotato mentre il monitor non era attivo: riprende dal file ruotato
+        for suffix in self.rotated_suffixes:
+            candidate = self.path + suffix
+            try:
+                if os.stat(candidate).st_ino == inode:
+                    print(f"Riprendo la lettura dal file ruotato {candidate}")
+                    self._open(candidate, offset)
+                    return
+            except FileNotFoundError:
+                continue
+
+        # File originale non piu' disponibile: riparte dall'inizio del log attuale
+        self.generation += 1
+        self._open(self.path, 0)
+
+    def _drain(self):
+        """Legge il file aperto fino alla fine, un blocco alla volta"""
+        chunks = 0
+        while True:
+            data = os.pread(self._fd, self.chunk_size, self.offset)
+            if not data:
+                return
+            self.offset += len(data)
+            lines = (self._partial + data).split(b"\n")
+            self._partial = lines.pop()
+            if len(self._partial) > self.max_line_length:
+                # Riga anomala senza terminatore: la consegna cosi' com'e' per limitare la memoria
+                lines.append(self._partial)
+                self._partial = b""
+            if lines:
+                yield lines
+            chunks += 1
+            if chunks % 16 == 0:
+                self.save_state()
+
+    def read_batches(self):
+        """
+        Generatore che restituisce liste di righe complete (bytes, senza newline) scritte dopo
+        l'ultima lettura. Il cursore viene salvato periodicamente e alla fine della lettura.
+        """
+        if not self._restored:
+            self._restore()
+
+        try:
+            while True:
+                if self._fd is not None:
+                    yield from self._drain()
+
+                try:
+                    current = os.stat(self.path)
+                except FileNotFoundError:
+                    # Tra la rotazione e la creazione del nuovo file: riprova al prossimo controllo
+                    return
+
+                if self._fd is None or current.st_ino != self._inode:
+                    if self._fd is not None:
+                        # Rotazione: legge le ultime righe scritte nel vecchio file prima di cambiare
+                        yield from self._drain()
+                        if self._partial:
+                            yield [self._partial]
+                            self._partial = b""
+                        print(f"Rotazione di {self.path} rilevata, passo al nuovo file")
+                        self.generation += 1
+                    self._open(self.path, 0)
+                    continue
+
+                if current.st_size < self.offset:
+                    print(f"{self.path} troncato, riparto dall'inizio")
+                    self.offset = 0
+                    self._partial = b""
+                    continue
+                return
+        finally:
+            self.save_state()
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,95 @@
+import os
+import threading
+
+from fswatch import (create_inotify, IN_MODIFY, IN_CLOSE_WRITE, IN_CREATE, IN_MOVED_TO,
+                     IN_MOVED_FROM, IN_DELETE, IN_Q_OVERFLOW)
+
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_CREATE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE
+
+
+class LogWatcher:
+    """
+    Thread che invoca `callback` appena il file di log viene modificato.
+
+    Usa inotify sulla directory del file (cosi' segue anche rotazioni e ricreazioni); se inotify
+    non e' disponibile ripiega su un polling adattivo con stat: intervallo minimo subito dopo
+    una modifica, raddoppiato ad ogni controllo a vuoto fino a `max_interval`.
+    Indipendente dal ciclo di campionamento delle risorse.
+    """
+
+    def __init__(self, path, callback, min_interval=0.25, max_interval=5.0, safety_interval=30.0,
+                 name="log-watcher"):
+        self.path = path
+        self.callback = callback
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.safety_interval = safety_interval
+        self.name = name
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _notify(self):
+        try:
+            self.callback()
+        except Exception as e:
+            print(f"Errore durante l'elaborazione di {self.path}: {e}")
+
+    def _run(self):
+        inotify = create_inotify()
+        if inotify is not None:
+            try:
+                inotify.add_watch(os.path.dirname(os.path.abspath(self.path)), _WATCH_MASK)
+            except OSError as e:
+                print(f"Impossibile osservare {self.path} con inotify: {e}")
+                inotify.close()
+                inotify = None
+
+        # Osserva il file prima di elaborare l'arretrato, cosi' nessuna scrittura va persa
+        last_key = self._stat_key()
+        # Elabora subito quanto scritto mentre il monitor non era attivo
+        self._notify()
+
+        if inotify is not None:
+            print(f"Monitoraggio di {self.path} tramite inotify")
+            self._run_inotify(inotify)
+        else:
+            print(f"Monitoraggio di {self.path} tramite polling adattivo")
+            self._run_polling(last_key)
+
+    def _run_inotify(self, inotify):
+        name = os.path.basename(self.path)
+        try:
+            while not self._stop.is_set():
+                events = inotify.read_events(timeout=self.safety_interval)
+                # Allo scadere del timeout ricontrolla comunque, nel caso un evento sia andato perso
+                if not events or any(n == name or m & IN_Q_OVERFLOW for _, m, n in events):
+                    self._notify()
+        finally:
+            inotify.close()
+
+    def _stat_key(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_ino, st.st_size, st.st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _run_polling(self, last_key):
+        interval = self.min_interval
+        while not self._stop.wait(interval):
+            key = self._stat_key()
+            if key != last_key:
+                last_key = key
+                interval = self.min_interval
+                self._notify()
+            else:
+                interval = min(interval * 2, self.max_interval)
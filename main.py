@@ -1,10 +1,27 @@
-from flask import Flask, render_template, request, redirect
+from flask import Flask, render_template, request, redirect, jsonify, Response, send_from_directory, abort
 from threading import Thread
-import json
-from monitor import monitor_loop, CONFIG_FILE
+import os
+import time
+from monitor import (monitor_loop, load_config, SAMPLER, SNAPSHOT_TTL, HISTORY, HISTORY_SERIES, STATE_STORE,
+                     SCHEDULER, METRICS, PROFILER, HOSTS, AGENT, get_self_stats, start_profiling,
+                     forward_agent_events)
+from telegram_bot import init_bot
+from config_store import CONFIG_STORE
+from agent import MONITOR_MODE
+from collector import create_blueprint
+from exposition import OPENMETRICS_TYPE, PROMETHEUS_TYPE, representation_etag
 
 app = Flask(__name__)
 
+# Modalita' collector: gli agenti inviano stato e allarmi a POST /agent/push (token in AGENT_TOKEN)
+if MONITOR_MODE == "collector":
+    app.register_blueprint(create_blueprint(HOSTS, os.getenv("AGENT_TOKEN"), forward_agent_events))
+
+@app.template_filter("datetime")
+def format_timestamp(timestamp):
+    """Istante Unix in formato leggibile (ora locale)"""
+    return time.strftime("%d/%m/%Y %H:%M:%S", time.localtime(timestamp))
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     if request.method == "POST":
@@ -23,32 +40,178 @@ def index():
             except ValueError:
                 pass
         
+        # Parametri degli allarmi (cooldown, isteresi, finestra del digest)
+        alert_settings = {}
+        for key in ("alert_cooldown", "alert_hysteresis", "alert_digest_window", "bruteforce_window",
+                    "bruteforce_ip_threshold", "bruteforce_subnet_threshold", "bruteforce_user_threshold"):
+            try:
+                alert_settings[key] = max(0, int(request.form[key]))
+            except (KeyError, ValueError):
+                pass
+        
+        # Intervalli dei controlli periodici (campi interval_<controllo>)
+        check_intervals = dict(load_config()["check_intervals"])
+        for name in check_intervals:
+            try:
+                check_intervals[name] = max(1, int(request.form[f"interval_{name}"]))
+            except (KeyError, ValueError):
+                pass
+        
         new_config = {
             "cpu_threshold": int(request.form["cpu"]),
             "ram_threshold": int(request.form["ram"]),
             "disk_threshold": int(request.form["disk"]),
+            "inode_threshold": int(request.form.get("inodes", 90)),
+            # Soglie per mount nel formato "/data=95, /var/lib/docker=90:80" (spazio[:inode])
+            "disk_mount_thresholds": request.form.get("disk_mount_thresholds", ""),
             "net_threshold": int(request.form["net"]),
             "notify_ssh": "ssh" in request.form,
             "notify_sftp": "sftp" in request.form,
             "notify_reboot": "reboot" in request.form,
+            "notify_bruteforce": "bruteforce" in request.form,
+            "use_sock_diag": "sock_diag" in request.form,
             "excluded_ips": excluded_ips,
-            "top_processes": top_processes
+            "top_processes": top_processes,
+            "allow_profiling": "allow_profiling" in request.form,
+            "check_intervals": check_intervals,
+            # Soglie per interfaccia nel formato "eth0=1000000, eth1=500000"
+            "net_iface_thresholds": request.form.get("net_iface_thresholds", ""),
+            **alert_settings
         }
-        with open(CONFIG_FILE, "w") as f:
-            json.dump(new_config, f, indent=2)
+        try:
+            # Scrittura atomica: i lettori vedono subito la nuova versione senza riparsare il file.
+            # Le chiavi non presenti nel form (modificate a mano nel file) vengono mantenute
+            CONFIG_STORE.save({**load_config().to_dict(), **new_config})
+        except ValueError as e:
+            return f"Configurazione non valida: {e}", 400
         return redirect("/")
 
-    with open(CONFIG_FILE) as f:
-        config = json.load(f)
-        # Assicurati che gli IP esclusi siano presenti nella configurazione
-        if "excluded_ips" not in config:
-            config["excluded_ips"] = ["127.0.0.1", "192.168.0.0/16", "10.0.0.0/8", "172.16.0.0/12"]
-        # Assicurati che top_processes sia presente nella configurazione
-        if "top_processes" not in config:
-            config["top_processes"] = 5
+    # Lo snapshot e' gia' validato e completo dei valori predefiniti
+    config = load_config()
     
-    return render_template("index.html", config=config)
+    # Stato attuale dall'istantanea condivisa (nessun campionamento nella richiesta)
+    try:
+        snapshot = SAMPLER.get(max_age=SNAPSHOT_TTL)
+    except Exception as e:
+        print(f"Errore nel recupero dell'istantanea: {e}")
+        snapshot = None
+    
+    return render_template("index.html", config=config, snapshot=snapshot, checks=SCHEDULER.stats())
+
+@app.route("/api/controlli")
+def api_controlli():
+    """Statistiche dei controlli periodici in JSON (durate, errori, timeout, turni saltati)"""
+    return jsonify(SCHEDULER.stats())
+
+@app.route("/api/agenti")
+def api_agenti():
+    """Host remoti (collector) oppure contatori di invio (agente)"""
+    return jsonify({"mode": MONITOR_MODE, "hosts": HOSTS.stats(),
+                    "agent": AGENT.stats() if AGENT is not None else None})
+
+@app.route("/api/storia")
+def api_storia():
+    """Riepilogo storico in JSON: ?minuti=60&serie=cpu (serie ripetibile, predefinite le principali)"""
+    try:
+        minutes = max(1, min(30 * 24 * 60, int(request.args.get("minuti", 60))))
+    except ValueError:
+        return jsonify({"error": "minuti non valido"}), 400
+    series = request.args.getlist("serie") or [name for name, _, _ in HISTORY_SERIES]
+    return jsonify({
+        "minuti": minutes,
+        "serie_disponibili": HISTORY.series(),
+        "serie": {name: HISTORY.query(name, minutes * 60) for name in series},
+    })
+
+def cached_response(field, mimetype, vary="Accept-Encoding"):
+    """Risposta dai bytes pre-serializzati dell'ultimo campionamento (con gzip ed ETag)"""
+    rendered = METRICS.rendered
+    if rendered is None:
+        return Response("Nessun campionamento disponibile\n", status=503, mimetype="text/plain")
+    # Qualita' dichiarata per gzip (0 con "gzip;q=0" o senza gzip ne' "*")
+    compressed = request.accept_encodings["gzip"] > 0
+    # Ogni rappresentazione ha il proprio ETag: un 304 vale solo per gli stessi bytes
+    etag = representation_etag(rendered, field, compressed)
+    headers = {"ETag": f'"{etag}"', "Vary": vary, "Cache-Control": "no-cache"}
+    if etag in request.if_none_match:
+        return Response(status=304, headers=headers)
+    if compressed:
+        body = getattr(rendered, field + "_gzip")
+        headers["Content-Encoding"] = "gzip"
+    else:
+        body = getattr(rendered, field)
+    return Response(body, headers=headers, content_type=mimetype)
+
+@app.route("/metrics")
+def metrics():
+    """Metriche per Prometheus (OpenMetrics se richiesto dall'header Accept)"""
+    openmetrics = any(value.split(";")[0].strip() == "application/openmetrics-text" and quality > 0
+                      for value, quality in request.accept_mimetypes)
+    if openmetrics:
+        return cached_response("openmetrics", OPENMETRICS_TYPE, vary="Accept, Accept-Encoding")
+    return cached_response("metrics", PROMETHEUS_TYPE, vary="Accept, Accept-Encoding")
+
+@app.route("/api/snapshot")
+def api_snapshot():
+    """Ultima istantanea delle risorse in JSON"""
+    return cached_response("json", "application/json")
+
+@app.route("/stats")
+def stats():
+    """Strumentazione interna: latenze, contatori, code, risorse del processo e profilazione"""
+    return render_template("stats.html", stats=get_self_stats(), now=time.time(),
+                           allow_profiling=load_config()["allow_profiling"])
+
+@app.route("/api/stats")
+def api_stats():
+    return jsonify(get_self_stats())
+
+@app.route("/stats/profilo", methods=["POST"])
+def stats_profilo():
+    """Avvia il profiler a campionamento (solo se allow_profiling e' attivo)"""
+    try:
+        seconds = int(request.form.get("secondi", 30))
+    except ValueError:
+        return "Durata non valida", 400
+    # L'esito si vede nella pagina: profilazione in corso, oppure modulo non mostrato se disattivata
+    start_profiling(seconds)
+    return redirect("/stats")
+
+@app.route("/stats/profili/<name>")
+def stats_profili(name):
+    """Scarica un file di profilazione (solo quelli prodotti dal profiler)"""
+    if name not in PROFILER.files():
+        abort(404)
+    return send_from_directory(PROFILER.directory, name, mimetype="text/plain", as_attachment=True)
+
+@app.route("/accessi")
+def accessi():
+    """Storico degli accessi SSH con filtri, paginazione e statistiche"""
+    page_size = 50
+    try:
+        days = max(1, min(3650, int(request.args.get("giorni", 7))))
+        page = max(1, int(request.args.get("pagina", 1)))
+    except ValueError:
+        return "Parametri non validi", 400
+    filters = {
+        "since": time.time() - days * 86400,
+        "ip": request.args.get("ip") or None,
+        "username": request.args.get("utente") or None,
+        "host": request.args.get("host") or None,
+        "external_only": "esterni" in request.args,
+    }
+    total = STATE_STORE.count_logins(**filters)
+    pages = max(1, (total + page_size - 1) // page_size)
+    page = min(page, pages)
+    logins = STATE_STORE.query_logins(limit=page_size, offset=(page - 1) * page_size, **filters)
+    stats = STATE_STORE.login_stats(since=filters["since"], external_only=filters["external_only"])
+    # Parametri correnti senza la pagina, per i link di paginazione
+    query = {key: value for key, value in request.args.items() if key != "pagina"}
+    return render_template("accessi.html", logins=logins, stats=stats, total=total, page=page, pages=pages,
+                           days=days, args=request.args, query=query)
 
 if __name__ == "__main__":
+    # Il bot (comandi e allarmi) parte con il server, non all'import dei moduli
+    init_bot()
     Thread(target=monitor_loop, daemon=True).start()
     app.run(host="0.0.0.0", port=5000)
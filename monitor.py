@@ -1,20 +1,72 @@
-import time, json, psutil, os, subprocess
-from telegram_bot import send_alert
+import time, os, atexit, threading, heapq
+from telegram_bot import init_bot, send_alert, get_outbox_stats
+from telegram.utils.helpers import escape_markdown
 from datetime import datetime
-import re
-import ipaddress
-import subprocess
-import requests
-from pathlib import Path
+from ip_filter import IPRangeMatcher
+from config_store import CONFIG_STORE, DEFAULT_EXCLUDED_IPS
+from log_tailer import LogTailer
+from log_watcher import LogWatcher
+from auth_parser import AuthLogParser, SSHFailure
+from bruteforce import BruteForceDetector
+from alert_manager import AlertManager
+from sampler import ResourceSampler
+from procfs import HostIdentity
+from disks import DiskCollector, format_eta
+from exposition import MetricsExporter, snapshot_to_dict
+from geoip import GeoIPDatabase, format_ip_info
+from instrumentation import INSTRUMENTS
+from profiler import SamplingProfiler, MAX_DURATION
+from scheduler import Scheduler, ScheduledTask, SKIP, COALESCE
+from top_processes import TopProcessEngine, SORT_LABELS
+from net_rates import format_rate
+from proc_net import count_sockets
+from timeseries import TimeSeriesStore
+from state_store import StateStore
+from agent import MONITOR_MODE, create_agent
+from collector import HostRegistry, format_resources, format_disks, format_network, format_processes
 
-CONFIG_FILE = "config.json"
-AUTH_LOG_FILE = "/host/var/log/auth.log"  # Percorso al file auth.log all'interno del container
-LAST_LOG_POSITION = "/tmp/last_log_position.txt"  # File per memorizzare l'ultima posizione di lettura
-EXCLUDED_IPS = ["127.0.0.1", "192.168.0.0/16", "10.0.0.0/8", "172.16.0.0/12"]  # Default excluded IPs/ranges
+AUTH_LOG_FILE = os.getenv("AUTH_LOG_FILE", "/host/var/log/auth.log")  # Percorso al file auth.log all'interno del container
+LAST_LOG_POSITION = "/tmp/last_log_position.txt"  # Vecchio file della posizione di lettura, importato una sola volta
+STATE_DB = os.getenv("STATE_DB", "/tmp/server_monitor.db")  # Stato persistente: cursori, allarmi, aggregati
+STATE_STORE = StateStore(STATE_DB, instruments=INSTRUMENTS)  # Scritture raggruppate in transazioni SQLite (WAL)
+EXCLUDED_IPS = list(DEFAULT_EXCLUDED_IPS)  # Default excluded IPs/ranges
+EXCLUDED_MATCHER = IPRangeMatcher(EXCLUDED_IPS)  # Indice compilato di EXCLUDED_IPS
+EXCLUDED_VERSION = None  # Versione della configurazione da cui deriva EXCLUDED_MATCHER
+AUTH_LOG_TAILER = LogTailer(AUTH_LOG_FILE, LAST_LOG_POSITION, store=STATE_STORE,
+                            store_key="auth.log")  # Lettore incrementale di auth.log
+AUTH_LOG_PARSER = AuthLogParser()  # Parser delle righe di auth.log (con cache delle date)
+BRUTEFORCE = BruteForceDetector()  # Contatori dei tentativi SSH falliti per IP, rete e utente
+ALERTS = AlertManager(send_alert, store=STATE_STORE)  # Stato degli allarmi: cooldown, isteresi e digest
+SNAPSHOT_TTL = 10  # Eta' massima (secondi) dell'istantanea usata da bot, web e allarmi
+TOP_PROCESSES = TopProcessEngine()  # Classifica dei processi a campionamento differenziale
+HISTORY = TimeSeriesStore()  # Storico delle metriche (10 s per 1 h, 1 min per 24 h, 15 min per 30 giorni)
+# Database locali per paese/ASN degli IP negli allarmi (.mmdb o CSV, separati da ":")
+GEOIP = GeoIPDatabase(os.getenv("GEOIP_DB", "").split(os.pathsep))
 
 def load_config():
-    with open(CONFIG_FILE) as f:
-        return json.load(f)
+    """Restituisce lo snapshot corrente (immutabile) della configurazione, senza riparsare il file"""
+    return CONFIG_STORE.get()
+
+def set_excluded_ips(excluded_ips):
+    """
+    Aggiorna la lista degli IP esclusi ricompilando l'indice solo se la lista e' cambiata.
+    Il nuovo matcher viene costruito a parte e poi sostituito con un'unica assegnazione,
+    cosi' chi sta verificando un IP vede sempre la versione vecchia o quella nuova.
+    """
+    global EXCLUDED_IPS, EXCLUDED_MATCHER
+    excluded_ips = list(excluded_ips)
+    if excluded_ips == EXCLUDED_IPS:
+        return
+    matcher = IPRangeMatcher(excluded_ips)
+    EXCLUDED_IPS = excluded_ips
+    EXCLUDED_MATCHER = matcher
+
+def refresh_excluded_ips(config):
+    """Allinea gli IP esclusi allo snapshot di configurazione, solo se la versione e' cambiata"""
+    global EXCLUDED_VERSION
+    if config.version != EXCLUDED_VERSION:
+        set_excluded_ips(config["excluded_ips"])
+        EXCLUDED_VERSION = config.version
 
 def check_ip_in_range(ip):
     """Check if an IP address is within any of the excluded ranges"""
@@ -22,15 +74,7 @@ def check_ip_in_range(ip):
         return True  # Skip empty IPs
         
     try:
-        ip_obj = ipaddress.ip_address(ip)
-        for excluded in EXCLUDED_IPS:
-            if "/" in excluded:  # This is a network range
-                if ip_obj in ipaddress.ip_network(excluded, strict=False):
-                    return True
-            else:  # This is a single IP
-                if ip == excluded:
-                    return True
-        return False
+        return ip in EXCLUDED_MATCHER
     except ValueError:
         return True  # In case of invalid IP, skip it
 
@@ -42,94 +86,137 @@ def get_ip_info(ip):
         print(f"Errore nel recupero delle informazioni IP: {e}")
         return ""
 
-def check_auth_log():
+def get_ip_origin(ip):
+    """Paese, ASN e organizzazione dell'IP dai database locali (stringa vuota se non disponibili)"""
+    if not GEOIP.enabled:
+        return ""
+    try:
+        return escape_markdown(format_ip_info(GEOIP.lookup(ip)))
+    except Exception as e:
+        print(f"Errore nella ricerca GeoIP di {ip}: {e}")
+        return ""
+
+def check_auth_log(notify_ssh=True, notify_bruteforce=True):
     """
     Monitora il file auth.log per individuare nuovi accessi SSH e invia notifiche per quelli provenienti
-    da indirizzi IP non esclusi.
+    da indirizzi IP non esclusi. I tentativi falliti alimentano il rilevatore di attacchi brute-force.
     """
-    print("Controllo nuovi accessi SSH da auth.log...")
-    
     # Verifica che il file di log esista
     if not os.path.exists(AUTH_LOG_FILE):
         print(f"File {AUTH_LOG_FILE} non trovato. Controlla il volume montato.")
         return
 
-    # Determina da quale posizione iniziare a leggere il file
-    last_position = 0
-    if os.path.exists(LAST_LOG_POSITION):
+    # Legge solo le nuove righe, a blocchi, seguendo anche la rotazione del file;
+    # ogni blocco viene filtrato e analizzato direttamente in bytes
+    for lines in AUTH_LOG_TAILER.read_batches():
+        with INSTRUMENTS.timer("auth_log.batch"):
+            INSTRUMENTS.mark("auth_log.lines", len(lines))
+            INSTRUMENTS.mark("auth_log.bytes", sum(map(len, lines)) + len(lines))
+            for event in AUTH_LOG_PARSER.parse_batch(lines, failures=notify_bruteforce):
+                if isinstance(event, SSHFailure):
+                    handle_ssh_failure(event)
+                else:
+                    record_login(event)
+                    if notify_ssh:
+                        handle_ssh_login(event)
+
+AUTH_LOG_LOCK = threading.Lock()  # Watcher e controllo periodico non leggono auth.log insieme
+
+def on_auth_log_change(blocking=True):
+    """
+    Callback del watcher: elabora subito le nuove righe di auth.log. Con blocking=False (controllo
+    periodico) non fa nulla se una lettura e' gia' in corso.
+    """
+    if not AUTH_LOG_LOCK.acquire(blocking=blocking):
+        return
+    try:
+        config = load_config()
+        # Le righe vengono lette anche con le notifiche disattivate, per lo storico degli accessi
+        refresh_excluded_ips(config)
+        ALERTS.configure(config)
+        BRUTEFORCE.configure(config)
+        check_auth_log(config["notify_ssh"], config["notify_bruteforce"])
+    finally:
+        AUTH_LOG_LOCK.release()
+
+AUTH_LOG_WATCHER = LogWatcher(AUTH_LOG_FILE, on_auth_log_change, name="auth-log-watcher")
+
+def record_login(event):
+    """Aggiunge un accesso SSH (SSHLogin) allo storico persistente"""
+    timestamp = event.timestamp.timestamp() if event.timestamp is not None else time.time()
+    STATE_STORE.add_login(timestamp, event.source_ip, event.username, event.hostname, event.method,
+                          excluded=check_ip_in_range(event.source_ip))
+
+def handle_ssh_login(event):
+    """Invia la notifica per un accesso SSH (SSHLogin), se l'IP di origine non e' escluso"""
+    source_ip, username, hostname = event.source_ip, event.username, event.hostname
+    
+    # Controlla se l'IP è nella lista degli esclusi
+    if not check_ip_in_range(source_ip):
+        # Ottieni timestamp formattato (l'anno e' gia' stato dedotto dal parser)
+        if event.timestamp is not None:
+            formatted_date = event.timestamp.strftime("%d %b %Y %H:%M")
+        else:
+            formatted_date = event.raw_timestamp
+        
+        # Ottieni l'indirizzo IP locale
         try:
-            with open(LAST_LOG_POSITION, 'r') as f:
-                last_position = int(f.read().strip() or '0')
+            local_ip = get_local_ip()
         except Exception as e:
-            print(f"Errore nella lettura dell'ultima posizione: {e}")
-    
-    # Ottieni la dimensione attuale del file
-    current_size = os.path.getsize(AUTH_LOG_FILE)
-    
-    # Se il file è stato ruotato o troncato (dimensione minore dell'ultima posizione), ricomincia da zero
-    if current_size < last_position:
-        last_position = 0
-    
-    # Leggi solo le nuove righe dal file
-    with open(AUTH_LOG_FILE, 'r') as f:
-        f.seek(last_position)
-        new_lines = f.readlines()
+            local_ip = "unknown"
+            print(f"Errore nel recupero dell'IP locale: {e}")
+        
+        # Preparazione del messaggio
+        origin = get_ip_origin(source_ip)
+        message = (f"*SSH Connection detected*\n"
+                   f"Connection from *{source_ip}* as *{username}* on *{hostname}* ({local_ip})\n"
+                   f"Date: {formatted_date}\n"
+                   + (f"Origin: {origin}\n" if origin else "") +
+                   f"More information: {get_ip_info(source_ip)}")
         
-        # Aggiorna la posizione dell'ultima lettura
-        with open(LAST_LOG_POSITION, 'w') as pos_file:
-            pos_file.write(str(f.tell()))
+        print(f"Nuovo accesso SSH rilevato: {username} da {source_ip} su {hostname}")
+        # Gli accessi ripetuti dallo stesso IP durante il cooldown vengono riassunti
+        ALERTS.event(("ssh", source_ip), message,
+                     summary_format=f"*SSH*: altri {{count}} accessi da *{source_ip}* su *{hostname}* ({local_ip})")
+    else:
+        print(f"Accesso SSH da {source_ip} escluso dalle notifiche.")
+
+def handle_ssh_failure(event):
+    """Conta un tentativo SSH fallito (SSHFailure) e segnala gli IP, le reti e gli utenti sopra soglia"""
+    source_ip = event.source_ip
+    if check_ip_in_range(source_ip):
+        return  # IP escluso (o non valido): non viene conteggiato
     
-    # Pattern per trovare i log di accesso SSH
-    # Esempio di riga: May 19 09:08:01 hostname sshd[1234]: Accepted password for username from 192.168.1.1 port 12345 ssh2
-    # O: May 19 09:08:01 hostname sshd[1234]: Accepted publickey for username from 192.168.1.1 port 12345 ssh2
-    ssh_pattern = re.compile(r'(\w+\s+\d+\s+\d+:\d+:\d+)\s+(\S+)\s+sshd\[\d+\]:\s+Accepted\s+\S+\s+for\s+(\S+)\s+from\s+(\S+)')
+    now = time.time()
+    timestamp = event.timestamp.timestamp() if event.timestamp is not None else now
+    # Le righe arretrate piu' vecchie della finestra (es. all'avvio) non vengono conteggiate
+    crossed = BRUTEFORCE.observe(source_ip, event.username, timestamp, event.kind, event.port, now=now)
+    if not crossed:
+        return
     
-    for line in new_lines:
-        match = ssh_pattern.search(line)
-        if match:
-            # Estrazione delle informazioni
-            timestamp_str, hostname, username, source_ip = match.groups()
-            
-            # Controlla se l'IP è nella lista degli esclusi
-            if not check_ip_in_range(source_ip):
-                # Ottieni timestamp formattato
-                try:
-                    # Aggiungi l'anno attuale poiché il log non lo include
-                    current_year = datetime.now().year
-                    full_timestamp_str = f"{timestamp_str} {current_year}"
-                    # Converti in oggetto datetime
-                    timestamp = datetime.strptime(full_timestamp_str, "%b %d %H:%M:%S %Y")
-                    formatted_date = timestamp.strftime("%d %b %Y %H:%M")
-                except Exception as e:
-                    print(f"Errore nella formattazione della data: {e}")
-                    formatted_date = timestamp_str
-                
-                # Ottieni l'indirizzo IP locale
-                try:
-                    local_ip = get_local_ip()
-                except Exception as e:
-                    local_ip = "unknown"
-                    print(f"Errore nel recupero dell'IP locale: {e}")
-                
-                # Preparazione del messaggio
-                message = (f"*SSH Connection detected*\n"
-                           f"Connection from *{source_ip}* as *{username}* on *{hostname}* ({local_ip})\n"
-                           f"Date: {formatted_date}\n"
-                           f"More information: {get_ip_info(source_ip)}")
-                
-                print(f"Nuovo accesso SSH rilevato: {username} da {source_ip} su {hostname}")
-                send_alert(message)
-            else:
-                print(f"Accesso SSH da {source_ip} escluso dalle notifiche.")
+    minutes = max(1, round(BRUTEFORCE.window / 60))
+    for scope, key, count in crossed:
+        if scope == "ip":
+            origin = get_ip_origin(key)
+            target = f"dall'IP *{key}* (ultimo utente: {escape_markdown(event.username) or '-'})\n" \
+                     + (f"Origin: {origin}\n" if origin else "") + \
+                     f"More information: {get_ip_info(key)}"
+        elif scope == "subnet":
+            target = f"dalla rete *{key}*"
+        else:
+            target = f"per l'utente *{escape_markdown(key)}* da piu' indirizzi"
+        message = (f"🚨 *Possibile attacco brute-force SSH* su *{event.hostname}*\n"
+                   f"{count} tentativi falliti negli ultimi {minutes} minuti {target}")
+        print(f"Soglia brute-force superata ({scope}): {key}, {count} tentativi")
+        # Se la soglia viene superata di nuovo durante il cooldown, il messaggio viene riassunto
+        ALERTS.event(("bruteforce", scope, key), message,
+                     summary_format=f"*Brute-force*: soglia superata altre {{count}} volte ({scope} {escape_markdown(key)})")
 
 def get_local_ip():
-    """Ottiene l'indirizzo IP locale del server"""
+    """Ottiene l'indirizzo IP locale del server (dalla cache, aggiornata dal campionatore)"""
     try:
-        # Usa hostname -I per ottenere gli indirizzi IP
-        result = subprocess.run(['hostname', '-I'], capture_output=True, text=True)
-        # Prende il primo IP (solitamente quello principale)
-        ip = result.stdout.strip().split()[0]
-        return ip
+        HOST_IDENTITY.refresh()
+        return HOST_IDENTITY.primary_ip or "unknown"
     except Exception as e:
         print(f"Errore nel recupero dell'IP locale: {e}")
         return "unknown"
@@ -137,20 +224,13 @@ def get_local_ip():
 def monitor_loop():
     global last_uptime
     
-    # Crea i file di stato se non esistono
-    if not os.path.exists(os.path.dirname(LAST_LOG_POSITION)):
-        try:
-            os.makedirs(os.path.dirname(LAST_LOG_POSITION))
-        except:
-            pass
-    
-    try:
-        if not os.path.exists(LAST_LOG_POSITION):
-            with open(LAST_LOG_POSITION, "w") as f:
-                f.write("0")
-    except:
-        print(f"Errore nella creazione del file {LAST_LOG_POSITION}")
+    # Stato persistente: ripristina allarmi e storico, poi salva le modifiche a gruppi
+    ALERTS.restore()
+    restore_history()
+    STATE_STORE.start()
+    atexit.register(STATE_STORE.flush)
     
+    CONFIG_STORE.start_watching()
     config = load_config()
     try:
         last_uptime = get_uptime()
@@ -159,79 +239,393 @@ def monitor_loop():
         last_uptime = 0
 
     # Imposta gli IP esclusi all'avvio
-    global EXCLUDED_IPS
-    if "excluded_ips" in config:
-        EXCLUDED_IPS = config["excluded_ips"]
+    refresh_excluded_ips(config)
 
-    print("Monitor loop avviato.")
-    last_check_time = 0
-    
-    while True:
-        try:
-            config = load_config()
-            
-            # Aggiorna la lista degli IP esclusi ad ogni ciclo
-            if "excluded_ips" in config:
-                EXCLUDED_IPS = config["excluded_ips"]
-            
-            # Monitora risorse di sistema
-            cpu = psutil.cpu_percent(interval=1)
-            ram = psutil.virtual_memory().percent
-            disk = psutil.disk_usage("/").percent
-            net = psutil.net_io_counters().bytes_sent + psutil.net_io_counters().bytes_recv
-            
-            try:
-                uptime = get_uptime()
-            except:
-                uptime = 0
-            
-            # Invia avvisi per l'utilizzo elevato delle risorse
-            if cpu > config["cpu_threshold"]:
-                send_alert(f"⚠️ CPU alta: {cpu}%")
+    # Database GeoIP (poi ricaricati dal task "geoip" quando vengono sostituiti)
+    GEOIP.refresh()
 
-            if ram > config["ram_threshold"]:
-                send_alert(f"⚠️ RAM alta: {ram}%")
+    # Gli accessi SSH sono rilevati da un thread dedicato, non appena auth.log viene scritto
+    AUTH_LOG_WATCHER.start()
 
-            if disk > config["disk_threshold"]:
-                send_alert(f"⚠️ DISK usage alto: {disk}%")
+    # Ogni controllo e' un task indipendente, con il proprio intervallo (configurabile)
+    configure_intervals(config["check_intervals"])
+    SCHEDULER.start()
 
-            # Rileva riavvii del sistema
-            if uptime < last_uptime and config["notify_reboot"]:
-                send_alert("🔄 Server riavviato")
-            last_uptime = uptime
-            
-            # Controllo accessi SSH ogni 30 secondi (per evitare troppi controlli)
-            current_time = time.time()
-            if (current_time - last_check_time) >= 30:
-                print("\n--- Controllo accessi SSH ---")
-                
-                # Esegui il monitoraggio degli accessi SSH da auth.log
-                if config.get("notify_ssh", True):
-                    try:
-                        check_auth_log()
-                    except Exception as e:
-                        print(f"Errore durante check_auth_log: {e}")
-                    
-                last_check_time = current_time
-                print("--- Fine controllo ---\n")
-
-            time.sleep(10)
-            
-        except Exception as e:
-            print(f"Errore nel monitor_loop: {e}")
-            time.sleep(10)  # In caso di errore, aspetta comunque prima di riprovare
+    if AGENT is not None:
+        AGENT.start()
+
+    print(f"Monitor loop avviato (modalita' {MONITOR_MODE}).")
+    SCHEDULER.join()
+
+def current_state():
+    """Configurazione corrente e ultima istantanea, per i controlli periodici"""
+    config = load_config()
+    # Aggiorna IP esclusi, parametri degli allarmi e intervalli solo quando cambia la configurazione
+    refresh_excluded_ips(config)
+    ALERTS.configure(config)
+    configure_intervals(config["check_intervals"])
+    # L'istantanea viene aggiornata dal task "sample": i controlli non restano bloccati
+    # se un campionamento e' lento
+    snapshot = SAMPLER.get()
+    return config, snapshot
+
+# Invia avvisi per l'utilizzo elevato delle risorse (solo sulle transizioni di stato)
+def check_cpu():
+    config, snapshot = current_state()
+    cpu = snapshot.cpu_percent
+    ALERTS.check_threshold("cpu", cpu, config["cpu_threshold"],
+                           f"⚠️ CPU alta: {cpu}%", f"✅ CPU rientrata: {cpu}%")
+
+def check_ram():
+    config, snapshot = current_state()
+    ram = snapshot.memory.percent
+    ALERTS.check_threshold("ram", ram, config["ram_threshold"],
+                           f"⚠️ RAM alta: {ram}%", f"✅ RAM rientrata: {ram}%")
+
+def check_disk():
+    """Spazio e inode di ogni punto di montaggio, con soglie per mount e segnalazione dei mount bloccati"""
+    config, _snapshot = current_state()
+    # Lettura nuova (statvfs con timeout): anche l'istantanea successiva la usera'
+    partitions, quarantined = DISKS.collect()
+    mount_thresholds = config["disk_mount_thresholds"]
+    for mount, usage in partitions:
+        mountpoint = escape_markdown(mount.mountpoint)
+        limits = mount_thresholds.get(mount.mountpoint, {})
+        disk_threshold = limits.get("disk", config["disk_threshold"])
+        if disk_threshold > 0:
+            eta = f" (pieno tra circa {format_eta(usage.eta)})" if usage.eta is not None else ""
+            ALERTS.check_threshold(("disk", mount.mountpoint), usage.percent, disk_threshold,
+                                   f"⚠️ DISK usage alto su {mountpoint}: {usage.percent}%{eta}",
+                                   f"✅ DISK usage su {mountpoint} rientrato: {usage.percent}%")
+        inode_threshold = limits.get("inodes", config["inode_threshold"])
+        if inode_threshold > 0 and usage.inodes_percent is not None:
+            ALERTS.check_threshold(("inodes", mount.mountpoint), usage.inodes_percent, inode_threshold,
+                                   f"⚠️ Inode quasi esauriti su {mountpoint}: {usage.inodes_percent}%",
+                                   f"✅ Inode su {mountpoint} rientrati: {usage.inodes_percent}%")
+    # Mount che non rispondono (es. NFS irraggiungibile): un allarme all'ingresso in quarantena
+    hung = {mount.mountpoint for mount in quarantined}
+    for mountpoint in hung | DISKS_HUNG:
+        name = escape_markdown(mountpoint)
+        ALERTS.check_threshold(("disk_hung", mountpoint), 1 if mountpoint in hung else 0, 0.5,
+                               f"⚠️ Il mount {name} non risponde (statvfs oltre {DISKS.timeout:g} s)",
+                               f"✅ Il mount {name} risponde di nuovo", hysteresis=0)
+    DISKS_HUNG.clear()
+    DISKS_HUNG.update(hung)
+
+def check_network():
+    # Traffico di rete: soglia sul totale (net_threshold) e per interfaccia
+    config, snapshot = current_state()
+    check_network_thresholds(snapshot, config)
+
+def check_reboot():
+    """Rileva riavvii del sistema (uptime diminuito)"""
+    global last_uptime
+    config, snapshot = current_state()
+    uptime = snapshot.uptime
+    if uptime < last_uptime and config["notify_reboot"]:
+        ALERTS.notify("🔄 Server riavviato")
+    last_uptime = uptime
+
+def check_network_thresholds(snapshot, config):
+    """Confronta le velocita' di rete (rx+tx, bytes/s) con le soglie configurate"""
+    # L'isteresi e' espressa in percentuale della soglia
+    margin = config["alert_hysteresis"] / 100
+    
+    total = snapshot.net_rate_total
+    if config["net_threshold"] > 0:
+        rate = total.rx_bytes + total.tx_bytes
+        ALERTS.check_threshold(("net", "*"), rate, config["net_threshold"],
+                               f"⚠️ Traffico di rete alto: {format_rate(rate)} "
+                               f"(↓ {format_rate(total.rx_bytes)}, ↑ {format_rate(total.tx_bytes)})",
+                               f"✅ Traffico di rete rientrato: {format_rate(rate)}",
+                               hysteresis=config["net_threshold"] * margin)
+    
+    for nic, threshold in config["net_iface_thresholds"].items():
+        nic_rate = snapshot.net_rates.get(nic)
+        if nic_rate is None or threshold <= 0:
+            continue
+        rate = nic_rate.rx_bytes + nic_rate.tx_bytes
+        ALERTS.check_threshold(("net", nic), rate, threshold,
+                               f"⚠️ Traffico alto su {nic}: {format_rate(rate)} "
+                               f"(↓ {format_rate(nic_rate.rx_bytes)}, ↑ {format_rate(nic_rate.tx_bytes)})",
+                               f"✅ Traffico su {nic} rientrato: {format_rate(rate)}",
+                               hysteresis=threshold * margin)
 
 def get_uptime():
     try:
-        with open("/proc/uptime", "r") as f:
-            return float(f.readline().split()[0])
-    except:
-        try:
-            # Fallback per Docker: leggi uptime del sistema host
-            with open("/host/proc/uptime", "r") as f:
-                return float(f.readline().split()[0])
-        except:
-            return 0  # Se non riusciamo a leggere l'uptime, restituiamo 0
+        # /proc/uptime (o /host/proc/uptime in Docker) tenuto aperto dal backend del campionatore
+        return SAMPLER.backend.uptime()
+    except Exception:
+        return 0  # Se non riusciamo a leggere l'uptime, restituiamo 0
+
+# Utilizzo dei dischi: statvfs con timeout, quarantena dei mount bloccati, elenco dei mount in cache
+DISKS = DiskCollector()
+DISKS_HUNG = set()  # Mount in quarantena all'ultimo controllo
+
+# Istantanea condivisa delle risorse; il backend (SAMPLER_BACKEND, PROC_ROOT) legge /proc direttamente
+SAMPLER = ResourceSampler(disks=DISKS, instruments=INSTRUMENTS)
+HOST_IDENTITY = HostIdentity()  # Nome host e IP locali, senza processi esterni
+
+def refresh_host_identity(snapshot):
+    """Aggiorna gli indirizzi locali solo quando cambia l'elenco delle interfacce"""
+    HOST_IDENTITY.refresh(snapshot.net_per_nic.keys())
+
+SAMPLER.add_listener(refresh_host_identity)
+
+
+def record_history(snapshot):
+    """Aggiunge allo storico le metriche di un'istantanea (chiamata dal campionatore)"""
+    values = {
+        "cpu": snapshot.cpu_percent,
+        "ram": snapshot.memory.percent,
+        "disk": snapshot.disk.percent if snapshot.disk is not None else None,
+        "load1": snapshot.load_avg[0] if snapshot.load_avg is not None else None,
+        "net_rx": snapshot.net_rate_total.rx_bytes,
+        "net_tx": snapshot.net_rate_total.tx_bytes,
+    }
+    for nic, rate in snapshot.net_rates.items():
+        values[f"net_rx:{nic}"] = rate.rx_bytes
+        values[f"net_tx:{nic}"] = rate.tx_bytes
+    HISTORY.record(values, snapshot.timestamp)
+
+SAMPLER.add_listener(record_history)
+
+PERSISTED_RESOLUTIONS = (60, 900)  # Livelli dello storico salvati nello stato persistente
+_last_rollup_export = 0.0
+
+
+def persist_history(snapshot):
+    """Una volta al minuto salva nello store gli intervalli aggregati aggiornati"""
+    global _last_rollup_export
+    if snapshot.timestamp - _last_rollup_export < 60:
+        return
+    for resolution in PERSISTED_RESOLUTIONS:
+        # L'intervallo in corso viene risalvato (sovrascritto) finche' non si chiude
+        since = _last_rollup_export - _last_rollup_export % resolution
+        STATE_STORE.put_rollups(resolution, HISTORY.export_rollups(resolution, since, snapshot.timestamp + 1))
+    _last_rollup_export = snapshot.timestamp
+
+
+def restore_history():
+    """Ricarica nello storico gli aggregati salvati prima del riavvio"""
+    now = time.time()
+    for tier in HISTORY.tiers:
+        if tier.resolution in PERSISTED_RESOLUTIONS:
+            rows = STATE_STORE.load_rollups(tier.resolution, now - tier.size * tier.resolution)
+            HISTORY.load_rollups(tier.resolution, rows, now)
+
+SAMPLER.add_listener(persist_history)
+
+METRICS_PROCESSES = 20  # Processi (per CPU) esportati in /metrics e /api/snapshot
+
+
+def recent_processes():
+    """Processi principali dall'ultima classifica, se abbastanza recente"""
+    last = TOP_PROCESSES.last
+    if last is None or time.monotonic() - last[0] > 3 * SCHEDULER.tasks["processes"].interval:
+        return ()
+    return heapq.nlargest(METRICS_PROCESSES, last[1], key=lambda row: row.cpu_percent)
+
+
+# /metrics e /api/snapshot: serializzati una volta per campionamento, non ad ogni richiesta
+METRICS = MetricsExporter(recent_processes, INSTRUMENTS.snapshot)
+SAMPLER.add_listener(METRICS.update)
+
+last_uptime = 0  # Uptime dell'ultimo controllo dei riavvii
+
+# Controlli periodici: intervallo (da config "check_intervals"), jitter, timeout e politica per i turni persi
+SCHEDULER = Scheduler(instruments=INSTRUMENTS)
+SCHEDULER.add(ScheduledTask("sample", SAMPLER.sample, 5, jitter=0, timeout=10, missed=COALESCE,
+                            description="Campionamento delle risorse"))
+SCHEDULER.add(ScheduledTask("cpu", check_cpu, 10, description="Soglia CPU"))
+SCHEDULER.add(ScheduledTask("ram", check_ram, 10, description="Soglia RAM"))
+SCHEDULER.add(ScheduledTask("disk", check_disk, 30, description="Spazio e inode dei dischi"))
+SCHEDULER.add(ScheduledTask("network", check_network, 10, description="Soglie di rete"))
+SCHEDULER.add(ScheduledTask("reboot", check_reboot, 30, missed=COALESCE, description="Riavvii"))
+SCHEDULER.add(ScheduledTask("auth_log", lambda: on_auth_log_change(blocking=False), 30, timeout=120,
+                            description="Controllo di sicurezza di auth.log"))
+SCHEDULER.add(ScheduledTask("alerts", ALERTS.tick, 5, jitter=0, missed=SKIP,
+                            description="Riepiloghi degli allarmi"))
+SCHEDULER.add(ScheduledTask("processes", lambda: TOP_PROCESSES.top(limit=1), 60, missed=COALESCE,
+                            description="Classifica dei processi per /metrics"))
+
+
+def configure_intervals(intervals):
+    """Applica gli intervalli dei controlli (config "check_intervals")"""
+    SCHEDULER.configure(intervals)
+    # La scansione del turno precedente del task "processes" deve restare riutilizzabile come
+    # primo passaggio (jitter compreso), altrimenti ogni turno attende sample_interval
+    TOP_PROCESSES.reuse_window = max(30.0, 1.5 * SCHEDULER.tasks["processes"].interval)
+
+# Modalita' multi-host: l'agente invia stato e allarmi al collector, che li mostra nel proprio bot
+HOSTS = HostRegistry()  # Host remoti (solo in modalita' collector)
+AGENT = create_agent(lambda: snapshot_to_dict(SAMPLER.get(), recent_processes())) if MONITOR_MODE == "agent" else None
+
+
+def forward_agent_events(host, events):
+    """Allarmi ricevuti da un agente, inoltrati alla chat con il nome dell'host"""
+    for event in events:
+        ALERTS.notify(f"*[{escape_markdown(host)}]* {event['message']}")
+
+
+def check_agents():
+    """Allarme per gli agenti che non inviano dati da piu' di tre intervalli"""
+    for name, age, limit in HOSTS.silent():
+        ALERTS.check_threshold(("agent_silent", name), age, limit,
+                               f"⚠️ L'host *{escape_markdown(name)}* non invia dati da {int(age)} secondi",
+                               f"✅ L'host *{escape_markdown(name)}* ha ripreso a inviare dati", hysteresis=0)
+
+
+def get_remote_info(host, section, limit=5, sort_by="cpu"):
+    """Testi di /risorse per un host remoto, dall'ultimo stato ricevuto dal suo agente"""
+    remote = HOSTS.get(host)
+    if remote is None:
+        return f"Nessun dato ricevuto da {escape_markdown(host)}"
+    data, last_seen = remote
+    try:
+        if section == "processes":
+            return format_processes(host, data, last_seen, limit, sort_by)
+        return {"resources": format_resources, "disks": format_disks,
+                "network": format_network}[section](host, data, last_seen)
+    except (KeyError, TypeError, IndexError) as e:
+        return f"Dati incompleti da {escape_markdown(host)}: {e}"
+
+
+if MONITOR_MODE == "collector":
+    SCHEDULER.add(ScheduledTask("agents", check_agents, 30, description="Agenti remoti silenziosi"))
+    INSTRUMENTS.gauge("collector.hosts", lambda: len(HOSTS.names()))
+if AGENT is not None:
+    INSTRUMENTS.gauge("agent.pending_events", lambda: AGENT.stats()["pending_events"])
+if GEOIP.enabled:
+    SCHEDULER.add(ScheduledTask("geoip", GEOIP.refresh, 60, missed=COALESCE,
+                                description="Ricarica dei database GeoIP sostituiti"))
+    INSTRUMENTS.gauge("geoip.lookups", lambda: GEOIP.counters["lookups"])
+    INSTRUMENTS.gauge("geoip.cache_hits", lambda: GEOIP.counters["hits"])
+
+def get_scheduler_stats():
+    """Durate, errori, timeout e turni saltati di ogni controllo"""
+    return SCHEDULER.stats()
+
+# Code interne lette al momento da /stats e /metrics
+INSTRUMENTS.gauge("alerts.pending", ALERTS.pending_count)
+INSTRUMENTS.gauge("alerts.states", ALERTS.state_count)
+INSTRUMENTS.gauge("history.series", lambda: len(HISTORY.tiers[-1].columns))
+INSTRUMENTS.gauge("state_store.pending", STATE_STORE.pending_count)
+INSTRUMENTS.gauge("telegram.queue", lambda: get_outbox_stats()["depth"])
+INSTRUMENTS.gauge("checks.running", lambda: sum(1 for info in SCHEDULER.stats().values()
+                                                if info["running_for"] is not None))
+
+PROFILER = SamplingProfiler()  # Profilazione su richiesta (/profilo, pagina /stats)
+
+
+def get_self_stats():
+    """Strumentazione interna: latenze, velocita' di lettura, regex, invii, code e processo"""
+    stats = INSTRUMENTS.snapshot()
+    stats["telegram"] = get_outbox_stats()
+    stats["regex"] = dict(AUTH_LOG_PARSER.counters)
+    stats["profiler"] = {"running": PROFILER.running, "ends_at": PROFILER.ends_at,
+                         "samples": PROFILER.samples, "files": PROFILER.files()}
+    return stats
+
+
+def format_duration(seconds):
+    days, rest = divmod(int(seconds), 86400)
+    hours, rest = divmod(rest, 3600)
+    return f"{days}g {hours}h {rest // 60}m" if days else f"{hours}h {rest // 60}m {rest % 60}s"
+
+
+def get_self_stats_summary():
+    """Testo per il comando /stats"""
+    try:
+        stats = get_self_stats()
+        process = stats["process"]
+        meters = stats["meters"]
+        lines = ["*Statistiche del monitor*", "```",
+                 f"Processo: CPU {process['cpu_percent']}%, RSS {process['rss'] / (1024**2):.1f} MB, "
+                 f"{process['threads']} thread, {process['fds'] if process['fds'] is not None else '?'} fd, "
+                 f"attivo da {format_duration(process['uptime'])}"]
+        if "auth_log.lines" in meters:
+            lines.append(f"auth.log: {meters['auth_log.lines']['rate']:.1f} righe/s, "
+                         f"{format_rate(meters['auth_log.bytes']['rate'])} "
+                         f"(totale {meters['auth_log.lines']['total']} righe)")
+        regex = stats["regex"]
+        lines.append(f"Regex: accessi {regex['accepted_matches']}/{regex['accepted_searches']}, "
+                     f"falliti {regex['failed_matches']}/{regex['failed_searches']} (match/ricerche), "
+                     f"sshd {regex['sshd']}/{regex['lines']} righe")
+        telegram = stats["telegram"]
+        lines.append(f"Telegram: inviati {telegram['sent']}, ritentativi {telegram['retries']}, "
+                     f"scartati {telegram['dropped']}, falliti {telegram['failed']}, in coda {telegram['depth']}")
+        lines.append("Code: " + ", ".join(f"{name} {value}" for name, value in stats["gauges"].items()))
+        lines.append("")
+        lines.append(f"{'Fase':22} {'p50':>7} {'p95':>7} {'max':>7} {'n':>6}  (ms)")
+        for name, histogram in stats["histograms"].items():
+            if not histogram["count"]:
+                continue
+            lines.append(f"{name[:22]:22} {histogram['p50'] * 1000:7.1f} {histogram['p95'] * 1000:7.1f} "
+                         f"{histogram['max'] * 1000:7.1f} {histogram['count']:6}")
+        profiler = stats["profiler"]
+        if profiler["running"]:
+            lines.append(f"\nProfilazione in corso: {profiler['samples']} campioni, "
+                         f"termina tra {max(0, int(profiler['ends_at'] - time.time()))} s")
+        elif profiler["files"]:
+            lines.append(f"\nUltima profilazione: {profiler['files'][0]}")
+        lines.append("```")
+        return "\n".join(lines)
+    except Exception as e:
+        return f"Errore nel recupero delle statistiche interne: {e}"
+
+
+def start_profiling(seconds):
+    """Avvia il profiler se consentito dalla configurazione (allow_profiling); restituisce un messaggio"""
+    if not load_config()["allow_profiling"]:
+        return "Profilazione disattivata: abilitala nella configurazione (allow_profiling)"
+    if not PROFILER.start(seconds):
+        return "Una profilazione e' gia' in corso"
+    return (f"Profilazione avviata per {max(1, min(seconds, MAX_DURATION))} s; il file (formato collapsed, per flame graph) "
+            f"sara' in {PROFILER.directory}")
+
+# Serie mostrate da /storia: (nome, etichetta, formattazione)
+HISTORY_SERIES = (
+    ("cpu", "CPU", lambda v: f"{v:.1f}%"),
+    ("ram", "RAM", lambda v: f"{v:.1f}%"),
+    ("disk", "Disco", lambda v: f"{v:.1f}%"),
+    ("load1", "Load 1m", lambda v: f"{v:.2f}"),
+    ("net_rx", "Rete ↓", format_rate),
+    ("net_tx", "Rete ↑", format_rate),
+)
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(values, width=24):
+    """Grafico testuale compatto di una serie, ridotta a `width` punti"""
+    if not values:
+        return ""
+    if len(values) > width:
+        step = len(values) / width
+        values = [max(values[int(i * step):int((i + 1) * step)] or [values[-1]]) for i in range(width)]
+    low, high = min(values), max(values)
+    span = (high - low) or 1
+    return "".join(SPARK_CHARS[int((v - low) / span * (len(SPARK_CHARS) - 1))] for v in values)
+
+
+def get_history_summary(minutes=60):
+    """Riepilogo min/media/max/p95 delle metriche principali negli ultimi `minutes` minuti"""
+    try:
+        duration = minutes * 60
+        lines = [f"*Storico ultimi {minutes} minuti*", "```"]
+        for series, label, fmt in HISTORY_SERIES:
+            summary = HISTORY.query(series, duration)
+            if summary is None:
+                continue
+            lines.append(f"{label:8} min {fmt(summary['min'])}  media {fmt(summary['avg'])}  "
+                         f"max {fmt(summary['max'])}  p95 {fmt(summary['p95'])}")
+            lines.append(f"{'':8} {sparkline([value for _, value in summary['points']])}")
+        if len(lines) == 2:
+            return "Nessun dato nello storico per il periodo richiesto"
+        lines.append("```")
+        return "\n".join(lines)
+    except Exception as e:
+        return f"Errore nel recupero dello storico: {e}"
 
 
 # Aggiungi queste funzioni al file monitor.py
@@ -239,18 +633,19 @@ def get_uptime():
 def get_system_resources():
     """Ottiene informazioni su CPU e RAM"""
     try:
-        cpu = psutil.cpu_percent(interval=1)
-        ram = psutil.virtual_memory()
-        swap = psutil.swap_memory()
+        snapshot = SAMPLER.get(max_age=SNAPSHOT_TTL)
+        cpu = snapshot.cpu_percent
+        ram = snapshot.memory
+        swap = snapshot.swap
         
-        # Ottiene il carico di sistema (1, 5, 15 minuti)
-        try:
-            load_avg = os.getloadavg()
+        # Carico di sistema (1, 5, 15 minuti)
+        load_avg = snapshot.load_avg
+        if load_avg is not None:
             load_str = f"Load avg: {load_avg[0]:.2f}, {load_avg[1]:.2f}, {load_avg[2]:.2f}"
-        except:
+        else:
             load_str = "Load avg: non disponibile"
             
-        uptime_seconds = get_uptime()
+        uptime_seconds = snapshot.uptime
         days, remainder = divmod(int(uptime_seconds), 86400)
         hours, remainder = divmod(remainder, 3600)
         minutes, seconds = divmod(remainder, 60)
@@ -266,106 +661,170 @@ def get_system_resources():
         return f"Errore nel recupero delle risorse: {e}"
 
 def get_disk_info():
-    """Ottiene informazioni sull'utilizzo del disco"""
+    """Ottiene informazioni sull'utilizzo dei dischi (spazio, inode, velocita' di riempimento)"""
     try:
-        disk = psutil.disk_usage("/")
+        snapshot = SAMPLER.get(max_age=SNAPSHOT_TTL)
+        disk = snapshot.disk
         
-        # Formatta le dimensioni in GB
-        used_gb = disk.used / (1024**3)
-        total_gb = disk.total / (1024**3)
-        free_gb = disk.free / (1024**3)
+        if disk is not None:
+            # Formatta le dimensioni in GB
+            root_info = (f"Root Usage: *{disk.percent}%*\n"
+                         f"Usato: {disk.used / (1024**3):.1f} GB\n"
+                         f"Libero: {disk.free / (1024**3):.1f} GB\n"
+                         f"Totale: {disk.total / (1024**3):.1f} GB\n")
+        else:
+            root_info = "Root: non disponibile\n"
         
-        # Ottiene le partizioni
-        partitions = psutil.disk_partitions()
+        # Tutti i filesystem fisici e di rete, una riga ciascuno
         partitions_info = ""
-        
-        for i, part in enumerate(partitions[:5]):  # Limita a 5 partizioni per non intasare il messaggio
-            if "loop" not in part.device:  # Ignora i dispositivi loop
-                try:
-                    usage = psutil.disk_usage(part.mountpoint)
-                    partitions_info += (f"\n{part.device} ({part.mountpoint}): "
-                                       f"{usage.percent}% usato "
-                                       f"({usage.used / (1024**3):.1f} GB / {usage.total / (1024**3):.1f} GB)")
-                except:
-                    pass
-        
-        if len(partitions) > 5:
-            partitions_info += f"\n... e altre {len(partitions) - 5} partizioni"
+        for part, usage in snapshot.partitions:
+            partitions_info += (f"\n{escape_markdown(part.mountpoint)} ({part.fstype}): "
+                                f"*{usage.percent}%* "
+                                f"({usage.used / (1024**3):.1f} / {usage.total / (1024**3):.1f} GB)")
+            if usage.inodes_percent is not None:
+                partitions_info += f", inode {usage.inodes_percent}%"
+            if usage.fill_rate is not None and usage.fill_rate > 0:
+                partitions_info += f", +{format_rate(usage.fill_rate)}"
+                if usage.eta is not None:
+                    partitions_info += f", pieno tra {format_eta(usage.eta)}"
+        for part in snapshot.quarantined:
+            partitions_info += f"\n{escape_markdown(part.mountpoint)} ({part.fstype}): ⚠️ non risponde"
             
         return (f"*Informazioni Disco*\n"
-                f"Root Usage: *{disk.percent}%*\n"
-                f"Usato: {used_gb:.1f} GB\n"
-                f"Libero: {free_gb:.1f} GB\n"
-                f"Totale: {total_gb:.1f} GB\n"
-                f"*Partizioni*:{partitions_info}")
+                f"{root_info}"
+                f"*Partizioni*:{partitions_info or ' nessuna'}")
     except Exception as e:
         return f"Errore nel recupero delle informazioni sul disco: {e}"
 
 def get_network_info():
     """Ottiene informazioni sul traffico di rete"""
     try:
-        # Ottieni le statistiche di rete
-        net_io = psutil.net_io_counters()
+        # Statistiche di rete dall'istantanea condivisa
+        snapshot = SAMPLER.get(max_age=SNAPSHOT_TTL)
+        net_io = snapshot.net
         
         # Converti in formato leggibile
         sent_mb = net_io.bytes_sent / (1024**2)
         recv_mb = net_io.bytes_recv / (1024**2)
         
-        # Ottieni le connessioni attive
-        connections = psutil.net_connections()
-        established = sum(1 for conn in connections if conn.status == 'ESTABLISHED')
-        listen = sum(1 for conn in connections if conn.status == 'LISTEN')
+        # Conta le connessioni leggendo in streaming /proc/net/{tcp,tcp6,udp,udp6}
+        # (o tramite sock_diag), senza creare un oggetto per ogni socket
+        sockets = count_sockets(use_netlink=load_config()["use_sock_diag"])
+        established = sockets.states.get("ESTABLISHED", 0)
+        listen = len(sockets.listen_ports)
+        connections_info = (f"Connessioni stabilite: {established}\n"
+                            f"Porte in ascolto: {listen}")
+        if sockets.listen_ports:
+            ports = sorted(sockets.listen_ports, key=lambda item: item[1])
+            connections_info += " (" + ", ".join(f"{port}/{protocol}" for protocol, port in ports[:15])
+            connections_info += ", ...)" if len(ports) > 15 else ")"
+        # Altri stati TCP (TIME_WAIT, CLOSE_WAIT, ...); "_" va protetto nel Markdown
+        other_states = ", ".join(f"{escape_markdown(state)}: {count}"
+                                 for state, count in sockets.states.most_common()
+                                 if state not in ("ESTABLISHED", "LISTEN", "UNCONN"))
+        if other_states:
+            connections_info += f"\nAltri stati: {other_states}"
         
-        # Ottieni le informazioni sulle interfacce di rete
-        net_if = psutil.net_if_addrs()
-        interfaces = []
+        # Indirizzi IPv4 delle interfacce (dalla cache dell'identita' dell'host)
+        HOST_IDENTITY.refresh()
+        interfaces = [f"{interface}: {addresses[0]}" for interface, addresses in HOST_IDENTITY.addresses.items()]
         
-        for interface, addresses in net_if.items():
-            for addr in addresses:
-                if addr.family == socket.AF_INET:  # Solo IPv4
-                    interfaces.append(f"{interface}: {addr.address}")
-                    break
+        # Velocita' attuali (media mobile), totale e per interfaccia
+        total = snapshot.net_rate_total
+        rates_info = ""
+        for nic, rate in sorted(snapshot.net_rates.items(),
+                                key=lambda item: item[1].rx_bytes + item[1].tx_bytes, reverse=True)[:5]:
+            rates_info += (f"\n{nic}: ↓ {format_rate(rate.rx_bytes)} ↑ {format_rate(rate.tx_bytes)} "
+                           f"({rate.rx_packets:.0f}/{rate.tx_packets:.0f} pkt/s)")
         
         return (f"*Informazioni Rete*\n"
+                f"Traffico attuale: ↓ {format_rate(total.rx_bytes)} ↑ {format_rate(total.tx_bytes)}\n"
                 f"Dati inviati: {sent_mb:.2f} MB\n"
                 f"Dati ricevuti: {recv_mb:.2f} MB\n"
-                f"Connessioni stabilite: {established}\n"
-                f"Porte in ascolto: {listen}\n"
+                f"{connections_info}\n"
+                f"*Velocita' per interfaccia*:{rates_info}\n"
                 f"*Interfacce*:\n" + "\n".join(interfaces[:5]))  # Limita a 5 interfacce
     except Exception as e:
         return f"Errore nel recupero delle informazioni di rete: {e}"
 
-def get_top_processes(limit=5):
-    """Ottiene i processi che utilizzano più risorse"""
+def get_top_processes(limit=5, sort_by="cpu"):
+    """Ottiene i processi che utilizzano più risorse (sort_by: cpu, rss, io, fds)"""
     try:
-        # Ottieni tutti i processi
-        processes = []
-        for proc in psutil.process_iter(['pid', 'name', 'username', 'cpu_percent', 'memory_percent', 'create_time']):
-            try:
-                pinfo = proc.info
-                pinfo['cpu_percent'] = proc.cpu_percent(interval=0.1)
-                processes.append(pinfo)
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                pass
-        
-        # Ordina per utilizzo CPU (decrescente)
-        processes = sorted(processes, key=lambda p: p['cpu_percent'], reverse=True)
-        
-        # Limita al numero richiesto
-        top_processes = processes[:limit]
+        # Due scansioni di tutti i processi con una sola attesa, selezione con heap
+        top_processes = TOP_PROCESSES.top(limit, sort_by)
         
-        result = f"*Top {limit} Processi (CPU)*\n"
+        result = f"*Top {limit} Processi ({SORT_LABELS[sort_by]})*\n"
         result += "```\n"
-        result += f"{'PID':>7} {'CPU%':>6} {'MEM%':>6} {'USER':12} {'NAME'}\n"
+        if sort_by == "io":
+            result += f"{'PID':>7} {'CPU%':>6} {'IO KB/s':>8} {'USER':12} {'NAME'}\n"
+        elif sort_by == "fds":
+            result += f"{'PID':>7} {'CPU%':>6} {'FD':>6} {'USER':12} {'NAME'}\n"
+        elif sort_by == "rss":
+            result += f"{'PID':>7} {'MEM%':>6} {'RSS MB':>7} {'USER':12} {'NAME'}\n"
+        else:
+            result += f"{'PID':>7} {'CPU%':>6} {'MEM%':>6} {'USER':12} {'NAME'}\n"
         result += "-" * 50 + "\n"
         
         for proc in top_processes:
-            result += f"{proc['pid']:7d} {proc['cpu_percent']:6.1f} {proc['memory_percent']:6.1f} {proc['username'][:12]:12} {proc['name']}\n"
+            if sort_by == "io":
+                columns = f"{proc.cpu_percent:6.1f} {proc.io_rate / 1024:8.1f}"
+            elif sort_by == "fds":
+                columns = f"{proc.cpu_percent:6.1f} {proc.num_fds:6d}"
+            elif sort_by == "rss":
+                columns = f"{proc.memory_percent:6.1f} {proc.rss / (1024*1024):7.1f}"
+            else:
+                columns = f"{proc.cpu_percent:6.1f} {proc.memory_percent:6.1f}"
+            result += f"{proc.pid:7d} {columns} {proc.username[:12]:12} {proc.name}\n"
         
         result += "```"
         return result
     except Exception as e:
         return f"Errore nel recupero dei processi attivi: {e}"
 
+def get_login_history(days=7, ip=None, user=None, host=None, external_only=False, page=1, page_size=15):
+    """Accessi SSH degli ultimi `days` giorni, filtrati e paginati"""
+    try:
+        filters = dict(since=time.time() - days * 86400, ip=ip, username=user, host=host,
+                       external_only=external_only)
+        total = STATE_STORE.count_logins(**filters)
+        pages = max(1, (total + page_size - 1) // page_size)
+        page = max(1, min(page, pages))
+        rows = STATE_STORE.query_logins(limit=page_size, offset=(page - 1) * page_size, **filters)
+        
+        active = [f"{name}={value}" for name, value in (("ip", ip), ("utente", user), ("host", host)) if value]
+        if external_only:
+            active.append("esterni")
+        result = f"*Accessi SSH ultimi {days} giorni* ({total}, pagina {page}/{pages})\n"
+        if active:
+            result += "Filtri: " + escape_markdown(", ".join(active)) + "\n"
+        if not rows:
+            return result + "Nessun accesso trovato"
+        result += "```\n"
+        for row in rows:
+            when = datetime.fromtimestamp(row["ts"]).strftime("%d/%m %H:%M")
+            marker = " " if not row["excluded"] else "*"  # * = IP escluso (rete interna/VPN)
+            result += f"{when} {row['ip']:>15}{marker} {row['username'][:12]:12} {row['host'][:15]}\n"
+        result += "```"
+        return result
+    except Exception as e:
+        return f"Errore nel recupero dello storico degli accessi: {e}"
+
+def get_login_stats(days=7, external_only=False):
+    """IP piu' frequenti, accessi per utente e IP nuovi negli ultimi `days` giorni"""
+    try:
+        stats = STATE_STORE.login_stats(since=time.time() - days * 86400, external_only=external_only)
+        result = f"*Statistiche accessi SSH ultimi {days} giorni*\n```\n"
+        result += "IP piu' frequenti:\n"
+        result += "".join(f"  {ip:>39} {count:6d}\n" for ip, count in stats["top_ips"]) or "  -\n"
+        result += "Accessi per utente:\n"
+        result += "".join(f"  {user[:20]:20} {count:6d}\n" for user, count in stats["per_user"]) or "  -\n"
+        result += "IP visti per la prima volta:\n"
+        result += "".join(f"  {ip:>39} {datetime.fromtimestamp(first).strftime('%d/%m/%y %H:%M')}\n"
+                          for ip, first, _count in stats["first_seen"]) or "  -\n"
+        return result + "```"
+    except Exception as e:
+        return f"Errore nel recupero delle statistiche degli accessi: {e}"
+
 if __name__ == "__main__":
+    init_bot()
     monitor_loop()
@@ -0,0 +1,101 @@
+import math
+from collections import namedtuple
+
+# Velocita' (al secondo) di un'interfaccia, gia' smussate con EWMA
+NicRate = namedtuple("NicRate", ["rx_bytes", "tx_bytes", "rx_packets", "tx_packets"])
+
+_COUNTER_FIELDS = ("bytes_recv", "bytes_sent", "packets_recv", "packets_sent")
+_WRAP_32 = 2 ** 32
+_WRAP_64 = 2 ** 64
+
+
+def counter_delta(previous, current, max_rate_delta=None):
+    """
+    Differenza tra due letture di un contatore, gestendo il wraparound a 32 o 64 bit.
+    Restituisce None se il contatore e' stato azzerato (es. interfaccia ricreata).
+    """
+    if current >= previous:
+        return current - previous
+    for wrap in (_WRAP_32, _WRAP_64):
+        # Un wrap e' plausibile solo se il valore precedente era nella meta' alta del contatore
+        if wrap // 2 <= previous < wrap:
+            delta = current + wrap - previous
+            if max_rate_delta is None or delta <= max_rate_delta:
+                return delta
+            break
+    return None
+
+
+def format_rate(bytes_per_second):
+    """Formatta una velocita' in B/s, KB/s, MB/s o GB/s"""
+    for unit in ("B/s", "KB/s", "MB/s"):
+        if abs(bytes_per_second) < 1024:
+            return f"{bytes_per_second:.1f} {unit}"
+        bytes_per_second /= 1024
+    return f"{bytes_per_second:.1f} GB/s"
+
+
+class NetRateEngine:
+    """
+    Calcola bytes/s e pacchetti/s per interfaccia a partire dai contatori cumulativi.
+
+    Conserva i contatori precedenti di ogni interfaccia, gestisce wraparound e azzeramenti e
+    smussa le velocita' con una media mobile esponenziale pesata sul tempo (costante `tau`
+    secondi), cosi' campioni ravvicinati o irregolari pesano in proporzione all'intervallo.
+    """
+
+    def __init__(self, tau=30.0, max_link_rate=100 * 1024 ** 3, ignored=("lo",)):
+        self.tau = tau
+        self.max_link_rate = max_link_rate  # bytes/s oltre i quali un wrap e' considerato un reset
+        self.ignored = set(ignored)
+        self._previous = {}  # interfaccia -> (istante, contatori)
+        self.rates = {}
+
+    def update(self, per_nic_counters, timestamp):
+        """Aggiorna le velocita' con una nuova lettura di psutil.net_io_counters(pernic=True)"""
+        rates = {}
+        for nic, counters in per_nic_counters.items():
+            values = tuple(getattr(counters, field) for field in _COUNTER_FIELDS)
+            previous = self._previous.get(nic)
+            self._previous[nic] = (timestamp, values)
+            old_rate = self.rates.get(nic)
+            if previous is None or timestamp <= previous[0]:
+                if old_rate is not None:
+                    rates[nic] = old_rate
+                continue
+
+            elapsed = timestamp - previous[0]
+            instant = []
+            for old, new in zip(previous[1], values):
+                delta = counter_delta(old, new, self.max_link_rate * elapsed)
+                if delta is None:
+                    break
+                instant.append(delta / elapsed)
+            if len(instant) != len(values):
+                # Contatori azzerati: riparte dal prossimo campione
+                if old_rate is not None:
+                    rates[nic] = old_rate
+                continue
+
+            if old_rate is None:
+                rates[nic] = NicRate(*instant)
+            else:
+                alpha = 1 - math.exp(-elapsed / self.tau)
+                rates[nic] = NicRate(*(o + alpha * (n - o) for o, n in zip(old_rate, instant)))
+
+        # Dimentica le interfacce scomparse
+        for nic in [n for n in self._previous if n not in per_nic_counters]:
+            del self._previous[nic]
+        self.rates = rates
+        return rates
+
+    def aggregate(self, rates=None):
+        """Somma delle velocita' di tutte le interfacce non ignorate (es. loopback)"""
+        rates = self.rates if rates is None else rates
+        totals = [0.0, 0.0, 0.0, 0.0]
+        for nic, rate in rates.items():
+            if nic in self.ignored:
+                continue
+            for i, value in enumerate(rate):
+                totals[i] += value
+        return NicRate(*totals)
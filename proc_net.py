@@ -0,0 +1,161 @@
+import os
+import re
+import socket
+import struct
+from collections import Counter, namedtuple
+
+from procfs import default_proc_root
+
+# Stati TCP come codificati in /proc/net/tcp (include/net/tcp_states.h)
+TCP_STATES = {
+    "01": "ESTABLISHED", "02": "SYN_SENT", "03": "SYN_RECV", "04": "FIN_WAIT1", "05": "FIN_WAIT2",
+    "06": "TIME_WAIT", "07": "CLOSE", "08": "CLOSE_WAIT", "09": "LAST_ACK", "0A": "LISTEN",
+    "0B": "CLOSING", "0C": "NEW_SYN_RECV",
+}
+_LISTEN = "0A"
+_UDP_UNCONNECTED = "07"  # Per UDP lo stato CLOSE indica un socket in ascolto non connesso
+
+SocketSummary = namedtuple("SocketSummary", ["states", "listen_ports", "per_protocol", "source"])
+
+# Stato di ogni riga: "  12: 0100007F:0035 00000000:0000 0A ..." -> "0A".
+# Il pattern non e' ancorato a inizio riga: la ricerca e' molto piu' veloce e i campi
+# successivi (tx_queue:rx_queue a 8 cifre) non possono corrispondere.
+_STATE_PATTERN = re.compile(rb":[0-9A-Fa-f]{4} [0-9A-Fa-f]+:[0-9A-Fa-f]{4} ([0-9A-Fa-f]{2}) ")
+# Socket senza indirizzo remoto in stato LISTEN (TCP) o CLOSE (UDP non connesso): porta locale e stato
+_LISTEN_PATTERN = re.compile(rb":([0-9A-Fa-f]{4}) 0+:0000 (0A|07) ")
+
+PROTOCOLS = ("tcp", "tcp6", "udp", "udp6")
+
+
+def _count_file(path, chunk_size):
+    """
+    Legge una tabella /proc/net/* a blocchi e restituisce due Counter: stati e coppie
+    (porta locale, stato) dei socket in ascolto.
+    """
+    states = Counter()
+    listening = Counter()
+    remainder = b""
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            chunk = remainder + chunk
+            cut = chunk.rfind(b"\n") + 1
+            remainder = chunk[cut:]
+            # findall e Counter lavorano in C: nessun oggetto per connessione in Python
+            states.update(_STATE_PATTERN.findall(chunk, 0, cut))
+            listening.update(_LISTEN_PATTERN.findall(chunk, 0, cut))
+    if remainder:
+        states.update(_STATE_PATTERN.findall(remainder))
+        listening.update(_LISTEN_PATTERN.findall(remainder))
+    return states, listening
+
+
+def _accumulate(protocol, state_counts, listen_counts, states, listen_ports):
+    """
+    Somma i conteggi di un protocollo ({stato esadecimale: n} e {(porta, stato esadecimale): n})
+    nei contatori globali per stato e per porta in ascolto. Restituisce il totale dei socket.
+    """
+    is_udp = protocol.startswith("udp")
+    listen_state = _UDP_UNCONNECTED if is_udp else _LISTEN
+    for state_hex, count in state_counts.items():
+        if is_udp:
+            state = "UNCONN" if state_hex == _UDP_UNCONNECTED else "ESTABLISHED"
+        else:
+            state = TCP_STATES.get(state_hex, state_hex)
+        states[state] += count
+    for (port, state_hex), count in listen_counts.items():
+        if state_hex == listen_state:
+            listen_ports[(protocol.rstrip("6"), port)] += count
+    return sum(state_counts.values())
+
+
+def count_sockets_procfs(proc_root=None, protocols=PROTOCOLS, chunk_size=1024 * 1024):
+    """Conta i socket per stato e le porte in ascolto leggendo /proc/net/{tcp,tcp6,udp,udp6}"""
+    proc_root = proc_root or default_proc_root()
+    states = Counter()
+    listen_ports = Counter()
+    per_protocol = {}
+    for protocol in protocols:
+        try:
+            raw_states, raw_listening = _count_file(os.path.join(proc_root, "net", protocol), chunk_size)
+        except FileNotFoundError:
+            continue  # Es. IPv6 disabilitato
+        state_counts = Counter()
+        for state_hex, count in raw_states.items():
+            state_counts[state_hex.decode().upper()] += count
+        listen_counts = Counter()
+        for (port_hex, state_hex), count in raw_listening.items():
+            listen_counts[(int(port_hex, 16), state_hex.decode())] += count
+        per_protocol[protocol] = _accumulate(protocol, state_counts, listen_counts, states, listen_ports)
+    return SocketSummary(states, listen_ports, per_protocol, "procfs")
+
+
+# --- netlink sock_diag (opzionale) ---
+
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+_NLMSG_HEADER = struct.Struct("=IHHII")
+_INET_DIAG_REQ_V2 = struct.Struct("=BBBBI48s")
+
+
+def _diag_dump(family, protocol):
+    """Esegue un dump sock_diag e restituisce i conteggi per stato e per (porta, stato) in ascolto"""
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_SOCK_DIAG)
+    try:
+        request = _INET_DIAG_REQ_V2.pack(family, protocol, 0, 0, 0xFFFFFFFF, b"\0" * 48)
+        header = _NLMSG_HEADER.pack(_NLMSG_HEADER.size + len(request), SOCK_DIAG_BY_FAMILY,
+                                    NLM_F_REQUEST | NLM_F_DUMP, 1, 0)
+        sock.sendall(header + request)
+
+        state_counts = Counter()
+        listen_counts = Counter()
+        while True:
+            data = sock.recv(1024 * 1024)
+            offset = 0
+            while offset + _NLMSG_HEADER.size <= len(data):
+                length, msg_type, _flags, _seq, _pid = _NLMSG_HEADER.unpack_from(data, offset)
+                if msg_type == NLMSG_DONE:
+                    return state_counts, listen_counts
+                if msg_type == NLMSG_ERROR:
+                    errno_value = -struct.unpack_from("=i", data, offset + _NLMSG_HEADER.size)[0]
+                    raise OSError(errno_value, os.strerror(errno_value))
+                body = offset + _NLMSG_HEADER.size
+                # inet_diag_msg: family, state, timer, retrans, poi id.sport (big endian)
+                state_hex = f"{data[body + 1]:02X}"
+                state_counts[state_hex] += 1
+                if state_hex in (_LISTEN, _UDP_UNCONNECTED):
+                    sport = struct.unpack_from(">H", data, body + 4)[0]
+                    listen_counts[(sport, state_hex)] += 1
+                offset += (length + 3) & ~3
+    finally:
+        sock.close()
+
+
+def count_sockets_netlink(protocols=PROTOCOLS):
+    """Stesso risultato di count_sockets_procfs, ottenuto tramite netlink sock_diag"""
+    states = Counter()
+    listen_ports = Counter()
+    per_protocol = {}
+    for protocol in protocols:
+        family = socket.AF_INET6 if protocol.endswith("6") else socket.AF_INET
+        ip_protocol = socket.IPPROTO_UDP if protocol.startswith("udp") else socket.IPPROTO_TCP
+        state_counts, listen_counts = _diag_dump(family, ip_protocol)
+        per_protocol[protocol] = _accumulate(protocol, state_counts, listen_counts, states, listen_ports)
+    return SocketSummary(states, listen_ports, per_protocol, "netlink")
+
+
+def count_sockets(proc_root=None, use_netlink=False):
+    """Riepilogo dei socket; con use_netlink prova sock_diag e in caso di errore usa /proc"""
+    if use_netlink:
+        try:
+            return count_sockets_netlink()
+        except (OSError, AttributeError) as e:
+            print(f"sock_diag non disponibile, uso /proc/net: {e}")
+    return count_sockets_procfs(proc_root)
@@ -0,0 +1,242 @@
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+
+import psutil
+
+# Stessi campi (e ordine) delle strutture di psutil usate dal resto del monitor
+VirtualMemory = namedtuple("VirtualMemory", ["total", "available", "percent", "used", "free", "buffers", "cached"])
+SwapMemory = namedtuple("SwapMemory", ["total", "used", "free", "percent"])
+NetIO = namedtuple("NetIO", ["bytes_sent", "bytes_recv", "packets_sent", "packets_recv",
+                             "errin", "errout", "dropin", "dropout"])
+
+# Letture di sistema di un campionamento
+SystemSample = namedtuple("SystemSample", ["cpu_percent", "memory", "swap", "load_avg", "net", "net_per_nic",
+                                           "uptime"])
+
+
+def default_proc_root():
+    """Radice di /proc: PROC_ROOT se impostata, altrimenti /host/proc (Docker) se presente"""
+    root = os.getenv("PROC_ROOT")
+    if root:
+        return root
+    return "/host/proc" if os.path.isdir("/host/proc/net") else "/proc"
+
+
+class ProcFile:
+    """
+    File di /proc tenuto aperto e riletto con os.pread dall'inizio: nessuna open/close per
+    campionamento e un buffer che cresce solo se il contenuto non ci sta.
+    """
+
+    def __init__(self, path, size=4096):
+        self.path = path
+        self.size = size
+        self._fd = None
+
+    def read(self):
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDONLY)
+        while True:
+            try:
+                data = os.pread(self._fd, self.size, 0)
+            except OSError:
+                # Descrittore non piu' valido (es. /proc rimontato): riapre una volta
+                self.close()
+                self._fd = os.open(self.path, os.O_RDONLY)
+                data = os.pread(self._fd, self.size, 0)
+            if len(data) < self.size:
+                return data
+            self.size *= 2  # Contenuto troncato: rilegge con un buffer piu' grande
+
+    def close(self):
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+
+def _percent(part, total):
+    return round(part * 100 / total, 1) if total > 0 else 0.0
+
+
+class ProcfsBackend:
+    """
+    Backend di campionamento che legge direttamente /proc/stat, /proc/meminfo, /proc/loadavg,
+    /proc/net/dev e /proc/uptime sotto `root`, con i file tenuti aperti (ProcFile) e un solo
+    passaggio di parsing per file. La CPU e' calcolata come in psutil.cpu_percent(None):
+    differenza dei tempi rispetto alla lettura precedente.
+    """
+
+    name = "procfs"
+
+    def __init__(self, root=None):
+        self.root = root or default_proc_root()
+        self._files = {name: ProcFile(os.path.join(self.root, *name.split("/")))
+                       for name in ("stat", "meminfo", "loadavg", "net/dev", "uptime")}
+        self._last_cpu = None
+
+    def _cpu_percent(self):
+        data = self._files["stat"].read()
+        fields = [int(value) for value in data[:data.index(b"\n")].split()[1:]]
+        # user nice system idle iowait irq softirq steal guest guest_nice: guest e' gia' in user
+        total = sum(fields[:8])
+        idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+        previous, self._last_cpu = self._last_cpu, (total, idle)
+        if previous is None or total <= previous[0]:
+            return 0.0
+        busy = (total - previous[0]) - (idle - previous[1])
+        return max(0.0, min(100.0, _percent(busy, total - previous[0])))
+
+    def _memory(self):
+        values = {}
+        for line in self._files["meminfo"].read().splitlines():
+            key, _, rest = line.partition(b":")
+            values[key] = int(rest.split()[0]) * 1024
+        total = values[b"MemTotal"]
+        free = values[b"MemFree"]
+        buffers = values.get(b"Buffers", 0)
+        cached = values.get(b"Cached", 0) + values.get(b"SReclaimable", 0)
+        available = values.get(b"MemAvailable", free + buffers + cached)
+        used = total - available  # Come le versioni recenti di psutil
+        memory = VirtualMemory(total, available, _percent(total - available, total), used, free, buffers, cached)
+        swap_total = values.get(b"SwapTotal", 0)
+        swap_free = values.get(b"SwapFree", 0)
+        swap_used = swap_total - swap_free
+        swap = SwapMemory(swap_total, swap_used, swap_free, _percent(swap_used, swap_total))
+        return memory, swap
+
+    def _net(self):
+        per_nic = {}
+        totals = [0] * 8
+        # Le prime due righe sono intestazioni
+        for line in self._files["net/dev"].read().splitlines()[2:]:
+            name, _, rest = line.partition(b":")
+            fields = rest.split()
+            # rx: bytes packets errs drop ... (8 campi), tx: bytes packets errs drop ...
+            counters = NetIO(int(fields[8]), int(fields[0]), int(fields[9]), int(fields[1]),
+                             int(fields[2]), int(fields[10]), int(fields[3]), int(fields[11]))
+            per_nic[name.strip().decode()] = counters
+            for i, value in enumerate(counters):
+                totals[i] += value
+        return NetIO(*totals), per_nic
+
+    def load_avg(self):
+        parts = self._files["loadavg"].read().split()
+        return float(parts[0]), float(parts[1]), float(parts[2])
+
+    def uptime(self):
+        return float(self._files["uptime"].read().split()[0])
+
+    def sample(self):
+        memory, swap = self._memory()
+        net, per_nic = self._net()
+        try:
+            load_avg = self.load_avg()
+        except (OSError, ValueError, IndexError):
+            load_avg = None
+        return SystemSample(self._cpu_percent(), memory, swap, load_avg, net, per_nic, self.uptime())
+
+    def close(self):
+        for proc_file in self._files.values():
+            proc_file.close()
+
+
+class PsutilBackend:
+    """Backend di campionamento basato su psutil (riferimento e ripiego senza /proc)"""
+
+    name = "psutil"
+
+    def __init__(self, uptime_func=None):
+        self.uptime_func = uptime_func
+        psutil.cpu_percent(interval=None)  # La prima chiamata inizializza il riferimento
+
+    def uptime(self):
+        if self.uptime_func is not None:
+            return self.uptime_func()
+        return time.time() - psutil.boot_time()
+
+    def sample(self):
+        try:
+            load_avg = os.getloadavg()
+        except (OSError, AttributeError):
+            load_avg = None
+        return SystemSample(psutil.cpu_percent(interval=None), psutil.virtual_memory(), psutil.swap_memory(),
+                            load_avg, psutil.net_io_counters(), psutil.net_io_counters(pernic=True),
+                            self.uptime())
+
+    def close(self):
+        pass
+
+
+def create_backend(kind=None, root=None):
+    """
+    Backend scelto con `kind` o con la variabile SAMPLER_BACKEND ("procfs", predefinito, o
+    "psutil"); se /proc non e' leggibile si usa psutil.
+    """
+    kind = kind or os.getenv("SAMPLER_BACKEND", "procfs")
+    if kind == "procfs":
+        backend = ProcfsBackend(root)
+        try:
+            backend.sample()
+            return backend
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            backend.close()
+            print(f"Lettura diretta di {backend.root} non disponibile ({e}), uso psutil")
+    return PsutilBackend()
+
+
+class HostIdentity:
+    """
+    Nome host e indirizzi IP del server, memorizzati finche' non cambia l'elenco delle
+    interfacce (o al massimo per `max_age` secondi), senza avviare processi esterni.
+    """
+
+    def __init__(self, root=None, max_age=300.0):
+        self.root = root or default_proc_root()
+        self.max_age = max_age
+        self._route = ProcFile(os.path.join(self.root, "net", "route"))
+        self._lock = threading.Lock()
+        self._key = None
+        self._loaded_at = 0.0
+        self.hostname = socket.gethostname()
+        self.addresses = {}  # interfaccia -> lista di indirizzi IPv4
+        self.primary_ip = None
+
+    def _default_interface(self):
+        """Interfaccia della rotta predefinita (destinazione 00000000 in /proc/net/route)"""
+        try:
+            for line in self._route.read().splitlines()[1:]:
+                fields = line.split()
+                if len(fields) > 1 and fields[1] == b"00000000":
+                    return fields[0].decode()
+        except OSError:
+            pass
+        return None
+
+    def refresh(self, interfaces=None):
+        """Aggiorna i dati se l'elenco delle interfacce e' cambiato o sono troppo vecchi"""
+        key = tuple(sorted(interfaces)) if interfaces is not None else None
+        now = time.monotonic()
+        with self._lock:
+            if self._loaded_at and key in (None, self._key) and now - self._loaded_at < self.max_age:
+                return
+            if key is not None:
+                self._key = key
+            self._loaded_at = now
+            self.hostname = socket.gethostname()
+            addresses = {}
+            for nic, addrs in psutil.net_if_addrs().items():
+                ips = [a.address for a in addrs if a.family == socket.AF_INET]
+                if ips:
+                    addresses[nic] = ips
+            self.addresses = addresses
+            # Come "hostname -I": primo indirizzo non loopback, preferendo la rotta predefinita
+            candidates = addresses.get(self._default_interface(), []) + [
+                ip for ips in addresses.values() for ip in ips]
+            self.primary_ip = next((ip for ip in candidates
+                                    if not ip.startswith("127.") and not ip.startswith("169.254.")), None)
@@ -0,0 +1,106 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+MAX_DURATION = 300  # Durata massima (secondi) di una profilazione
+
+
+class SamplingProfiler:
+    """
+    Profiler a campionamento per l'uso in produzione.
+
+    Un thread legge ogni `interval` secondi lo stack di tutti gli altri thread
+    (sys._current_frames) e conta gli stack uguali; al termine scrive un file nel formato
+    "collapsed" (una riga "thread;modulo:funzione;... conteggio" per stack), leggibile da
+    flamegraph.pl, speedscope o inferno. E' attivo solo su richiesta e per una durata limitata;
+    il costo e' proporzionale al numero di thread, non al lavoro svolto.
+    """
+
+    def __init__(self, directory=None, interval=0.01, max_files=10):
+        self.directory = directory or os.getenv("PROFILE_DIR", "/tmp")
+        self.interval = interval
+        self.max_files = max_files
+        self.running = False
+        self.ends_at = None
+        self.samples = 0
+        self.last_file = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self, duration):
+        """Avvia una profilazione di `duration` secondi; False se ne e' gia' in corso una"""
+        duration = max(1, min(MAX_DURATION, duration))
+        with self._lock:
+            if self.running:
+                return False
+            self.running = True
+            self.samples = 0
+            self.ends_at = time.time() + duration
+            self._stop.clear()
+        threading.Thread(target=self._run, args=(duration,), name="profiler", daemon=True).start()
+        return True
+
+    def stop(self):
+        """Interrompe la profilazione in corso (il file viene comunque scritto)"""
+        self._stop.set()
+
+    def _run(self, duration):
+        stacks = Counter()
+        own_id = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + duration
+        try:
+            while time.monotonic() < deadline and not self._stop.wait(self.interval):
+                for thread in threading.enumerate():
+                    names[thread.ident] = thread.name
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    stacks[(names.get(thread_id, str(thread_id)),) + _stack(frame)] += 1
+                self.samples += 1
+            self.last_file = self._write(stacks)
+            print(f"Profilazione terminata: {self.samples} campioni in {self.last_file}")
+        except Exception as e:
+            print(f"Errore durante la profilazione: {e}")
+        finally:
+            with self._lock:
+                self.running = False
+                self.ends_at = None
+
+    def _write(self, stacks):
+        path = os.path.join(self.directory, time.strftime("server_monitor-%Y%m%d-%H%M%S.folded"))
+        with open(path, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+        self._cleanup()
+        return path
+
+    def _cleanup(self):
+        """Mantiene solo gli ultimi `max_files` file di profilazione"""
+        for name in self.files()[self.max_files:]:
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def files(self):
+        """Nomi dei file di profilazione presenti, dal piu' recente"""
+        try:
+            return sorted((name for name in os.listdir(self.directory)
+                           if name.startswith("server_monitor-") and name.endswith(".folded")), reverse=True)
+        except OSError:
+            return []
+
+
+def _stack(frame):
+    """Stack dalla radice alla foglia come tupla di "modulo:funzione" """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        names.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    names.reverse()
+    return tuple(names)
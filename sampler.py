@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import namedtuple
+
+from disks import DiskCollector
+from net_rates import NetRateEngine
+from procfs import create_backend
+
+# Istantanea delle risorse di sistema, condivisa tra bot, interfaccia web e allarmi
+Snapshot = namedtuple("Snapshot", [
+    "timestamp",   # time.time() del campionamento
+    "monotonic",   # time.monotonic() del campionamento, per calcolare l'eta'
+    "cpu_percent",
+    "memory",      # VirtualMemory (procfs) o psutil.virtual_memory(), stessi campi
+    "swap",        # SwapMemory (procfs) o psutil.swap_memory()
+    "load_avg",    # (1, 5, 15 minuti) oppure None
+    "disk",        # DiskUsage di "/" (campi di psutil.disk_usage piu' inode e riempimento), None se non letto
+    "partitions",  # lista di (Mount, DiskUsage) per i filesystem fisici e di rete
+    "quarantined", # lista dei Mount che non hanno risposto in tempo (vedi DiskCollector)
+    "net",         # contatori di rete totali (NetIO o psutil.net_io_counters())
+    "net_per_nic", # {interfaccia: contatori}
+    "net_rates",   # {interfaccia: NicRate} velocita' smussate
+    "net_rate_total",  # NicRate aggregata (esclusa loopback)
+    "uptime",
+])
+
+
+class ResourceSampler:
+    """
+    Campionatore delle risorse di sistema.
+
+    sample() viene chiamato periodicamente dallo scheduler (task "sample"); la CPU e' calcolata
+    come differenza rispetto al campione precedente, quindi nessun lettore resta bloccato nella
+    misura. CPU, memoria, carico, rete e uptime arrivano dal `backend` (vedi procfs), i dischi
+    dall'ultima lettura di `disks` (rinnovata se piu' vecchia di `disk_max_age` secondi, con
+    timeout per mount). I lettori usano get(max_age): se l'istantanea
+    e' piu' vecchia del TTL ne viene presa una nuova, una sola volta anche con richieste
+    concorrenti. I listener vengono chiamati fuori dal lock, quindi un listener lento non
+    blocca i lettori.
+    """
+
+    def __init__(self, backend=None, disks=None, disk_max_age=30.0, instruments=None):
+        self.backend = backend or create_backend()
+        self.disks = disks or DiskCollector()
+        self.disk_max_age = disk_max_age
+        self.instruments = instruments  # Instrumentation: durata delle fasi del campionamento
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._primed = False
+        self._listeners = []
+        self.net_rates = NetRateEngine()
+
+    def add_listener(self, func):
+        """Registra una funzione chiamata con ogni nuova istantanea (es. per lo storico)"""
+        self._listeners.append(func)
+
+    def sample(self):
+        """Acquisisce una nuova istantanea e la pubblica"""
+        with self._lock:
+            snapshot = self._sample_locked()
+        self._notify(snapshot)
+        return snapshot
+
+    def _sample_locked(self):
+        if not self._primed:
+            # La prima lettura della CPU non ha un riferimento: inizializza il delta
+            self.backend.sample()
+            time.sleep(0.1)
+            self._primed = True
+
+        monotonic = time.monotonic()
+        system = self.backend.sample()
+        net_rates = self.net_rates.update(system.net_per_nic, monotonic)
+        disks_start = time.monotonic()
+        partitions, quarantined = self.disks.get(max_age=self.disk_max_age)
+        disks_end = time.monotonic()
+
+        snapshot = Snapshot(
+            timestamp=time.time(),
+            monotonic=monotonic,
+            cpu_percent=system.cpu_percent,
+            memory=system.memory,
+            swap=system.swap,
+            load_avg=system.load_avg,
+            disk=next((usage for mount, usage in partitions if mount.mountpoint == "/"), None),
+            partitions=partitions,
+            quarantined=quarantined,
+            net=system.net,
+            net_per_nic=system.net_per_nic,
+            net_rates=net_rates,
+            net_rate_total=self.net_rates.aggregate(net_rates),
+            uptime=system.uptime,
+        )
+        self._snapshot = snapshot
+        if self.instruments is not None:
+            self.instruments.observe("sample.system", disks_start - monotonic)
+            self.instruments.observe("sample.disks", disks_end - disks_start)
+        return snapshot
+
+    def _notify(self, snapshot):
+        # Chiamato senza il lock: get() e sample() non attendono i listener
+        start = time.monotonic()
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"Errore nel listener del campionatore: {e}")
+        if self.instruments is not None:
+            self.instruments.observe("sample.listeners", time.monotonic() - start)
+
+    def _is_fresh(self, snapshot, max_age):
+        return snapshot is not None and (max_age is None or time.monotonic() - snapshot.monotonic <= max_age)
+
+    def get(self, max_age=None):
+        """
+        Restituisce l'ultima istantanea; se manca o e' piu' vecchia di `max_age` secondi
+        ne acquisisce una nuova (una sola volta anche con richieste concorrenti).
+        """
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot, max_age):
+            return snapshot
+        with self._lock:
+            # Un'altra richiesta concorrente potrebbe averla gia' aggiornata
+            snapshot = self._snapshot
+            if self._is_fresh(snapshot, max_age):
+                return snapshot
+            snapshot = self._sample_locked()
+        self._notify(snapshot)
+        return snapshot
@@ -0,0 +1,226 @@
+import heapq
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Politiche per i turni persi (task ancora in esecuzione o scheduler in ritardo)
+SKIP = "skip"          # Salta i turni persi e riparte dal prossimo turno regolare
+COALESCE = "coalesce"  # Esegue subito una sola volta, poi riparte da adesso
+CATCH_UP = "catch_up"  # Recupera i turni persi uno dopo l'altro (al massimo max_catch_up)
+MISSED_POLICIES = (SKIP, COALESCE, CATCH_UP)
+
+
+class TaskStats:
+    """Statistiche di esecuzione di un task"""
+    __slots__ = ("runs", "failures", "timeouts", "overruns", "skipped", "last_duration", "avg_duration",
+                 "max_duration", "last_start", "last_error")
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.timeouts = 0  # Esecuzioni che hanno superato il timeout
+        self.overruns = 0  # Esecuzioni piu' lunghe dell'intervallo
+        self.skipped = 0  # Turni saltati perche' il task era ancora in esecuzione o in ritardo
+        self.last_duration = None
+        self.avg_duration = None  # Media mobile esponenziale
+        self.max_duration = 0.0
+        self.last_start = None  # time.time() dell'ultimo avvio
+        self.last_error = None
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ScheduledTask:
+    """Controllo periodico registrato nello Scheduler"""
+
+    def __init__(self, name, func, interval, jitter=0.1, timeout=None, missed=SKIP, max_catch_up=3,
+                 description=""):
+        if missed not in MISSED_POLICIES:
+            raise ValueError(f"Politica per i turni persi non valida: {missed}")
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter  # Frazione dell'intervallo usata come ritardo casuale massimo
+        self.timeout = timeout if timeout is not None else interval * 3
+        self.missed = missed
+        self.max_catch_up = max_catch_up
+        self.description = description
+        self.stats = TaskStats()
+        self.running_since = None  # time.monotonic() dell'esecuzione in corso
+        self.timed_out = False
+        self.next_tick = None  # Turno regolare (senza jitter) successivo
+        self.token = None  # Sequenza dell'unica voce valida del task nella coda
+
+
+class Scheduler:
+    """
+    Esegue controlli periodici indipendenti in un pool di thread.
+
+    Ogni task ha il proprio intervallo, un ritardo casuale (jitter) per non sincronizzare i
+    controlli, un timeout e una politica per i turni persi. Un task non viene mai eseguito in
+    parallelo con se stesso: se e' ancora in corso quando arriva il turno, il turno viene
+    contato come saltato. Un task bloccato (oltre il timeout) viene segnalato e occupa solo il
+    proprio thread: il pool ha un thread per task, quindi gli altri controlli proseguono.
+    """
+
+    def __init__(self, clock=time.monotonic, instruments=None):
+        self.clock = clock
+        self.instruments = instruments  # Instrumentation: istogramma "check.<nome>" delle durate
+        self.tasks = {}
+        self._heap = []  # (istante di esecuzione, sequenza, nome)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._executor = None
+        self._thread = None
+
+    def add(self, task):
+        with self._cond:
+            self.tasks[task.name] = task
+            task.next_tick = self.clock()
+            # Primo avvio sfasato dal jitter, per non eseguire tutti i controlli insieme
+            self._push(task, task.next_tick + random.uniform(0, task.jitter * task.interval))
+            self._cond.notify()
+        return task
+
+    def _push(self, task, when):
+        # Chiamato con il lock acquisito
+        # Le voci precedenti dello stesso task restano nella coda ma vengono ignorate
+        self._seq += 1
+        task.token = self._seq
+        heapq.heappush(self._heap, (when, self._seq, task.name))
+
+    def configure(self, intervals):
+        """Aggiorna gli intervalli ({nome: secondi}); un intervallo piu' breve vale da subito"""
+        with self._cond:
+            for name, interval in intervals.items():
+                task = self.tasks.get(name)
+                if task is None or interval <= 0 or interval == task.interval:
+                    continue
+                task.interval = interval
+                if task.next_tick is not None and task.next_tick - self.clock() > interval:
+                    task.next_tick = self.clock() + interval
+                    self._push(task, task.next_tick)
+            self._cond.notify()
+
+    def start(self):
+        if self._thread is None:
+            self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.tasks)) + 1,
+                                                thread_name_prefix="check")
+            self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+            self._thread.start()
+
+    def join(self):
+        """Attende il thread dello scheduler (non termina finche' il processo e' attivo)"""
+        if self._thread is not None:
+            self._thread.join()
+
+    def run_now(self, name):
+        """Anticipa l'esecuzione di un task"""
+        with self._cond:
+            self._push(self.tasks[name], self.clock())
+            self._cond.notify()
+
+    def _run(self):
+        with self._cond:
+            while True:
+                now = self.clock()
+                self._check_timeouts(now)
+                if not self._heap or self._heap[0][0] > now:
+                    self._cond.wait(self._wait_time(now))
+                    continue
+                _when, seq, name = heapq.heappop(self._heap)
+                task = self.tasks[name]
+                if seq == task.token and not self._dispatch(task, now):
+                    return  # Pool chiuso: l'interprete sta terminando
+
+    def _wait_time(self, now):
+        # Chiamato con il lock acquisito: fino al prossimo task o alla prossima scadenza di timeout
+        deadlines = [self._heap[0][0]] if self._heap else []
+        deadlines += [task.running_since + task.timeout for task in self.tasks.values()
+                      if task.running_since is not None and not task.timed_out]
+        return max(0.0, min(deadlines) - now) if deadlines else None
+
+    def _check_timeouts(self, now):
+        for task in self.tasks.values():
+            if task.running_since is not None and not task.timed_out and now - task.running_since > task.timeout:
+                task.timed_out = True
+                task.stats.timeouts += 1
+                print(f"Controllo '{task.name}' in esecuzione da oltre {task.timeout:g} s (timeout)")
+
+    def _dispatch(self, task, now):
+        # Chiamato con il lock acquisito
+        if task.running_since is not None:
+            # Ancora in esecuzione: il turno viene saltato, il prossimo e' fissato al termine
+            task.stats.skipped += 1
+            return True
+        try:
+            self._executor.submit(self._execute, task)
+        except RuntimeError:
+            return False
+        task.running_since = now
+        task.timed_out = False
+        task.stats.last_start = time.time()
+        return True
+
+    def _execute(self, task):
+        start = self.clock()
+        error = None
+        try:
+            task.func()
+        except Exception as e:
+            error = e
+            print(f"Errore nel controllo '{task.name}': {e}")
+        end = self.clock()
+        duration = end - start
+        if self.instruments is not None:
+            self.instruments.observe(f"check.{task.name}", duration)
+        with self._cond:
+            stats = task.stats
+            stats.runs += 1
+            stats.last_duration = duration
+            stats.avg_duration = duration if stats.avg_duration is None else stats.avg_duration * 0.8 + duration * 0.2
+            stats.max_duration = max(stats.max_duration, duration)
+            if error is not None:
+                stats.failures += 1
+                stats.last_error = str(error)
+            if duration > task.interval:
+                stats.overruns += 1
+            task.running_since = None
+            self._schedule_next(task, end)
+            self._cond.notify()
+
+    def _schedule_next(self, task, now):
+        # Chiamato con il lock acquisito
+        next_tick = task.next_tick + task.interval
+        if next_tick <= now:
+            missed = int((now - next_tick) // task.interval) + 1
+            if task.missed == CATCH_UP:
+                # Recupera i turni mancati senza superarne max_catch_up
+                skipped = max(0, missed - task.max_catch_up)
+                next_tick += skipped * task.interval
+                task.stats.skipped += skipped
+            elif task.missed == COALESCE:
+                task.stats.skipped += missed - 1
+                next_tick = now
+            else:
+                task.stats.skipped += missed
+                next_tick += missed * task.interval
+        task.next_tick = next_tick
+        delay = random.uniform(0, task.jitter * task.interval) if task.jitter and next_tick > now else 0.0
+        self._push(task, next_tick + delay)
+
+    def stats(self):
+        """Statistiche di tutti i task: {nome: dizionario}"""
+        now = self.clock()
+        with self._cond:
+            result = {}
+            for name, task in self.tasks.items():
+                info = task.stats.to_dict()
+                info.update(interval=task.interval, timeout=task.timeout, missed=task.missed,
+                            description=task.description,
+                            running_for=None if task.running_since is None else now - task.running_since,
+                            next_in=None if task.next_tick is None else max(0.0, task.next_tick - now))
+                result[name] = info
+            return result
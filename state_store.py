@@ -0,0 +1,380 @@
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cursors (
+    name TEXT PRIMARY KEY,
+    inode INTEGER,
+    offset INTEGER NOT NULL,
+    generation INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS alert_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    key TEXT,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alert_history_ts ON alert_history (ts);
+CREATE TABLE IF NOT EXISTS alert_state (
+    key TEXT PRIMARY KEY,
+    firing INTEGER NOT NULL,
+    last_sent REAL,
+    suppressed INTEGER NOT NULL,
+    summary TEXT
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    series TEXT NOT NULL,
+    resolution INTEGER NOT NULL,
+    start REAL NOT NULL,
+    sum REAL NOT NULL,
+    count INTEGER NOT NULL,
+    min REAL,
+    max REAL,
+    PRIMARY KEY (series, resolution, start)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ssh_logins (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    ip TEXT NOT NULL,
+    username TEXT NOT NULL,
+    host TEXT NOT NULL,
+    method TEXT,
+    excluded INTEGER NOT NULL DEFAULT 0
+);
+-- Indici coprenti: filtri e aggregati per periodo non leggono la tabella
+CREATE INDEX IF NOT EXISTS ssh_logins_ts ON ssh_logins (ts, ip, username, excluded);
+CREATE INDEX IF NOT EXISTS ssh_logins_ip ON ssh_logins (ip, ts, excluded);
+CREATE INDEX IF NOT EXISTS ssh_logins_user ON ssh_logins (username, ts, excluded);
+CREATE INDEX IF NOT EXISTS ssh_logins_host ON ssh_logins (host, ts, excluded);
+-- Primo e ultimo accesso di ogni IP, aggiornati a ogni inserimento
+CREATE TABLE IF NOT EXISTS login_ips (
+    ip TEXT PRIMARY KEY,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    count INTEGER NOT NULL,
+    excluded INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS login_ips_first_seen ON login_ips (first_seen);
+-- Conteggi giornalieri (giorno UTC) per gli aggregati su periodi lunghi
+CREATE TABLE IF NOT EXISTS login_daily (
+    day INTEGER NOT NULL,
+    ip TEXT NOT NULL,
+    username TEXT NOT NULL,
+    excluded INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, ip, username, excluded)
+) WITHOUT ROWID;
+"""
+
+LOGIN_COLUMNS = ("ts", "ip", "username", "host", "method", "excluded")
+
+
+def encode_key(key):
+    """Chiave di un allarme (stringa o tupla) in forma testuale"""
+    return json.dumps(key)
+
+
+def decode_key(text):
+    value = json.loads(text)
+    return tuple(value) if isinstance(value, list) else value
+
+
+class StateStore:
+    """
+    Stato persistente del monitor in un database SQLite in modalita' WAL: cursori dei log,
+    storico e stato degli allarmi, aggregati delle metriche e storico degli accessi SSH.
+
+    Le scritture vengono accumulate in memoria (le scritture ripetute sulla stessa chiave si
+    sovrascrivono) e salvate da un thread in un'unica transazione ogni `flush_interval`
+    secondi, o prima se si accumulano `max_pending` operazioni. Una transazione interrotta
+    non lascia mai il database a meta': dopo un crash si riparte dall'ultimo gruppo salvato.
+    Le letture vedono anche le modifiche non ancora salvate.
+    """
+
+    def __init__(self, path, flush_interval=5.0, max_pending=1000, alert_retention=90 * 86400,
+                 rollup_retention=30 * 86400, login_retention=365 * 86400, alert_state_retention=86400,
+                 instruments=None):
+        self.path = path
+        self.instruments = instruments  # Instrumentation: durata delle transazioni di salvataggio
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.alert_retention = alert_retention
+        self.rollup_retention = rollup_retention
+        self.login_retention = login_retention
+        self.alert_state_retention = alert_state_retention  # Stati a riposo rimasti nel database
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._last_prune = 0.0
+        self._cursors = {}
+        self._alert_states = {}
+        self._alerts = []
+        self._rollups = {}
+        self._logins = []
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Con WAL, NORMAL garantisce la coerenza dopo un crash; al massimo si perde l'ultimo gruppo
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def start(self):
+        """Avvia il thread che salva periodicamente le scritture in attesa"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="state-store", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Errore nel salvataggio dello stato: {e}")
+
+    def _pending_count(self):
+        return (len(self._cursors) + len(self._alert_states) + len(self._alerts) + len(self._rollups)
+                + len(self._logins))
+
+    def pending_count(self):
+        """Operazioni in attesa di essere scritte"""
+        with self._lock:
+            return self._pending_count()
+
+    def _queued(self):
+        # Chiamato con il lock acquisito
+        if self._pending_count() >= self.max_pending:
+            self._wakeup.set()
+
+    # --- Cursori dei log ---
+
+    def get_cursor(self, name):
+        """Restituisce (inode, offset, generazione) oppure None"""
+        with self._lock:
+            pending = self._cursors.get(name)
+        if pending is not None:
+            return pending
+        with self._db_lock:
+            row = self._db.execute("SELECT inode, offset, generation FROM cursors WHERE name = ?",
+                                   (name,)).fetchone()
+        return tuple(row) if row else None
+
+    def set_cursor(self, name, inode, offset, generation=0):
+        with self._lock:
+            self._cursors[name] = (inode, offset, generation)
+            self._queued()
+
+    # --- Allarmi ---
+
+    def add_alert(self, key, message, timestamp=None):
+        """Aggiunge un messaggio allo storico degli allarmi"""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            self._alerts.append((timestamp, None if key is None else encode_key(key), message))
+            self._queued()
+
+    def recent_alerts(self, limit=50):
+        """Ultimi allarmi come lista di (istante, chiave, messaggio), dal piu' recente"""
+        self.flush()
+        with self._db_lock:
+            rows = self._db.execute("SELECT ts, key, message FROM alert_history ORDER BY ts DESC LIMIT ?",
+                                    (limit,)).fetchall()
+        return [(ts, decode_key(key) if key else None, message) for ts, key, message in rows]
+
+    def set_alert_state(self, key, firing, last_sent, suppressed, summary):
+        """Stato di un allarme; `last_sent` e' un istante time.time() oppure None"""
+        with self._lock:
+            self._alert_states[encode_key(key)] = (firing, last_sent, suppressed, summary)
+            self._queued()
+
+    def delete_alert_state(self, key):
+        """Rimuove lo stato di un allarme tornato a riposo"""
+        with self._lock:
+            self._alert_states[encode_key(key)] = None
+            self._queued()
+
+    def load_alert_states(self):
+        """{chiave: (firing, last_sent, suppressed, summary)}"""
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT key, firing, last_sent, suppressed, summary FROM alert_state").fetchall()
+        states = {key: (bool(firing), last_sent, suppressed, summary)
+                  for key, firing, last_sent, suppressed, summary in rows}
+        with self._lock:
+            states.update(self._alert_states)
+        return {decode_key(key): value for key, value in states.items() if value is not None}
+
+    # --- Aggregati delle metriche ---
+
+    def put_rollups(self, resolution, rows):
+        """Salva intervalli aggregati: righe (serie, inizio, somma, conteggio, minimo, massimo)"""
+        with self._lock:
+            for series, start, total, count, low, high in rows:
+                self._rollups[(series, resolution, start)] = (total, count, low, high)
+            self._queued()
+
+    def load_rollups(self, resolution, since):
+        """Intervalli aggregati con inizio >= since, nello stesso formato di put_rollups"""
+        self.flush()
+        with self._db_lock:
+            return self._db.execute(
+                "SELECT series, start, sum, count, min, max FROM rollups "
+                "WHERE resolution = ? AND start >= ? ORDER BY start", (resolution, since)).fetchall()
+
+    # --- Storico degli accessi SSH ---
+
+    def add_login(self, timestamp, ip, username, host, method=None, excluded=False):
+        """Aggiunge un accesso SSH allo storico"""
+        with self._lock:
+            self._logins.append((timestamp, ip, username, host, method, int(excluded)))
+            self._queued()
+
+    @staticmethod
+    def _login_filters(since=None, until=None, ip=None, username=None, host=None, external_only=False):
+        clauses, params = [], []
+        for column, operator, value in (("ts", ">=", since), ("ts", "<", until), ("ip", "=", ip),
+                                        ("username", "=", username), ("host", "=", host)):
+            if value is not None:
+                clauses.append(f"{column} {operator} ?")
+                params.append(value)
+        if external_only:
+            clauses.append("excluded = 0")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query_logins(self, limit=20, offset=0, **filters):
+        """
+        Accessi che soddisfano i filtri (since, until, ip, username, host, external_only), dal piu'
+        recente: lista di dizionari con le colonne di LOGIN_COLUMNS.
+        """
+        self.flush()
+        where, params = self._login_filters(**filters)
+        with self._db_lock:
+            rows = self._db.execute(
+                f"SELECT {', '.join(LOGIN_COLUMNS)} FROM ssh_logins{where} ORDER BY ts DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]).fetchall()
+        return [dict(zip(LOGIN_COLUMNS, row)) for row in rows]
+
+    def count_logins(self, **filters):
+        self.flush()
+        where, params = self._login_filters(**filters)
+        with self._db_lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM ssh_logins{where}", params).fetchone()[0]
+
+    def login_stats(self, since=None, external_only=False, limit=10):
+        """
+        Aggregati sugli accessi da `since`: IP piu' frequenti, accessi per utente e IP visti per
+        la prima volta nel periodo.
+        """
+        self.flush()
+        # I giorni completi vengono letti dai conteggi giornalieri, il primo giorno (parziale)
+        # dalla tabella degli accessi tramite l'indice su ts
+        first_day = 0 if since is None else int(since // 86400) + 1
+        raw_where, raw_params = self._login_filters(since=since, until=first_day * 86400,
+                                                    external_only=external_only)
+        daily_where = "WHERE day >= ?" + (" AND excluded = 0" if external_only else "")
+        first_where = "WHERE first_seen >= ?" if since is not None else "WHERE 1"
+        first_params = [since] if since is not None else []
+        if external_only:
+            first_where += " AND excluded = 0"
+        aggregates = {}
+        with self._db_lock:
+            for column in ("ip", "username"):
+                aggregates[column] = self._db.execute(
+                    f"SELECT {column}, SUM(n) AS total FROM ("
+                    f"SELECT {column}, COUNT(*) AS n FROM ssh_logins INDEXED BY ssh_logins_ts{raw_where} "
+                    f"GROUP BY {column} UNION ALL "
+                    f"SELECT {column}, SUM(count) AS n FROM login_daily {daily_where} GROUP BY {column}"
+                    f") GROUP BY {column} ORDER BY total DESC LIMIT ?",
+                    raw_params + [first_day, limit]).fetchall()
+            first_seen = self._db.execute(
+                f"SELECT ip, first_seen, count FROM login_ips {first_where} ORDER BY first_seen DESC LIMIT ?",
+                first_params + [limit]).fetchall()
+        return {"top_ips": aggregates["ip"], "per_user": aggregates["username"], "first_seen": first_seen}
+
+    # --- Salvataggio ---
+
+    def flush(self):
+        """Scrive in un'unica transazione tutte le modifiche in attesa"""
+        with self._lock:
+            cursors, self._cursors = self._cursors, {}
+            alert_states, self._alert_states = self._alert_states, {}
+            alerts, self._alerts = self._alerts, []
+            rollups, self._rollups = self._rollups, {}
+            logins, self._logins = self._logins, []
+        if not (cursors or alert_states or alerts or rollups or logins):
+            return
+        now = time.time()
+        start = time.monotonic()
+        with self._db_lock:
+            try:
+                self._db.execute("BEGIN")
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO cursors (name, inode, offset, generation, updated) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(name, inode, offset, generation, now)
+                     for name, (inode, offset, generation) in cursors.items()])
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO alert_state (key, firing, last_sent, suppressed, summary) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(key, int(value[0])) + tuple(value[1:]) for key, value in alert_states.items()
+                     if value is not None])
+                self._db.executemany("DELETE FROM alert_state WHERE key = ?",
+                                     [(key,) for key, value in alert_states.items() if value is None])
+                self._db.executemany("INSERT INTO alert_history (ts, key, message) VALUES (?, ?, ?)", alerts)
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO rollups (series, resolution, start, sum, count, min, max) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [key + value for key, value in rollups.items()])
+                self._db.executemany(
+                    "INSERT INTO ssh_logins (ts, ip, username, host, method, excluded) VALUES (?, ?, ?, ?, ?, ?)",
+                    logins)
+                self._db.executemany(
+                    "INSERT INTO login_ips (ip, first_seen, last_seen, count, excluded) VALUES (?, ?, ?, 1, ?) "
+                    "ON CONFLICT (ip) DO UPDATE SET first_seen = MIN(first_seen, excluded.first_seen), "
+                    "last_seen = MAX(last_seen, excluded.last_seen), count = count + 1, "
+                    # Un IP visto almeno una volta da fuori resta esterno, in qualunque ordine arrivino
+                    "excluded = MIN(login_ips.excluded, excluded.excluded)",
+                    [(ip, ts, ts, excluded) for ts, ip, _user, _host, _method, excluded in logins])
+                self._db.executemany(
+                    "INSERT INTO login_daily (day, ip, username, excluded, count) VALUES (?, ?, ?, ?, 1) "
+                    "ON CONFLICT (day, ip, username, excluded) DO UPDATE SET count = count + 1",
+                    [(int(ts // 86400), ip, user, excluded) for ts, ip, user, _host, _method, excluded in logins])
+                if now - self._last_prune > 3600:
+                    self._prune(now)
+                self._db.execute("COMMIT")
+                if self.instruments is not None:
+                    self.instruments.observe("state_store.flush", time.monotonic() - start)
+            except sqlite3.Error:
+                # Rimette in coda le modifiche, senza sovrascrivere quelle piu' recenti
+                with self._lock:
+                    self._cursors = {**cursors, **self._cursors}
+                    self._alert_states = {**alert_states, **self._alert_states}
+                    self._alerts = alerts + self._alerts
+                    self._rollups = {**rollups, **self._rollups}
+                    self._logins = logins + self._logins
+                # Se BEGIN non e' riuscito non c'e' nulla da annullare
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                raise
+
+    def _prune(self, now):
+        # Chiamato dentro la transazione di flush
+        self._last_prune = now
+        self._db.execute("DELETE FROM alert_history WHERE ts < ?", (now - self.alert_retention,))
+        # Stati non attivi e senza eventi soppressi (es. chiavi per IP non rimosse prima di un arresto)
+        self._db.execute("DELETE FROM alert_state WHERE firing = 0 AND suppressed = 0 "
+                         "AND (last_sent IS NULL OR last_sent < ?)", (now - self.alert_state_retention,))
+        self._db.execute("DELETE FROM rollups WHERE start < ?", (now - self.rollup_retention,))
+        self._db.execute("DELETE FROM ssh_logins WHERE ts < ?", (now - self.login_retention,))
+        self._db.execute("DELETE FROM login_ips WHERE last_seen < ?", (now - self.login_retention,))
+        self._db.execute("DELETE FROM login_daily WHERE day < ?", (int((now - self.login_retention) // 86400),))
+
+    def close(self):
+        self.flush()
+        with self._db_lock:
+            self._db.close()
@@ -1,28 +1,40 @@
+import functools
 import os
 import telegram
-import time
+from alert_outbox import AlertOutbox
+from instrumentation import INSTRUMENTS
+from agent import MONITOR_MODE
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import Updater, CommandHandler, CallbackQueryHandler, MessageHandler, Filters
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 CHAT_ID = os.getenv("CHAT_ID")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")  # Server Bot API alternativo (es. "http://127.0.0.1:8081/bot")
 BOT_INSTANCE = None
 UPDATER = None
 
 # Funzione per inizializzare il bot e l'updater
 def init_bot():
     global BOT_INSTANCE, UPDATER
+    if MONITOR_MODE == "agent":
+        # Gli allarmi vanno al collector, che e' l'unico a usare il bot
+        return False
     if not BOT_INSTANCE and BOT_TOKEN:
         try:
-            BOT_INSTANCE = telegram.Bot(token=BOT_TOKEN)
-            UPDATER = Updater(token=BOT_TOKEN, use_context=True)
+            BOT_INSTANCE = telegram.Bot(token=BOT_TOKEN, base_url=TELEGRAM_API_URL)
+            UPDATER = Updater(token=BOT_TOKEN, use_context=True, base_url=TELEGRAM_API_URL)
             
             # Registra gli handler per i comandi
             dp = UPDATER.dispatcher
             dp.add_handler(CommandHandler("risorse", command_risorse))
             dp.add_handler(CommandHandler("start", command_start))
             dp.add_handler(CommandHandler("help", command_help))
-            dp.add_handler(CallbackQueryHandler(button_callback))
+            dp.add_handler(CommandHandler("storia", command_storia, run_async=True))
+            dp.add_handler(CommandHandler("accessi", command_accessi, run_async=True))
+            dp.add_handler(CommandHandler("stats", command_stats, run_async=True))
+            dp.add_handler(CommandHandler("profilo", command_profilo))
+            # I dati arrivano dall'istantanea condivisa: i pulsanti possono essere gestiti in parallelo
+            dp.add_handler(CallbackQueryHandler(button_callback, run_async=True))
             
             # Avvia il polling in un thread separato
             UPDATER.start_polling(drop_pending_updates=True)
@@ -33,27 +45,63 @@ def init_bot():
             return False
     return bool(BOT_INSTANCE)
 
+# Accesso ai comandi: solo dalla chat configurata, la stessa che riceve gli allarmi
+def restricted(handler):
+    """Ignora gli aggiornamenti che non provengono dalla chat CHAT_ID"""
+    @functools.wraps(handler)
+    def wrapper(update, context):
+        chat = update.effective_chat
+        if not CHAT_ID or chat is None or str(chat.id) != CHAT_ID.strip():
+            if update.callback_query is not None:
+                update.callback_query.answer()
+            print(f"Comando ignorato dalla chat non autorizzata {chat.id if chat else '?'}")
+            return
+        return handler(update, context)
+    return wrapper
+
 # Funzione per costruire la tastiera inline per i comandi
-def get_resource_keyboard():
+def get_resource_keyboard(host=None):
+    """Tastiera di /risorse; con `host` (modalita' collector) i pulsanti si riferiscono a quell'host"""
+    suffix = f":{host}" if host else ""
     keyboard = [
         [
-            InlineKeyboardButton("CPU & RAM", callback_data="system_resources"),
-            InlineKeyboardButton("Disco", callback_data="disk_resources")
+            InlineKeyboardButton("CPU & RAM", callback_data="system_resources" + suffix),
+            InlineKeyboardButton("Disco", callback_data="disk_resources" + suffix)
+        ],
+        [
+            InlineKeyboardButton("Top 5 Processi", callback_data="top_processes_5" + suffix),
+            InlineKeyboardButton("Top 10 Processi", callback_data="top_processes_10" + suffix)
         ],
         [
-            InlineKeyboardButton("Top 5 Processi", callback_data="top_processes_5"),
-            InlineKeyboardButton("Top 10 Processi", callback_data="top_processes_10")
+            InlineKeyboardButton("Top RAM", callback_data="top_rss_10" + suffix),
+            InlineKeyboardButton("Top IO", callback_data="top_io_10" + suffix),
+            InlineKeyboardButton("Top FD", callback_data="top_fds_10" + suffix)
         ],
         [
-            InlineKeyboardButton("Rete", callback_data="network_resources"),
-            InlineKeyboardButton("Tutti", callback_data="all_resources")
+            InlineKeyboardButton("Rete", callback_data="network_resources" + suffix),
+            InlineKeyboardButton("Tutti", callback_data="all_resources" + suffix)
         ]
     ]
+    if MONITOR_MODE == "collector":
+        keyboard.append([InlineKeyboardButton("🖥 Altri host", callback_data="hosts")])
+    return InlineKeyboardMarkup(keyboard)
+
+# Tastiera per la scelta dell'host (modalita' collector)
+def get_host_keyboard(hosts):
+    keyboard = [[InlineKeyboardButton("Questo server", callback_data="host:")]]
+    for i in range(0, len(hosts), 2):
+        keyboard.append([InlineKeyboardButton(name, callback_data=f"host:{name}") for name in hosts[i:i + 2]])
     return InlineKeyboardMarkup(keyboard)
 
 # Handler per il comando /risorse
 def command_risorse(update, context):
-    """Mostra la tastiera per richiedere le risorse"""
+    """Mostra la tastiera per richiedere le risorse (prima la scelta dell'host, se ci sono agenti)"""
+    # Import qui per evitare import circolari
+    from monitor import HOSTS
+    hosts = HOSTS.names()
+    if hosts:
+        update.message.reply_text("Scegli l'host:", reply_markup=get_host_keyboard(hosts))
+        return
     update.message.reply_text(
         "Scegli quale informazione visualizzare:",
         reply_markup=get_resource_keyboard()
@@ -78,8 +126,95 @@ def command_help(update, context):
         "/start - Avvia il bot\n"
         "/help - Mostra questo messaggio di aiuto\n"
         "/risorse - Visualizza le risorse del sistema\n"
+        "/storia [minuti] - Riepilogo storico delle metriche (predefinito 60 minuti)\n"
+        "/accessi [giorni] [ip=..] [utente=..] [host=..] [esterni] [pagina=N] - Storico accessi SSH\n"
+        "/accessi stat [giorni] [esterni] - IP piu' frequenti, accessi per utente, IP nuovi\n"
+        "/stats - Latenze interne, velocita' di lettura dei log, code e risorse del monitor\n"
+        "/profilo [secondi] - Avvia il profiler a campionamento (se abilitato)\n"
     )
 
+# Handler per il comando /storia
+def command_storia(update, context):
+    """Riepilogo min/media/max/p95 delle metriche sugli ultimi N minuti"""
+    # Import qui per evitare import circolari
+    from monitor import get_history_summary
+    
+    minutes = 60
+    if context.args:
+        try:
+            minutes = max(1, min(30 * 24 * 60, int(context.args[0])))
+        except ValueError:
+            update.message.reply_text("Uso: /storia [minuti]")
+            return
+    update.message.reply_text(get_history_summary(minutes), parse_mode="Markdown")
+
+# Handler per il comando /stats
+@restricted
+def command_stats(update, context):
+    """Strumentazione interna del monitor"""
+    # Import qui per evitare import circolari
+    from monitor import get_self_stats_summary
+    
+    update.message.reply_text(get_self_stats_summary(), parse_mode="Markdown")
+
+# Handler per il comando /profilo
+@restricted
+def command_profilo(update, context):
+    """Avvia una profilazione a campionamento di durata limitata"""
+    # Import qui per evitare import circolari
+    from monitor import start_profiling
+    
+    seconds = 30
+    if context.args:
+        try:
+            seconds = int(context.args[0])
+        except ValueError:
+            update.message.reply_text("Uso: /profilo [secondi]")
+            return
+    update.message.reply_text(start_profiling(seconds))
+
+# Handler per il comando /accessi
+@restricted
+def command_accessi(update, context):
+    """Storico degli accessi SSH con filtri e paginazione, oppure statistiche ("stat")"""
+    # Import qui per evitare import circolari
+    from monitor import get_login_history, get_login_stats
+    
+    usage = ("Uso: /accessi [giorni] [ip=..] [utente=..] [host=..] [esterni] [pagina=N]\n"
+             "oppure: /accessi stat [giorni] [esterni]")
+    args = list(context.args or [])
+    stats = bool(args) and args[0].lower() == "stat"
+    if stats:
+        args.pop(0)
+    
+    options = {"days": 7, "external_only": False}
+    try:
+        for arg in args:
+            name, _, value = arg.partition("=")
+            name = name.lower()
+            if arg.isdigit():
+                options["days"] = max(1, min(3650, int(arg)))
+            elif name == "esterni" and not value:
+                options["external_only"] = True
+            elif stats or not value:
+                raise ValueError(arg)
+            elif name == "ip":
+                options["ip"] = value
+            elif name == "utente":
+                options["user"] = value
+            elif name == "host":
+                options["host"] = value
+            elif name == "pagina":
+                options["page"] = int(value)
+            else:
+                raise ValueError(arg)
+    except ValueError:
+        update.message.reply_text(usage)
+        return
+    
+    text = get_login_stats(**options) if stats else get_login_history(**options)
+    update.message.reply_text(text, parse_mode="Markdown")
+
 # Handler per i callback dei pulsanti
 def button_callback(update, context):
     """Gestisce i callback dai pulsanti inline"""
@@ -88,32 +223,61 @@ def button_callback(update, context):
     
     # Import qui per evitare import circolari
     from monitor import get_system_resources, get_disk_info, get_network_info, get_top_processes
+    from monitor import HOSTS, get_remote_info
+    
+    # Formato: <azione>[:<host>]; senza host i dati sono quelli di questo server
+    data, _, host = query.data.partition(":")
+    
+    if data == "hosts":
+        query.edit_message_text(text="Scegli l'host:", reply_markup=get_host_keyboard(HOSTS.names()))
+        return
     
-    data = query.data
+    if data == "host" or data == "back_to_menu":
+        title = f"Host {host}: scegli" if host else "Scegli"
+        query.edit_message_text(
+            text=f"{title} quale informazione visualizzare:",
+            reply_markup=get_resource_keyboard(host or None)
+        )
+        return
+    
+    if host:
+        # Stessi testi, dall'ultimo stato inviato dall'agente
+        sources = {
+            "resources": lambda: get_remote_info(host, "resources"),
+            "disks": lambda: get_remote_info(host, "disks"),
+            "network": lambda: get_remote_info(host, "network"),
+            "processes": lambda limit=5, sort_by="cpu": get_remote_info(host, "processes", limit, sort_by),
+        }
+    else:
+        sources = {"resources": get_system_resources, "disks": get_disk_info, "network": get_network_info,
+                   "processes": get_top_processes}
     
     if data == "system_resources":
-        resources = get_system_resources()
+        resources = sources["resources"]()
         query.edit_message_text(text=resources, parse_mode="Markdown")
     
     elif data == "disk_resources":
-        disk_info = get_disk_info()
+        disk_info = sources["disks"]()
         query.edit_message_text(text=disk_info, parse_mode="Markdown")
     
     elif data == "network_resources":
-        net_info = get_network_info()
+        net_info = sources["network"]()
         query.edit_message_text(text=net_info, parse_mode="Markdown")
     
-    elif data.startswith("top_processes_"):
-        num = int(data.split("_")[-1])
-        processes = get_top_processes(num)
+    elif data.startswith("top_"):
+        # Formato: top_processes_<n> (CPU) oppure top_<rss|io|fds>_<n>
+        _, sort_by, num = data.split("_")
+        if sort_by == "processes":
+            sort_by = "cpu"
+        processes = sources["processes"](int(num), sort_by)
         query.edit_message_text(text=processes, parse_mode="Markdown")
     
     elif data == "all_resources":
         # Raccoglie tutte le informazioni
-        resources = get_system_resources()
-        disk_info = get_disk_info()
-        net_info = get_network_info()
-        processes = get_top_processes(5)
+        resources = sources["resources"]()
+        disk_info = sources["disks"]()
+        net_info = sources["network"]()
+        processes = sources["processes"](5)
         
         # Combina tutte le informazioni in un unico messaggio
         all_info = f"{resources}\n\n{disk_info}\n\n{net_info}\n\n{processes}"
@@ -122,47 +286,44 @@ def button_callback(update, context):
     # Aggiungi il pulsante per tornare al menu principale
     query.edit_message_reply_markup(
         reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton("⬅️ Torna al menu", callback_data="back_to_menu")]
+            [InlineKeyboardButton("⬅️ Torna al menu", callback_data="back_to_menu" + (f":{host}" if host else ""))]
         ])
     )
-    
-    if data == "back_to_menu":
-        query.edit_message_text(
-            text="Scegli quale informazione visualizzare:",
-            reply_markup=get_resource_keyboard()
-        )
+
+def _deliver_message(chat_id, text, parse_mode):
+    """Invio effettivo, eseguito dal thread della coda di uscita"""
+    result = BOT_INSTANCE.send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+    print(f"Messaggio inviato con successo: {result.message_id}")
+
+# Coda di uscita: send_alert ritorna subito, l'invio avviene in un thread dedicato
+OUTBOX = AlertOutbox(_deliver_message, instruments=INSTRUMENTS)
+
+def get_outbox_stats():
+    """Profondita' della coda e contatori di invio/scarto"""
+    return OUTBOX.stats()
 
 def send_alert(message):
-    max_retries = 3
-    retry_delay = 2
+    """Accoda un messaggio per la chat configurata senza attendere l'invio"""
+    if MONITOR_MODE == "agent":
+        # Import qui per evitare import circolari
+        from monitor import AGENT
+        if AGENT is not None:
+            AGENT.add_event(message)
+        return
+    
+    # Verifica che il token e il chat ID siano impostati
+    if not BOT_TOKEN or BOT_TOKEN == "token":
+        print("ERRORE: BOT_TOKEN non configurato correttamente")
+        return
+        
+    if not CHAT_ID or CHAT_ID == "id":
+        print("ERRORE: CHAT_ID non configurato correttamente")
+        return
     
     # Inizializza il bot se non è già stato fatto
     if not init_bot():
         print("ERRORE: Impossibile inizializzare il bot Telegram")
         return
     
-    for attempt in range(max_retries):
-        try:
-            print(f"Invio messaggio Telegram: {message}")
-            
-            # Verifica che il token e il chat ID siano impostati
-            if not BOT_TOKEN or BOT_TOKEN == "token":
-                print("ERRORE: BOT_TOKEN non configurato correttamente")
-                return
-                
-            if not CHAT_ID or CHAT_ID == "id":
-                print("ERRORE: CHAT_ID non configurato correttamente")
-                return
-            
-            result = BOT_INSTANCE.send_message(chat_id=CHAT_ID, text=message, parse_mode="Markdown")
-            print(f"Messaggio inviato con successo: {result}")
-            return
-        except Exception as e:
-            if attempt < max_retries - 1:
-                print(f"Errore invio messaggio Telegram (tentativo {attempt+1}/{max_retries}): {e}")
-                time.sleep(retry_delay)
-            else:
-                print(f"Errore invio messaggio Telegram (tutti i tentativi falliti): {e}")
-
-# Inizializza il bot quando il modulo viene importato
-init_bot()
+    print(f"Messaggio Telegram accodato: {message}")
+    OUTBOX.enqueue(CHAT_ID, message, parse_mode="Markdown")
@@ -0,0 +1,128 @@
+import gzip
+import json
+
+import pytest
+
+from flask import Flask
+
+from agent import AgentPusher, apply_delta, delta_encode, flatten, unflatten
+from collector import HostRegistry, create_blueprint
+
+TOKEN = "segreto"
+
+
+class FlaskSession:
+    """Adatta il client di test Flask all'interfaccia di requests.Session usata da AgentPusher"""
+
+    def __init__(self, client):
+        self.client = client
+        self.payloads = []
+
+    def post(self, url, data, timeout, headers):
+        self.payloads.append(json.loads(gzip.decompress(data)))
+        return self.client.post(url, data=data, headers=headers)
+
+
+def collector(registry=None):
+    registry = registry or HostRegistry()
+    received = []
+    app = Flask(__name__)
+    app.register_blueprint(create_blueprint(registry, TOKEN, lambda host, events: received.extend(events)))
+    return registry, received, FlaskSession(app.test_client())
+
+
+def agent(session, state, token=TOKEN):
+    return AgentPusher("http://collector", token, "web1", lambda: state, session=session)
+
+
+def test_flatten_and_delta_round_trip():
+    previous = flatten({"cpu_percent": 5, "network": {"interfaces": {"eth0.100": {"rx": 1}, "eth1": {"rx": 2}}}})
+    current = flatten({"cpu_percent": 7, "network": {"interfaces": {"eth0.100": {"rx": 1}}}, "load_avg": [1, 2, 3]})
+    changed, removed = delta_encode(previous, current)
+    assert changed == {"cpu_percent": 7, "load_avg": [1, 2, 3]}
+    assert removed == ["network/interfaces/eth1/rx"]
+    assert unflatten(apply_delta(dict(previous), changed, removed)) == unflatten(current)
+
+
+def test_first_push_is_full_then_deltas():
+    registry, _, session = collector()
+    state = {"cpu_percent": 5, "memory": {"percent": 40, "used": 4}}
+    pusher = agent(session, state)
+    assert pusher.push_once() == 200
+    full_values = flatten(state)
+    state["cpu_percent"] = 9
+    assert pusher.push_once() == 200
+
+    first, second = session.payloads
+    assert first["full"] and first["values"] == full_values
+    assert not second["full"]
+    assert second["base"] == first["seq"]
+    assert second["values"] == {"cpu_percent": 9}
+    assert registry.get("web1")[0] == state
+    assert pusher.stats()["full"] == 1
+
+
+def test_collector_restart_triggers_resync_without_losing_events():
+    _, _, session = collector()
+    state = {"cpu_percent": 5}
+    pusher = agent(session, state)
+    assert pusher.push_once() == 200
+
+    # Collector riavviato: non conosce la base della prossima differenza
+    registry, received, restarted = collector()
+    pusher.session = restarted
+    pusher.add_event("CPU alta")
+    state["cpu_percent"] = 95
+    assert pusher.push_once() == 409
+    assert [event["message"] for event in received] == ["CPU alta"]
+    assert registry.get("web1") is None
+
+    assert pusher.push_once() == 200
+    assert restarted.payloads[-1]["full"]
+    assert restarted.payloads[-1]["events"] == []  # Eventi gia' confermati con il 409
+    assert registry.get("web1")[0] == state
+    assert pusher.stats()["resync"] == 1
+
+
+def test_delta_from_another_agent_instance_is_rejected():
+    registry, _, session = collector()
+    old = agent(session, {"cpu_percent": 1})
+    assert old.push_once() == 200
+    new = agent(session, {"cpu_percent": 2})
+    assert new.push_once() == 200  # Un nuovo agente parte sempre dallo stato completo
+    assert old.push_once() == 409  # La base del vecchio agente non vale piu'
+
+
+def test_wrong_token_is_rejected_and_events_are_kept():
+    registry, received, session = collector()
+    pusher = agent(session, {"cpu_percent": 5}, token="sbagliato")
+    pusher.add_event("disco pieno")
+    assert pusher.push_once() == 401
+    assert registry.names() == []
+    assert received == []
+    stats = pusher.stats()
+    assert stats["errors"] == 1
+    assert stats["pending_events"] == 1
+    # L'invio successivo resta completo: nessuna base confermata
+    pusher.token = TOKEN
+    assert pusher.push_once() == 200
+    assert session.payloads[-1]["full"]
+    assert [event["message"] for event in received] == ["disco pieno"]
+
+
+@pytest.mark.parametrize("payload", [
+    {"full": True, "interval": "dieci", "values": {}},
+    {"full": True, "interval": float("nan"), "values": {}},
+    {"full": True, "values": [["cpu_percent", 5]]},
+    {"full": False, "base": 1, "values": "cpu_percent"},
+    {"full": False, "base": 1, "values": {}, "removed": [["cpu_percent"]]},
+    {"full": True, "values": {}, "events": "disco pieno"},
+])
+def test_malformed_payload_is_rejected_without_touching_the_host(payload):
+    registry, received, session = collector()
+    assert agent(session, {"cpu_percent": 5}).push_once() == 200
+    response = session.client.post("/agent/push", json=dict(payload, host="web1", agent_id="x", seq=2),
+                                   headers={"X-Agent-Token": TOKEN})
+    assert response.status_code == 400
+    assert registry.get("web1")[0] == {"cpu_percent": 5}
+    assert registry.stats()["web1"]["interval"] == 10.0
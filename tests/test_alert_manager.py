@@ -0,0 +1,50 @@
+from alert_manager import AlertManager, split_message
+
+
+def manager(sent, now, **kwargs):
+    kwargs.setdefault("digest_window", 0)
+    return AlertManager(sent.append, cooldown=60, hysteresis=5, clock=lambda: now[0], **kwargs)
+
+
+def test_threshold_fires_once_per_cooldown_and_recovers_with_hysteresis():
+    sent, now = [], [0.0]
+    alerts = manager(sent, now)
+    alerts.check_threshold("cpu", 95, 90, "CPU alta", "CPU normale")
+    alerts.check_threshold("cpu", 97, 90, "CPU alta", "CPU normale")
+    now[0] = 30
+    alerts.check_threshold("cpu", 88, 90, "CPU alta", "CPU normale")  # Dentro l'isteresi: ancora attivo
+    alerts.check_threshold("cpu", 96, 90, "CPU alta", "CPU normale")
+    assert sent == ["CPU alta"]
+    now[0] = 61
+    alerts.check_threshold("cpu", 96, 90, "CPU alta", "CPU normale")  # Cooldown scaduto: ripetuto
+    alerts.check_threshold("cpu", 80, 90, "CPU alta", "CPU normale")
+    assert sent == ["CPU alta", "CPU alta", "CPU normale"]
+
+
+def test_events_in_cooldown_are_summarised():
+    sent, now = [], [0.0]
+    alerts = manager(sent, now)
+    assert alerts.event(("ssh", "203.0.113.9"), "accesso")
+    assert not alerts.event(("ssh", "203.0.113.9"), "accesso", "{count} altri accessi")
+    assert not alerts.event(("ssh", "203.0.113.9"), "accesso", "{count} altri accessi")
+    alerts.tick()
+    assert sent == ["accesso"]
+    now[0] = 60
+    alerts.tick()
+    assert sent == ["accesso", "2 altri accessi"]
+
+
+def test_messages_in_the_same_window_form_one_digest():
+    sent, now = [], [0.0]
+    alerts = manager(sent, now, digest_window=3600)
+    alerts.check_threshold("cpu", 95, 90, "CPU alta", "CPU normale")
+    alerts.check_threshold("ram", 95, 90, "RAM alta", "RAM normale")
+    assert sent == []
+    alerts.flush()
+    assert sent == ["*Riepilogo allarmi* (2)\n\nCPU alta\n\nRAM alta"]
+
+
+def test_split_message_respects_the_limit():
+    chunks = split_message(["a" * 6, "b" * 6, "c\n" * 8], limit=10)
+    assert chunks == ["a" * 6, "b" * 6, "c\nc\nc\nc\nc", "c\nc\nc\n"]
+    assert all(len(chunk) <= 10 for chunk in chunks)
@@ -0,0 +1,80 @@
+import threading
+import time
+
+from telegram.error import BadRequest, NetworkError, RetryAfter
+
+from alert_outbox import AlertOutbox
+
+
+class FakeBot:
+    """send_func che registra gli invii e solleva gli errori programmati, uno per chiamata"""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, chat_id, text, parse_mode):
+        with self.lock:
+            self.calls.append((time.monotonic(), chat_id, text))
+            error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+
+
+def wait_for(outbox, **expected):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        stats = outbox.stats()
+        if all(stats[key] == value for key, value in expected.items()):
+            return stats
+        time.sleep(0.01)
+    raise AssertionError(f"Statistiche attese {expected}, ottenute {outbox.stats()}")
+
+
+def test_retry_after_pauses_all_chats_and_resends():
+    bot = FakeBot([RetryAfter(1)])
+    outbox = AlertOutbox(bot, global_rate=100, chat_rate=100, chat_burst=10)
+    outbox.enqueue(1, "primo")
+    outbox.enqueue(2, "secondo")
+    stats = wait_for(outbox, sent=2, depth=0)
+    assert stats["retries"] == 1
+    assert stats["failed"] == 0
+    first_attempt = bot.calls[0][0]
+    # Dopo il 429 nessun invio, nemmeno verso altre chat, prima di retry_after
+    assert [text for _, _, text in bot.calls] == ["primo", "secondo", "primo"]
+    assert all(at - first_attempt >= 0.95 for at, _, _ in bot.calls[1:])
+
+
+def test_temporary_errors_are_retried_with_backoff():
+    bot = FakeBot([NetworkError("timeout"), NetworkError("timeout")])
+    outbox = AlertOutbox(bot, base_delay=0.05, max_delay=0.1)
+    outbox.enqueue(1, "avviso")
+    stats = wait_for(outbox, sent=1, depth=0)
+    assert stats["retries"] == 2
+    assert len(bot.calls) == 3
+
+
+def test_permanent_errors_and_exhausted_retries_fail():
+    bot = FakeBot([BadRequest("chat not found")] + [NetworkError("down")] * 2)
+    outbox = AlertOutbox(bot, max_retries=2, base_delay=0.01, max_delay=0.01)
+    outbox.enqueue(1, "non valido")
+    outbox.enqueue(2, "rete assente")
+    stats = wait_for(outbox, failed=2, depth=0)
+    assert stats["sent"] == 0
+    assert stats["retries"] == 1
+
+
+def test_full_queue_drops_oldest_message():
+    release = threading.Event()
+    sent = []
+    outbox = AlertOutbox(lambda chat_id, text, parse_mode: (release.wait(5), sent.append(text)), maxsize=2)
+    outbox.enqueue(1, "in invio")
+    wait_for(outbox, depth=0)  # Il primo messaggio e' stato prelevato dal thread
+    assert outbox.enqueue(1, "a")
+    assert outbox.enqueue(1, "b")
+    assert not outbox.enqueue(1, "c")
+    release.set()
+    wait_for(outbox, sent=3, depth=0)
+    assert sent == ["in invio", "b", "c"]
+    assert outbox.stats()["dropped"] == 1
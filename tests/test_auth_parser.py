@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, timezone
+
+from auth_parser import AuthLogParser, SSHFailure, SSHLogin
+
+
+def fixed(moment):
+    return lambda: moment
+
+
+def test_year_rollover_assigns_december_lines_to_previous_year():
+    parser = AuthLogParser(now=fixed(datetime(2025, 1, 1, 0, 5)))
+    events = parser.parse_batch([
+        b"Dec 31 23:59:58 host sshd[1]: Accepted password for root from 192.0.2.1 port 22 ssh2",
+        b"Jan  1 00:00:03 host sshd[2]: Accepted publickey for root from 192.0.2.1 port 22 ssh2",
+    ])
+    assert [e.timestamp for e in events] == [datetime(2024, 12, 31, 23, 59, 58), datetime(2025, 1, 1, 0, 0, 3)]
+    assert events[1].raw_timestamp == "Jan  1 00:00:03"
+
+
+def test_date_cache_follows_the_current_day():
+    clock = [datetime(2024, 5, 19, 12, 0)]
+    parser = AuthLogParser(now=lambda: clock[0])
+    line = b"Dec 31 08:00:00 host sshd[2]: Accepted password for root from 192.0.2.1 port 22 ssh2"
+    assert parser.parse_batch([line])[0].timestamp == datetime(2023, 12, 31, 8, 0)
+    clock[0] = datetime(2024, 12, 31, 9, 0)
+    assert parser.parse_batch([line])[0].timestamp == datetime(2024, 12, 31, 8, 0)
+
+
+def test_february_29_resolves_to_last_leap_year():
+    parser = AuthLogParser(now=fixed(datetime(2025, 3, 1)))
+    events = parser.parse_batch([b"Feb 29 10:00:00 host sshd[1]: Invalid user x from 192.0.2.9 port 1"])
+    assert events[0].timestamp == datetime(2024, 2, 29, 10, 0)
+
+
+def test_rfc3339_timestamps_are_converted_to_local_time():
+    parser = AuthLogParser()
+    events = parser.parse_batch([
+        b"2024-05-19T09:08:01.123456+02:00 host sshd[1]: Accepted publickey for alice from 192.0.2.1 port 22 ssh2",
+        b"2024-05-19T07:08:01Z host sshd[2]: Failed password for invalid user bob from 192.0.2.2 port 4242 ssh2",
+    ])
+    local = datetime(2024, 5, 19, 7, 8, 1, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    assert isinstance(events[0], SSHLogin)
+    assert events[0].timestamp == local + timedelta(microseconds=123456)
+    assert events[0].raw_timestamp == "2024-05-19T09:08:01.123456+02:00"
+    assert events[1] == SSHFailure(local, "host", "bob", "192.0.2.2", "failed", "2024-05-19T07:08:01Z", 4242)
+
+
+def test_noise_is_skipped_and_failures_are_optional():
+    parser = AuthLogParser(now=fixed(datetime(2024, 5, 20)))
+    lines = [
+        b"May 19 09:00:00 host CRON[9]: pam_unix(cron:session): session opened for user root",
+        b"May 19 09:00:01 host sshd[3]: Connection closed by authenticating user root 192.0.2.3 port 5 [preauth]",
+    ]
+    assert parser.parse_batch(lines, failures=False) == []
+    assert [e.kind for e in parser.parse_batch(lines)] == ["preauth_closed"]
+    assert parser.counters["lines"] == 4
+    assert parser.counters["sshd"] == 2
@@ -0,0 +1,107 @@
+from auth_parser import AuthLogParser, SSHFailure
+from bruteforce import BruteForceDetector, SlidingCounter, subnet_of
+
+T0 = 1_000_000_000.0
+
+# Righe scritte da sshd per un solo tentativo con un utente inesistente
+INVALID_USER_ATTEMPT = [
+    b"May 19 09:08:01 host sshd[1234]: Invalid user admin from 203.0.113.5 port 4242",
+    b"May 19 09:08:03 host sshd[1234]: Failed password for invalid user admin from 203.0.113.5 port 4242 ssh2",
+    b"May 19 09:08:03 host sshd[1234]: Connection closed by invalid user admin 203.0.113.5 port 4242 [preauth]",
+]
+
+
+def feed(detector, lines, now=None):
+    crossed = []
+    for event in AuthLogParser().parse_batch(lines):
+        assert isinstance(event, SSHFailure)
+        timestamp = event.timestamp.timestamp()
+        crossed += detector.observe(event.source_ip, event.username, timestamp, event.kind, event.port,
+                                    now=timestamp if now is None else now)
+    return crossed
+
+
+def attempts(detector, ip):
+    return dict(detector.counters["ip"].top()).get(ip, 0)
+
+
+def test_invalid_user_lines_count_once():
+    detector = BruteForceDetector()
+    feed(detector, INVALID_USER_ATTEMPT)
+    assert attempts(detector, "203.0.113.5") == 1
+
+
+def test_each_failed_password_on_a_connection_counts():
+    detector = BruteForceDetector()
+    feed(detector, INVALID_USER_ATTEMPT[:2] + [
+        b"May 19 09:08:05 host sshd[1234]: Failed password for invalid user admin from 203.0.113.5 port 4242 ssh2",
+        b"May 19 09:08:07 host sshd[1234]: Failed password for invalid user admin from 203.0.113.5 port 4242 ssh2",
+    ])
+    assert attempts(detector, "203.0.113.5") == 3
+
+
+def test_preauth_close_without_other_lines_counts():
+    detector = BruteForceDetector()
+    feed(detector, [
+        b"May 19 09:08:01 host sshd[1]: Connection closed by authenticating user root 203.0.113.5 port 1 [preauth]",
+        b"May 19 09:08:01 host sshd[2]: Failed password for root from 203.0.113.5 port 2 ssh2",
+        b"May 19 09:08:02 host sshd[2]: Connection closed by authenticating user root 203.0.113.5 port 2 [preauth]",
+    ])
+    assert attempts(detector, "203.0.113.5") == 2
+
+
+def test_threshold_counts_attempts_not_lines():
+    detector = BruteForceDetector(ip_threshold=4)
+    lines = [line.replace(b"4242", str(port).encode()) for port in range(3) for line in INVALID_USER_ATTEMPT]
+    assert feed(detector, lines) == []
+    crossed = feed(detector, [line.replace(b"4242", b"9") for line in INVALID_USER_ATTEMPT])
+    assert ("ip", "203.0.113.5", 4) in crossed
+
+
+def test_backlog_older_than_window_is_ignored():
+    detector = BruteForceDetector(window=600, ip_threshold=2)
+    lines = [line.replace(b"4242", str(port).encode()) for port in range(5) for line in INVALID_USER_ATTEMPT]
+    first = AuthLogParser().parse_batch(lines[:1])[0].timestamp.timestamp()
+    assert feed(detector, lines, now=first + 3600) == []
+    assert len(detector.counters["ip"]) == 0
+    # Un attacco recente viene segnalato normalmente
+    assert feed(detector, lines)[0][:2] == ("ip", "203.0.113.5")
+
+
+def test_sliding_counter_forgets_expired_buckets():
+    counter = SlidingCounter(window=60, buckets=6)
+    for second in range(0, 30, 5):
+        counter.add("ip", T0 + second)
+    assert counter.add("ip", T0 + 30).total == 7
+    assert counter.add("ip", T0 + 75).total == 4  # Restano gli intervalli da 10 s dal secondo 20
+    assert counter.add("ip", T0 + 500).total == 1
+
+
+def test_sliding_counter_evicts_least_recently_used():
+    counter = SlidingCounter(capacity=2)
+    counter.add("a", T0)
+    counter.add("b", T0)
+    counter.add("a", T0)
+    counter.add("c", T0)
+    assert [key for key, _total in counter.top()] == ["a", "c"]
+    assert counter.evictions == 1
+
+
+def test_alert_once_per_crossing_and_rearm_below_half():
+    detector = BruteForceDetector(window=60, ip_threshold=3, subnet_threshold=0, user_threshold=0)
+    crossed = [detector.observe("203.0.113.5", "root", T0 + i) for i in range(5)]
+    assert crossed == [[], [], [("ip", "203.0.113.5", 3)], [], []]
+    # Finestra scaduta: il contatore riparte e l'allarme puo' ripetersi
+    crossed = [detector.observe("203.0.113.5", "root", T0 + 200 + i) for i in range(3)]
+    assert crossed[-1] == [("ip", "203.0.113.5", 3)]
+
+
+def test_botnet_is_caught_by_subnet_and_user_counters():
+    detector = BruteForceDetector(ip_threshold=10, subnet_threshold=5, user_threshold=8)
+    events = []
+    for host in range(10):
+        events += detector.observe(f"198.51.100.{host}", "admin", T0 + host)
+    assert ("subnet", "198.51.100.0/24", 5) in events
+    assert ("user", "admin", 8) in events
+    assert not any(scope == "ip" for scope, _key, _count in events)
+    assert subnet_of("2001:db8:1:2:3::4") == "2001:db8:1:2::/64"
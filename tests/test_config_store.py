@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from config_store import ConfigStore, validate_config
+
+
+def test_missing_file_uses_defaults(tmp_path):
+    store = ConfigStore(str(tmp_path / "config.json"))
+    config = store.get()
+    assert config["cpu_threshold"] == 80
+    assert config["net_threshold"] == 0  # Allarme sul traffico totale disattivato
+    assert config.version == 1
+    assert store.refresh() is False
+
+
+def test_save_is_visible_at_once_and_reload_only_on_change(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"cpu_threshold": 70}))
+    store = ConfigStore(str(path))
+    assert store.get()["cpu_threshold"] == 70
+    assert store.refresh() is False  # File invariato: nessuna nuova lettura
+
+    snapshot = store.save(dict(store.get().to_dict(), cpu_threshold="95"))
+    assert snapshot["cpu_threshold"] == 95
+    assert store.get() is snapshot
+    assert json.loads(path.read_text())["cpu_threshold"] == 95
+    assert [p.name for p in tmp_path.iterdir()] == ["config.json"]  # Nessun file temporaneo rimasto
+
+    path.write_text(json.dumps({"cpu_threshold": 60, "ram_threshold": 61}))
+    assert store.refresh() is True
+    assert store.get()["ram_threshold"] == 61
+    assert store.version == snapshot.version + 1
+
+
+def test_invalid_file_keeps_previous_snapshot(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"cpu_threshold": 70}))
+    store = ConfigStore(str(path))
+    previous = store.get()
+    path.write_text('{"cpu_threshold": ')  # Scrittura a meta'
+    assert store.refresh() is False
+    assert store.get() is previous
+
+
+def test_validation_normalizes_values():
+    store_config = validate_config({"excluded_ips": "10.0.0.0/8, 192.0.2.1"})
+    assert store_config["excluded_ips"] == ["10.0.0.0/8", "192.0.2.1"]
+    with pytest.raises(ValueError):
+        validate_config({"cpu_threshold": -1})
+
+
+def test_snapshot_rejects_changes(tmp_path):
+    snapshot = ConfigStore(str(tmp_path / "config.json")).get()
+    with pytest.raises(TypeError):
+        snapshot["cpu_threshold"] = 1
+    assert isinstance(snapshot["excluded_ips"], tuple)
@@ -0,0 +1,108 @@
+import os
+import threading
+
+import disks
+from disks import DiskCollector, Mount, MountTable, format_eta
+
+MOUNTINFO = """\
+22 1 8:1 / / rw,relatime shared:1 - ext4 /dev/sda1 rw
+23 22 0:20 / /run rw,nosuid - tmpfs tmpfs rw
+24 22 7:0 / /snap/core rw - squashfs /dev/loop0 ro
+25 22 8:2 / /mnt/dati\\040personali rw - ext4 /dev/sda2 rw
+26 22 8:2 /sub /srv/bind rw - ext4 /dev/sda2 rw
+27 22 0:50 / /mnt/nas rw - nfs4 nas:/export rw
+"""
+
+
+def mount_table(tmp_path, text=MOUNTINFO):
+    path = tmp_path / "mountinfo"
+    path.write_text(text)
+    table = MountTable(str(path))
+    table._physical = frozenset(("ext4", "xfs", "squashfs"))
+    return table
+
+
+def test_mount_table_keeps_physical_and_remote_mounts(tmp_path):
+    mounts = mount_table(tmp_path).partitions()
+    assert [(m.mountpoint, m.remote) for m in mounts] == [
+        ("/", False), ("/mnt/dati personali", False), ("/mnt/nas", True)]
+
+
+def test_root_is_kept_whatever_its_fstype(tmp_path):
+    text = ("30 1 0:40 / / rw - overlay overlay rw,lowerdir=/a\n"
+            "31 30 0:40 / /etc/hosts rw - overlay overlay rw\n")
+    mounts = mount_table(tmp_path, text).partitions()
+    assert [(m.mountpoint, m.fstype) for m in mounts] == [("/", "overlay")]
+
+
+class FakeTable:
+    def __init__(self, mounts):
+        self.mounts = mounts
+
+    def partitions(self):
+        return self.mounts
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def fake_mount(path):
+    return Mount("/dev/fake", str(path), "ext4", "rw", "8:9", False)
+
+
+def test_fill_rate_and_eta_from_successive_samples(tmp_path, monkeypatch):
+    clock = Clock()
+    used = {"blocks": 100}
+
+    def statvfs(path):
+        free = 1000 - used["blocks"]
+        return os.statvfs_result((4096, 4096, 1000, free, free, 100, 50, 50, 0, 255))
+
+    monkeypatch.setattr(disks.os, "statvfs", statvfs)
+    collector = DiskCollector(FakeTable([fake_mount(tmp_path)]), clock=clock)
+    (mount, usage), = collector.collect()[0]
+    assert (usage.total, usage.used, usage.percent, usage.inodes_percent) == (4096000, 409600, 10.0, 50.0)
+    assert usage.fill_rate is None
+
+    clock.now += 60
+    used["blocks"] = 160  # 60 blocchi (245760 bytes) in 60 s
+    (mount, usage), = collector.collect()[0]
+    assert usage.fill_rate == 4096.0
+    assert usage.eta == 840 * 4096 / 4096.0
+
+
+def test_blocked_mount_is_quarantined_without_blocking(tmp_path, monkeypatch):
+    release = threading.Event()
+    real_statvfs = os.statvfs
+    stuck = str(tmp_path / "nas")
+
+    def statvfs(path):
+        if path == stuck:
+            release.wait(5)
+        return real_statvfs(str(tmp_path))
+
+    monkeypatch.setattr(disks.os, "statvfs", statvfs)
+    clock = Clock()
+    mounts = [fake_mount(tmp_path), Mount("nas:/x", stuck, "nfs4", "rw", "0:50", True)]
+    collector = DiskCollector(FakeTable(mounts), timeout=0.2, quarantine=60, clock=clock)
+    try:
+        results, quarantined = collector.collect()
+        assert [m.mountpoint for m, _ in results] == [str(tmp_path)]
+        assert [m.mountpoint for m in quarantined] == [stuck]
+        # Finche' la statvfs resta bloccata non ne parte un'altra
+        clock.now += 120
+        results, quarantined = collector.collect()
+        assert [m.mountpoint for m in quarantined] == [stuck]
+    finally:
+        release.set()
+
+
+def test_format_eta():
+    assert format_eta(30) == "1m"
+    assert format_eta(2 * 3600 + 600) == "2h 10m"
+    assert format_eta(3 * 86400 + 4 * 3600) == "3g 4h"
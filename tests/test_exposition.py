@@ -0,0 +1,59 @@
+import gzip
+import json
+import re
+
+from exposition import MetricsExporter, render_metrics, representation_etag
+from net_rates import NicRate
+from procfs import NetIO, SwapMemory, VirtualMemory
+from sampler import Snapshot
+
+
+def snapshot(timestamp=1000.0):
+    nic = NetIO(10, 20, 1, 2, 0, 0, 0, 0)
+    rate = NicRate(1.0, 2.0, 0.1, 0.2)
+    return Snapshot(timestamp=timestamp, monotonic=1.0, cpu_percent=12.5,
+                    memory=VirtualMemory(100, 50, 50.0, 50, 50, 0, 0), swap=SwapMemory(10, 0, 10, 0.0),
+                    load_avg=(0.1, 0.2, 0.3), disk=None, partitions=[], quarantined=[], net=nic,
+                    net_per_nic={"eth0": nic}, net_rates={"eth0": rate}, net_rate_total=rate, uptime=60.0)
+
+
+def declared_and_sampled(text):
+    declared = set(re.findall(r"^# TYPE (\S+) ", text, re.M))
+    sampled = set(re.findall(r"^([a-z_]+)[{ ]", text, re.M))
+    return declared, sampled
+
+
+def test_prometheus_text_uses_sample_names_and_no_eof():
+    text = render_metrics(snapshot())
+    declared, sampled = declared_and_sampled(text)
+    assert "# TYPE server_monitor_network_receive_bytes_total counter" in text
+    assert sampled <= declared
+    assert "# EOF" not in text
+
+
+def test_openmetrics_uses_family_names_and_eof():
+    text = render_metrics(snapshot(), openmetrics=True)
+    assert "# TYPE server_monitor_network_receive_bytes counter" in text
+    assert 'server_monitor_network_receive_bytes_total{interface="eth0"} 20' in text
+    assert text.endswith("# EOF\n")
+
+
+def test_exporter_prerenders_plain_and_gzip_once():
+    exporter = MetricsExporter()
+    exporter.update(snapshot())
+    rendered = exporter.rendered
+    assert gzip.decompress(rendered.metrics_gzip) == rendered.metrics
+    assert gzip.decompress(rendered.openmetrics_gzip) == rendered.openmetrics
+    assert json.loads(gzip.decompress(rendered.json_gzip))["cpu_percent"] == 12.5
+    # Un campione piu' vecchio arrivato in ritardo viene ignorato
+    exporter.update(snapshot(timestamp=900.0))
+    assert exporter.rendered is rendered
+
+
+def test_each_representation_has_its_own_etag():
+    exporter = MetricsExporter()
+    exporter.update(snapshot())
+    tags = {representation_etag(exporter.rendered, field, compressed)
+            for field in ("metrics", "openmetrics", "json") for compressed in (False, True)}
+    assert len(tags) == 6
+    assert representation_etag(exporter.rendered, "openmetrics", True) == "1000.000000-openmetrics-gz"
@@ -0,0 +1,50 @@
+import ipaddress
+
+from geoip import GeoIPDatabase, IpInfo, RangeIndex, format_ip_info
+
+
+def test_range_index_finds_ranges_and_gaps(tmp_path):
+    csv_path = tmp_path / "country.csv"
+    csv_path.write_text("# inizio,fine,paese\n"
+                        "1.0.0.0,1.0.0.255,IT,,\n"
+                        "8.8.8.0/24,US,AS15169,Google\n"
+                        "2001:db8::,2001:db8::ffff,DE,,\n")
+    index = RangeIndex(str(csv_path), str(tmp_path))
+    assert index.count == 3
+    assert index.info(ipaddress.ip_address("1.0.0.5")) == IpInfo("IT", None, None)
+    assert index.info(ipaddress.ip_address("8.8.8.8")) == IpInfo("US", 15169, "Google")
+    assert index.info(ipaddress.ip_address("2001:db8::10")).country == "DE"
+    assert index.info(ipaddress.ip_address("1.0.1.0")) is None
+
+
+def test_database_merges_fields_and_caches(tmp_path):
+    country = tmp_path / "country.csv"
+    country.write_text("1.0.0.0,1.0.0.255,IT,,\n")
+    asn = tmp_path / "asn.tsv"
+    asn.write_text("1.0.0.0\t1.0.0.255\t3269\tIT\tTelecom Italia\n")
+    database = GeoIPDatabase([str(country), str(asn)])
+    assert database.refresh()
+    info = database.lookup("1.0.0.5")
+    assert info == IpInfo("IT", 3269, "Telecom Italia")
+    assert database.lookup("1.0.0.5") is info
+    assert database.lookup("192.168.1.1") is None  # Indirizzo privato
+    assert database.stats()["hits"] == 1
+    assert not database.refresh()  # Nessun file cambiato
+    assert format_ip_info(info) == "IT · AS3269 Telecom Italia"
+
+
+def test_same_named_databases_keep_separate_indexes(tmp_path):
+    country, asn = tmp_path / "country", tmp_path / "asn"
+    country.mkdir()
+    asn.mkdir()
+    (country / "data.csv").write_text("1.0.0.0,1.0.0.255,IT,,\n")
+    (asn / "data.csv").write_text("1.0.0.0,1.0.0.255,,AS64500,Example\n")
+    index_dir = tmp_path / "index"
+    index_dir.mkdir()
+
+    address = ipaddress.ip_address("1.0.0.5")
+    assert RangeIndex(str(country / "data.csv"), str(index_dir)).info(address).country == "IT"
+    assert RangeIndex(str(asn / "data.csv"), str(index_dir)).info(address).asn == 64500
+    # Riaperti dopo l'altro: ognuno ritrova il proprio indice
+    assert RangeIndex(str(country / "data.csv"), str(index_dir)).info(address).country == "IT"
+    assert len(list(index_dir.iterdir())) == 2
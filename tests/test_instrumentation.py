@@ -0,0 +1,46 @@
+from instrumentation import Histogram, Instrumentation, Meter
+
+
+def test_histogram_quantiles_stay_within_the_bucket():
+    histogram = Histogram(bounds=(0.001, 0.01, 0.1, 1.0))
+    for _ in range(90):
+        histogram.observe(0.005)
+    for _ in range(10):
+        histogram.observe(0.5)
+    stats = histogram.to_dict()
+    assert stats["count"] == 100
+    assert 0.001 <= stats["p50"] <= 0.01
+    assert 0.1 <= stats["p99"] <= 0.5
+    assert stats["max"] == 0.5
+
+
+def test_histogram_overflow_is_bounded_by_max():
+    histogram = Histogram(bounds=(0.1,))
+    histogram.observe(3.0)
+    assert histogram.to_dict()["overflow"] == 1
+    # Nel bucket oltre il limite l'interpolazione arriva al massimo osservato
+    assert 0.1 < histogram.quantile(0.99) < 3.0
+    assert histogram.quantile(1.0) == 3.0
+
+
+def test_meter_rate_covers_the_last_minute():
+    meter = Meter()
+    meter.mark(60, now=100.0)
+    assert meter.rate(now=100.5) == 1.0
+    meter.mark(30, now=130.0)
+    assert meter.rate(now=130.0) == 1.5
+    # Dopo un minuto il primo intervallo esce dalla finestra
+    assert meter.rate(now=160.0) == 0.5
+    assert meter.total == 90
+
+
+def test_snapshot_reads_gauges_and_survives_errors():
+    instruments = Instrumentation()
+    with instruments.timer("check.cpu"):
+        pass
+    instruments.gauge("coda", lambda: 3)
+    instruments.gauge("rotto", lambda: 1 / 0)
+    snapshot = instruments.snapshot()
+    assert snapshot["histograms"]["check.cpu"]["count"] == 1
+    assert snapshot["gauges"] == {"coda": 3, "rotto": None}
+    assert snapshot["process"]["rss"] > 0
@@ -0,0 +1,27 @@
+import ipaddress
+
+from ip_filter import IPRangeMatcher
+
+
+def test_overlapping_and_adjacent_ranges_are_merged():
+    matcher = IPRangeMatcher(["10.0.0.0/25", "10.0.0.128/25", "10.0.0.64/26", "192.0.2.1"])
+    assert len(matcher) == 2
+    assert "10.0.0.200" in matcher
+    assert "10.0.1.0" not in matcher
+    assert "192.0.2.1" in matcher
+    assert "192.0.2.2" not in matcher
+
+
+def test_ipv6_and_ipv4_mapped_addresses():
+    matcher = IPRangeMatcher(["2001:db8::/32", "192.168.0.0/16"])
+    assert "2001:db8:1::5" in matcher
+    assert "2001:db9::1" not in matcher
+    # sshd registra a volte gli IPv4 come ::ffff:a.b.c.d
+    assert matcher.contains_address(ipaddress.ip_address("::ffff:192.168.4.4"))
+
+
+def test_invalid_entries_are_skipped():
+    matcher = IPRangeMatcher(["10.0.0.0/8", "non-un-ip", " ", "300.1.1.1"])
+    assert matcher.invalid == ["non-un-ip", "300.1.1.1"]
+    assert len(matcher) == 1
+    assert "10.1.2.3" in matcher
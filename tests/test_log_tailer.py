@@ -0,0 +1,81 @@
+import os
+
+from log_tailer import LogTailer
+from state_store import StateStore
+
+
+def read(tailer):
+    return [line for batch in tailer.read_batches() for line in batch]
+
+
+def append(path, text):
+    with open(path, "a") as f:
+        f.write(text)
+
+
+def test_reads_only_complete_new_lines(tmp_path):
+    log = tmp_path / "auth.log"
+    log.write_text("uno\ndu")
+    tailer = LogTailer(str(log), chunk_size=4)
+    assert read(tailer) == [b"uno"]
+    append(log, "e\ntre\n")
+    assert read(tailer) == [b"due", b"tre"]
+    assert read(tailer) == []
+
+
+def test_rotation_drains_old_file_before_switching(tmp_path):
+    log = tmp_path / "auth.log"
+    log.write_text("uno\n")
+    tailer = LogTailer(str(log))
+    assert read(tailer) == [b"uno"]
+    # Righe scritte nel vecchio file subito prima della rotazione (senza copytruncate)
+    append(log, "due\n")
+    os.rename(log, str(log) + ".1")
+    log.write_text("tre\n")
+    assert read(tailer) == [b"due", b"tre"]
+    assert tailer.generation == 1
+
+
+def test_truncation_restarts_from_the_beginning(tmp_path):
+    log = tmp_path / "auth.log"
+    log.write_text("una riga piuttosto lunga\n")
+    tailer = LogTailer(str(log))
+    assert read(tailer) == [b"una riga piuttosto lunga"]
+    # copytruncate: stesso inode, file piu' corto della posizione salvata
+    with open(log, "r+") as f:
+        f.truncate(0)
+    append(log, "nuova\n")
+    assert read(tailer) == [b"nuova"]
+
+
+def test_restore_from_rotated_file_after_restart(tmp_path):
+    log = tmp_path / "auth.log"
+    store = StateStore(str(tmp_path / "state.db"))
+    log.write_text("uno\n")
+    assert read(LogTailer(str(log), store=store)) == [b"uno"]
+
+    # Mentre il monitor e' fermo: nuove righe, rotazione e nuovo file
+    append(log, "due\n")
+    os.rename(log, str(log) + ".1")
+    log.write_text("tre\n")
+    assert read(LogTailer(str(log), store=store)) == [b"due", b"tre"]
+
+
+def test_restore_without_rotated_file_restarts_current_log(tmp_path):
+    log = tmp_path / "auth.log"
+    store = StateStore(str(tmp_path / "state.db"))
+    log.write_text("uno\n")
+    assert read(LogTailer(str(log), store=store)) == [b"uno"]
+    os.rename(log, str(log) + ".2")  # Non tra i suffissi cercati
+    log.write_text("due\n")
+    tailer = LogTailer(str(log), store=store)
+    assert read(tailer) == [b"due"]
+    assert tailer.generation == 1
+
+
+def test_legacy_state_file_is_migrated(tmp_path):
+    log = tmp_path / "auth.log"
+    log.write_text("uno\ndue\n")
+    state_file = tmp_path / "last_log_position.txt"
+    state_file.write_text("4")  # Vecchio formato: solo l'offset
+    assert read(LogTailer(str(log), str(state_file))) == [b"due"]
@@ -0,0 +1,67 @@
+import threading
+
+import pytest
+
+import log_watcher
+from log_watcher import LogWatcher
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def mode(request, monkeypatch):
+    if request.param == "polling":
+        monkeypatch.setattr(log_watcher, "create_inotify", lambda: None)
+    return request.param
+
+
+def test_callback_runs_at_start_and_on_each_write(tmp_path, mode):
+    log = tmp_path / "auth.log"
+    log.write_text("")
+    calls = []
+    changed = threading.Event()
+
+    def callback():
+        calls.append(1)
+        changed.set()
+
+    watcher = LogWatcher(str(log), callback, min_interval=0.01, max_interval=0.05)
+    watcher.start()
+    try:
+        assert changed.wait(5)  # Elaborazione iniziale
+        changed.clear()
+        # Un file vicino non deve svegliare il lettore; la scrittura del log si'
+        (tmp_path / "syslog").write_text("rumore\n")
+        with open(log, "a") as f:
+            f.write("riga\n")
+        assert changed.wait(5)
+        assert len(calls) >= 2
+    finally:
+        watcher.stop()
+
+
+def test_callback_errors_do_not_stop_the_watcher(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_watcher, "create_inotify", lambda: None)
+    log = tmp_path / "auth.log"
+    log.write_text("")
+    calls = []
+
+    def callback():
+        calls.append(1)
+        if len(calls) == 1:
+            raise OSError("disco non disponibile")
+
+    watcher = LogWatcher(str(log), callback, min_interval=0.01, max_interval=0.02)
+    watcher.start()
+    try:
+        deadline = threading.Event()
+        for _ in range(500):
+            if calls:
+                break
+            deadline.wait(0.01)
+        log.write_text("riga\n")
+        for _ in range(500):
+            if len(calls) >= 2:
+                break
+            deadline.wait(0.01)
+        assert len(calls) >= 2
+    finally:
+        watcher.stop()
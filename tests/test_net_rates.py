@@ -0,0 +1,52 @@
+import math
+from types import SimpleNamespace
+
+import pytest
+
+from net_rates import NetRateEngine, counter_delta, format_rate
+
+
+def counters(recv, sent=0, packets_recv=0, packets_sent=0):
+    return SimpleNamespace(bytes_recv=recv, bytes_sent=sent, packets_recv=packets_recv, packets_sent=packets_sent)
+
+
+def test_counter_delta_handles_wraparound_and_reset():
+    assert counter_delta(100, 250) == 150
+    assert counter_delta(2 ** 32 - 10, 5) == 15
+    assert counter_delta(2 ** 64 - 10, 5) == 15
+    assert counter_delta(1000, 10) is None  # Azzeramento, non un wrap
+    assert counter_delta(2 ** 32 - 10, 5, max_rate_delta=10) is None
+
+
+def test_rates_are_smoothed_over_time():
+    engine = NetRateEngine(tau=10)
+    assert engine.update({"eth0": counters(0)}, 0.0) == {}
+    first = engine.update({"eth0": counters(1000)}, 1.0)["eth0"]
+    assert first.rx_bytes == 1000
+    second = engine.update({"eth0": counters(1000)}, 11.0)["eth0"]
+    # Dopo un intervallo pari a tau il valore si avvicina allo 0 di 1 - 1/e
+    assert second.rx_bytes == pytest.approx(1000 * math.exp(-1))
+
+
+def test_reset_keeps_previous_rate_and_vanished_nics_are_forgotten():
+    engine = NetRateEngine()
+    engine.update({"eth0": counters(0), "veth1": counters(0)}, 0.0)
+    engine.update({"eth0": counters(500), "veth1": counters(100)}, 1.0)
+    rates = engine.update({"eth0": counters(10)}, 2.0)  # eth0 ricreata, veth1 rimossa
+    assert set(rates) == {"eth0"}
+    assert rates["eth0"].rx_bytes == 500
+    assert rates == engine.update({"eth0": counters(10)}, 2.0)  # Istante ripetuto: nessun calcolo
+
+
+def test_aggregate_excludes_loopback():
+    engine = NetRateEngine()
+    engine.update({"lo": counters(0), "eth0": counters(0, 0), "eth1": counters(0, 0)}, 0.0)
+    engine.update({"lo": counters(10 ** 6), "eth0": counters(100, 50), "eth1": counters(200, 25)}, 1.0)
+    total = engine.aggregate()
+    assert (total.rx_bytes, total.tx_bytes) == (300, 75)
+
+
+def test_format_rate_units():
+    assert format_rate(512) == "512.0 B/s"
+    assert format_rate(1536) == "1.5 KB/s"
+    assert format_rate(3 * 1024 ** 3) == "3.0 GB/s"
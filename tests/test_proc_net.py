@@ -0,0 +1,45 @@
+import socket
+
+import pytest
+
+from proc_net import count_sockets_netlink, count_sockets_procfs
+
+TCP = """\
+  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode
+   0: 0100007F:0016 00000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 1 1 0000000000000000
+   1: 0100007F:1F90 00000000:0000 0A 00000000:00000000 00:00000000 00000000     0        0 2 1 0000000000000000
+   2: 0100007F:0016 0200007F:C350 01 00000000:00000000 00:00000000 00000000     0        0 3 1 0000000000000000
+   3: 0100007F:0016 0200007F:C351 06 00000000:00000000 00:00000000 00000000     0        0 0 1 0000000000000000
+"""
+UDP = """\
+  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode ref pointer drops
+  10: 00000000:0035 00000000:0000 07 00000000:00000000 00:00000000 00000000     0        0 4 2 0000000000000000 0
+  11: 0100007F:A000 0800080A:0035 01 00000000:00000000 00:00000000 00000000     0        0 5 2 0000000000000000 0
+"""
+
+
+@pytest.mark.parametrize("chunk_size", [7, 1024 * 1024])
+def test_counts_states_and_listening_ports(tmp_path, chunk_size):
+    (tmp_path / "net").mkdir()
+    (tmp_path / "net" / "tcp").write_text(TCP)
+    (tmp_path / "net" / "udp").write_text(UDP)
+    summary = count_sockets_procfs(str(tmp_path), chunk_size=chunk_size)
+    assert summary.states == {"LISTEN": 2, "ESTABLISHED": 2, "TIME_WAIT": 1, "UNCONN": 1}
+    assert summary.listen_ports == {("tcp", 22): 1, ("tcp", 8080): 1, ("udp", 53): 1}
+    assert summary.per_protocol == {"tcp": 4, "udp": 2}  # tcp6 e udp6 mancanti: ignorati
+
+
+def test_real_listening_socket_is_seen():
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    port = server.getsockname()[1]
+    try:
+        assert count_sockets_procfs("/proc").listen_ports[("tcp", port)] == 1
+        try:
+            netlink = count_sockets_netlink()
+        except OSError as e:
+            pytest.skip(f"sock_diag non disponibile: {e}")
+        assert netlink.listen_ports[("tcp", port)] == 1
+    finally:
+        server.close()
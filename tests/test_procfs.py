@@ -0,0 +1,68 @@
+import psutil
+
+from procfs import ProcFile, ProcfsBackend
+
+MEMINFO = """\
+MemTotal:        1000000 kB
+MemFree:          200000 kB
+MemAvailable:     600000 kB
+Buffers:           50000 kB
+Cached:           250000 kB
+SwapTotal:        100000 kB
+SwapFree:          75000 kB
+"""
+NET_DEV = """\
+Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo:     500       5    0    0    0     0          0         0      500       5    0    0    0     0       0          0
+  eth0:    1000      10    1    2    0     0          0         0     2000      20    3    4    0     0       0          0
+"""
+
+
+def fake_proc(tmp_path, stat="cpu  100 0 100 800 0 0 0 0 0 0\n"):
+    (tmp_path / "net").mkdir(exist_ok=True)
+    (tmp_path / "stat").write_text(stat)
+    (tmp_path / "meminfo").write_text(MEMINFO)
+    (tmp_path / "loadavg").write_text("0.50 0.25 0.10 1/100 1234\n")
+    (tmp_path / "uptime").write_text("3600.50 7000.00\n")
+    (tmp_path / "net" / "dev").write_text(NET_DEV)
+    return str(tmp_path)
+
+
+def test_sample_parses_proc_files(tmp_path):
+    backend = ProcfsBackend(fake_proc(tmp_path))
+    sample = backend.sample()
+    assert sample.memory.total == 1000000 * 1024
+    assert sample.memory.available == 600000 * 1024
+    assert sample.memory.percent == 40.0
+    assert (sample.swap.used, sample.swap.percent) == (25000 * 1024, 25.0)
+    assert sample.load_avg == (0.5, 0.25, 0.1)
+    assert sample.uptime == 3600.5
+    eth0 = sample.net_per_nic["eth0"]
+    assert (eth0.bytes_recv, eth0.bytes_sent, eth0.packets_recv, eth0.errout, eth0.dropin) == (1000, 2000, 10, 3, 2)
+    assert sample.net.bytes_recv == 1500
+
+
+def test_cpu_percent_is_the_delta_between_samples(tmp_path):
+    backend = ProcfsBackend(fake_proc(tmp_path))
+    assert backend.sample().cpu_percent == 0.0  # Nessun riferimento alla prima lettura
+    # Stesso file (stesso descrittore), contenuto aggiornato: 100 tick occupati su 400
+    (tmp_path / "stat").write_text("cpu  150 0 150 1100 0 0 0 0 0 0\n")
+    assert backend.sample().cpu_percent == 25.0
+
+
+def test_proc_file_grows_its_buffer(tmp_path):
+    path = tmp_path / "big"
+    path.write_bytes(b"x" * 100)
+    proc_file = ProcFile(str(path), size=8)
+    assert proc_file.read() == b"x" * 100
+    assert proc_file.size == 128
+    path.write_bytes(b"breve")
+    assert proc_file.read() == b"breve"
+    proc_file.close()
+
+
+def test_real_proc_matches_psutil():
+    sample = ProcfsBackend("/proc").sample()
+    assert sample.memory.total == psutil.virtual_memory().total
+    assert set(sample.net_per_nic) == set(psutil.net_io_counters(pernic=True))
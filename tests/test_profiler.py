@@ -0,0 +1,39 @@
+import threading
+import time
+
+from profiler import SamplingProfiler
+
+
+def busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profile_writes_collapsed_stacks(tmp_path):
+    stop = threading.Event()
+    worker = threading.Thread(target=busy, args=(stop,), name="lavoro")
+    worker.start()
+    profiler = SamplingProfiler(str(tmp_path), interval=0.005)
+    try:
+        assert profiler.start(1)
+        assert not profiler.start(1)  # Una sola profilazione alla volta
+        deadline = time.monotonic() + 10
+        while profiler.running and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        worker.join()
+    assert not profiler.running
+    assert profiler.samples > 0
+    lines = open(profiler.last_file).read().splitlines()
+    assert any(line.startswith("lavoro;") and "test_profiler:busy" in line for line in lines)
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+
+def test_only_the_newest_files_are_kept(tmp_path):
+    for i in range(5):
+        (tmp_path / f"server_monitor-2026010{i}-000000.folded").write_text("")
+    profiler = SamplingProfiler(str(tmp_path), max_files=2)
+    profiler._cleanup()
+    assert profiler.files() == ["server_monitor-20260104-000000.folded", "server_monitor-20260103-000000.folded"]
@@ -0,0 +1,55 @@
+import threading
+import time
+
+from sampler import ResourceSampler
+
+
+def test_snapshot_fields_are_plausible():
+    snapshot = ResourceSampler().sample()
+    assert 0 <= snapshot.cpu_percent <= 100
+    assert snapshot.memory.total > 0
+    assert 0 <= snapshot.memory.percent <= 100
+    assert snapshot.net_per_nic
+
+
+def test_get_reuses_fresh_snapshot():
+    sampler = ResourceSampler()
+    first = sampler.get()
+    assert sampler.get(max_age=60) is first
+    assert sampler.get() is first
+
+
+def test_stale_snapshot_is_resampled_once_for_concurrent_readers():
+    sampler = ResourceSampler()
+    sampler.sample()
+    sampler._snapshot = sampler._snapshot._replace(monotonic=time.monotonic() - 60)
+    samples = []
+    original = sampler._sample_locked
+
+    def counting():
+        samples.append(1)
+        time.sleep(0.05)  # Le altre richieste arrivano mentre il campionamento e' in corso
+        return original()
+
+    sampler._sample_locked = counting
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(sampler.get(max_age=30))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(samples) == 1
+    assert len({id(snapshot) for snapshot in results}) == 1
+
+
+def test_listeners_run_after_publishing_outside_the_lock():
+    sampler = ResourceSampler()
+    seen = []
+
+    def listener(snapshot):
+        # L'istantanea e' gia' pubblicata e un lettore non resta bloccato sul lock
+        seen.append((snapshot, sampler._lock.locked(), sampler.get() is snapshot))
+
+    sampler.add_listener(listener)
+    snapshot = sampler.sample()
+    assert seen == [(snapshot, False, True)]
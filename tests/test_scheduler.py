@@ -0,0 +1,53 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import CATCH_UP, COALESCE, SKIP, ScheduledTask, Scheduler
+
+
+def run_once(missed, duration):
+    """Esegue il task una volta con un orologio finto: l'esecuzione dura `duration` secondi"""
+    clock = [0.0]
+
+    def work():
+        clock[0] += duration
+
+    scheduler = Scheduler(clock=lambda: clock[0])
+    task = scheduler.add(ScheduledTask("lento", work, interval=10, jitter=0, missed=missed, max_catch_up=3))
+    scheduler._execute(task)
+    return task
+
+
+@pytest.mark.parametrize("missed, duration, next_tick, skipped", [
+    (SKIP, 35, 40, 3),      # Riparte dal prossimo turno regolare
+    (COALESCE, 55, 55, 4),  # Una sola esecuzione subito
+    (CATCH_UP, 55, 30, 2),  # Recupera solo gli ultimi tre turni (30, 40, 50)
+])
+def test_missed_runs_policies(missed, duration, next_tick, skipped):
+    task = run_once(missed, duration)
+    assert task.next_tick == next_tick
+    assert task.stats.skipped == skipped
+    assert task.stats.overruns == 1
+
+
+def test_stuck_task_times_out_without_blocking_others():
+    release = threading.Event()
+    fast_runs = []
+    scheduler = Scheduler()
+    stuck = scheduler.add(ScheduledTask("bloccato", lambda: release.wait(5), interval=0.05, jitter=0, timeout=0.1))
+    scheduler.add(ScheduledTask("veloce", lambda: fast_runs.append(1), interval=0.05, jitter=0))
+    scheduler.start()
+    try:
+        time.sleep(0.5)
+        stats = scheduler.stats()
+        assert stats["bloccato"]["timeouts"] == 1
+        assert stats["bloccato"]["runs"] == 0
+        assert stats["bloccato"]["running_for"] > 0.1
+        assert len(fast_runs) >= 5
+    finally:
+        release.set()
+    deadline = time.monotonic() + 2
+    while stuck.stats.runs == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert stuck.stats.runs == 1
@@ -0,0 +1,186 @@
+"""
+Ripristino dopo un arresto non pulito: un processo figlio scrive nello StateStore e termina con
+os._exit (niente close(), niente atexit), poi il database viene riaperto.
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+
+from alert_manager import AlertManager
+from log_tailer import LogTailer
+from state_store import StateStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_and_kill(script, **paths):
+    """Esegue `script` in un processo separato che termina senza chiudere il database"""
+    code = textwrap.dedent(script).format(**paths) + "\nos._exit(1)\n"
+    result = subprocess.run([sys.executable, "-c", "import os\n" + code], cwd=ROOT,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 1, result.stderr
+
+
+def test_cursor_survives_kill(tmp_path):
+    log = tmp_path / "auth.log"
+    log.write_text("uno\ndue\n")
+    db = tmp_path / "state.db"
+    run_and_kill("""
+        from log_tailer import LogTailer
+        from state_store import StateStore
+        store = StateStore(r"{db}", flush_interval=3600)
+        tailer = LogTailer(r"{log}", store=store)
+        assert [line for batch in tailer.read_batches() for line in batch] == [b"uno", b"due"]
+        store.flush()
+    """, db=db, log=log)
+
+    with open(log, "a") as f:
+        f.write("tre\n")
+    tailer = LogTailer(str(log), store=StateStore(str(db)))
+    assert [line for batch in tailer.read_batches() for line in batch] == [b"tre"]
+
+
+def test_unflushed_writes_are_lost_but_database_is_consistent(tmp_path):
+    db = tmp_path / "state.db"
+    run_and_kill("""
+        from state_store import StateStore
+        store = StateStore(r"{db}", flush_interval=3600)
+        store.set_cursor("auth", 1, 100)
+        store.flush()
+        store.set_cursor("auth", 1, 200)
+        store.add_login(1.0, "203.0.113.9", "root", "host")
+    """, db=db)
+
+    store = StateStore(str(db))
+    assert store.get_cursor("auth") == (1, 100, 0)
+    assert store.count_logins() == 0
+    assert store._db.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+
+
+def test_alert_state_survives_kill_without_refire(tmp_path):
+    db = tmp_path / "state.db"
+    run_and_kill("""
+        from alert_manager import AlertManager
+        from state_store import StateStore
+        store = StateStore(r"{db}", flush_interval=3600)
+        alerts = AlertManager(lambda text: None, cooldown=600, digest_window=0, store=store)
+        alerts.event(("ssh", "203.0.113.9"), "accesso")
+        alerts.check_threshold("cpu", 99, 90, "CPU alta", "CPU normale")
+        store.flush()
+    """, db=db)
+
+    sent = []
+    alerts = AlertManager(sent.append, cooldown=600, digest_window=0, store=StateStore(str(db)))
+    alerts.restore()
+    assert alerts.event(("ssh", "203.0.113.9"), "accesso") is False
+    alerts.check_threshold("cpu", 99, 90, "CPU alta", "CPU normale")
+    assert sent == []
+    # Il rientro viene comunque notificato: l'allarme era attivo prima dell'arresto
+    alerts.check_threshold("cpu", 10, 90, "CPU alta", "CPU normale")
+    assert sent == ["CPU normale"]
+
+
+def test_logins_survive_kill(tmp_path):
+    db = tmp_path / "state.db"
+    now = time.time()
+    run_and_kill("""
+        from state_store import StateStore
+        store = StateStore(r"{db}", flush_interval=3600)
+        store.add_login({now} - 60, "203.0.113.9", "root", "host", "publickey")
+        store.add_login({now} - 30, "203.0.113.9", "deploy", "host", "password")
+        store.add_login({now}, "192.168.1.5", "root", "host", "password", excluded=True)
+        store.flush()
+    """, db=db, now=now)
+
+    store = StateStore(str(db))
+    assert store.count_logins() == 3
+    assert store.count_logins(external_only=True) == 2
+    assert [row["username"] for row in store.query_logins(ip="203.0.113.9")] == ["deploy", "root"]
+    daily = store._db.execute("SELECT ip, username, count FROM login_daily ORDER BY ip, username").fetchall()
+    assert daily == [("192.168.1.5", "root", 1), ("203.0.113.9", "deploy", 1), ("203.0.113.9", "root", 1)]
+    stats = store.login_stats(since=now - 86400 * 3)
+    assert stats["top_ips"][0] == ("203.0.113.9", 2)
+
+
+def test_prune_removes_idle_alert_states(tmp_path):
+    store = StateStore(str(tmp_path / "state.db"), alert_state_retention=60)
+    old = time.time() - 3600
+    store.set_alert_state(("ssh", "203.0.113.1"), False, old, 0, None)
+    store.set_alert_state(("ssh", "203.0.113.2"), False, old, 3, "{count} accessi")
+    store.set_alert_state("cpu", True, old, 0, None)
+    store.set_alert_state(("ssh", "203.0.113.3"), False, time.time(), 0, None)
+    store.flush()
+    assert set(store.load_alert_states()) == {("ssh", "203.0.113.2"), "cpu", ("ssh", "203.0.113.3")}
+
+
+def test_idle_alert_states_are_evicted(tmp_path):
+    now = [0.0]
+    store = StateStore(str(tmp_path / "state.db"))
+    alerts = AlertManager(lambda text: None, cooldown=60, digest_window=0, clock=lambda: now[0], store=store)
+    for i in range(100):
+        alerts.event(("ssh", f"203.0.113.{i}"), "accesso")
+    alerts.check_threshold("cpu", 99, 90, "CPU alta", "CPU normale")
+    now[0] = 61
+    alerts.tick()
+    assert list(alerts.states) == ["cpu"]
+    assert list(store.load_alert_states()) == ["cpu"]
+
+
+def test_login_ip_stays_external_once_seen_from_outside(tmp_path):
+    store = StateStore(str(tmp_path / "state.db"))
+    now = time.time()
+    store.add_login(now - 20, "203.0.113.9", "root", "host")
+    store.add_login(now - 10, "203.0.113.9", "root", "host", excluded=True)
+    store.add_login(now - 20, "198.51.100.7", "root", "host", excluded=True)
+    store.flush()
+    store.add_login(now - 10, "198.51.100.7", "root", "host")
+    store.flush()
+    first_seen = store.login_stats(since=now - 3600, external_only=True)["first_seen"]
+    assert sorted(ip for ip, _ts, _count in first_seen) == ["198.51.100.7", "203.0.113.9"]
+
+
+class FailingDatabase:
+    """Connessione che fallisce una volta all'istruzione `statement` (es. database bloccato)"""
+
+    def __init__(self, db, statement):
+        self.db = db
+        self.statement = statement
+
+    def _check(self, sql):
+        if self.statement and sql.startswith(self.statement):
+            self.statement = None
+            raise sqlite3.OperationalError("database is locked")
+
+    def execute(self, sql, *args):
+        self._check(sql)
+        return self.db.execute(sql, *args)
+
+    def executemany(self, sql, rows):
+        self._check(sql)
+        return self.db.executemany(sql, rows)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+@pytest.mark.parametrize("statement", ["BEGIN", "INSERT INTO alert_history"])
+def test_failed_flush_requeues_pending_writes(tmp_path, statement):
+    store = StateStore(str(tmp_path / "state.db"))
+    store.set_cursor("auth.log", 1, 10)
+    store.add_alert("cpu", "CPU alta")
+    store._db = FailingDatabase(store._db, statement)
+    with pytest.raises(sqlite3.OperationalError, match="locked"):
+        store.flush()
+    assert not store._db.in_transaction
+    assert store.pending_count() == 2
+    store.set_cursor("auth.log", 1, 20)  # Piu' recente di quella rimessa in coda
+    store.flush()
+    store.close()
+    reopened = StateStore(str(tmp_path / "state.db"))
+    assert reopened.get_cursor("auth.log") == (1, 20, 0)
+    assert [message for _ts, _key, message in reopened.recent_alerts()] == ["CPU alta"]
@@ -0,0 +1,45 @@
+from timeseries import TimeSeriesStore
+
+T0 = 1_000_000_000.0
+
+
+def test_query_summarises_the_window_from_the_finest_tier():
+    history = TimeSeriesStore(tiers=((10, 600), (60, 3600)))
+    for step in range(0, 600, 5):
+        history.record({"cpu": step % 20}, T0 + step)
+    summary = history.query("cpu", 300, T0 + 600)
+    assert summary["resolution"] == 10
+    assert (summary["min"], summary["max"]) == (0, 15)
+    assert summary["avg"] == 7.5
+    assert all(T0 + 300 <= start < T0 + 600 for start, _avg in summary["points"])
+    assert history.query("cpu", 1800, T0 + 600)["resolution"] == 60
+    assert history.query("ram", 300, T0 + 600) is None
+
+
+def test_expired_slots_are_reused():
+    history = TimeSeriesStore(tiers=((10, 100),))
+    history.record({"cpu": 100}, T0)
+    history.record({"cpu": 1}, T0 + 100)  # Stesso slot del primo campione, dieci intervalli dopo
+    summary = history.query("cpu", 100, T0 + 105)
+    assert summary["max"] == 1
+    assert summary["points"] == [(T0 + 100, 1)]
+
+
+
+def test_series_of_removed_interfaces_expire():
+    history = TimeSeriesStore(tiers=((10, 600),))
+    for step in range(0, 300, 10):
+        history.record({"cpu": 1, "net_rx:veth1": 5}, T0 + step)
+    for step in range(300, 1000, 10):
+        history.record({"cpu": 1}, T0 + step)
+    assert history.series() == ["cpu"]
+
+
+def test_series_are_capped_without_evicting_active_ones():
+    history = TimeSeriesStore(tiers=((60, 86400),), max_series=4)
+    for step in range(0, 3600, 10):
+        history.record({"cpu": 1, "ram": 2, f"net_rx:veth{step // 600}": 3}, T0 + step)
+    series = history.series()
+    assert len(series) == 4
+    assert {"cpu", "ram", "net_rx:veth5"} <= set(series)
+    assert history.query("cpu", 3600, T0 + 3600)["avg"] == 1
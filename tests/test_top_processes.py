@@ -0,0 +1,108 @@
+import contextlib
+from types import SimpleNamespace
+
+from top_processes import TopProcessEngine
+
+
+class FakeProcess:
+    def __init__(self, pid, name, create_time, cpu, rss, fds=3, io=0):
+        self.pid = pid
+        self._name = name
+        self._create_time = create_time
+        self.cpu = cpu
+        self.rss = rss
+        self.fds = fds
+        self.io = io
+
+    def oneshot(self):
+        return contextlib.nullcontext()
+
+    def create_time(self):
+        return self._create_time
+
+    def cpu_times(self):
+        return SimpleNamespace(user=self.cpu, system=0.0)
+
+    def io_counters(self):
+        return SimpleNamespace(read_bytes=self.io, write_bytes=0)
+
+    def memory_info(self):
+        return SimpleNamespace(rss=self.rss)
+
+    def num_fds(self):
+        return self.fds
+
+    def name(self):
+        return self._name
+
+    def username(self):
+        return "root"
+
+
+class FakeSystem:
+    """Tabella dei processi e orologio controllati dal test; conta le scansioni"""
+
+    def __init__(self, processes):
+        self.processes = {p.pid: p for p in processes}
+        self.sweeps = 0
+        self.now = 100.0
+
+    def process_iter(self):
+        self.sweeps += 1
+        return list(self.processes.values())
+
+    def clock(self):
+        return self.now
+
+
+def engine(system):
+    return TopProcessEngine(sample_interval=0.01, reuse_window=30, process_iter=system.process_iter,
+                            clock=system.clock)
+
+
+def test_cold_ranking_takes_two_sweeps():
+    system = FakeSystem([FakeProcess(1, "init", 1.0, 10.0, 100), FakeProcess(2, "busy", 2.0, 20.0, 200)])
+    top = engine(system)
+    original = system.process_iter
+
+    def advancing():
+        processes = original()
+        if system.sweeps == 2:
+            # Secondo passaggio: un secondo dopo, "busy" ha usato mezzo secondo di CPU
+            system.now += 1
+            system.processes[2].cpu += 0.5
+        return processes
+
+    top.process_iter = advancing
+    rows = top.top(limit=1)
+    assert system.sweeps == 2
+    assert [(row.name, round(row.cpu_percent)) for row in rows] == [("busy", 50)]
+
+
+def test_recent_sweep_is_reused_without_sleeping():
+    system = FakeSystem([FakeProcess(1, "init", 1.0, 10.0, 100), FakeProcess(2, "busy", 2.0, 20.0, 200)])
+    top = engine(system)
+    top.top()
+    system.now += 10
+    system.processes[1].cpu += 5.0
+    rows = top.top(limit=2)
+    assert system.sweeps == 3  # Una sola scansione nuova
+    assert [(row.name, round(row.cpu_percent)) for row in rows] == [("init", 50), ("busy", 0)]
+
+
+def test_reused_pid_is_not_charged_with_old_cpu_time():
+    system = FakeSystem([FakeProcess(7, "old", 1.0, 50.0, 100)])
+    top = engine(system)
+    top.top()
+    system.now += 5
+    system.processes[7] = FakeProcess(7, "new", 3.0, 1.0, 100)
+    [row] = top.top()
+    assert (row.name, row.cpu_percent) == ("new", 0.0)
+
+
+def test_sort_by_memory_and_file_descriptors():
+    system = FakeSystem([FakeProcess(1, "small", 1.0, 0.0, 100, fds=50),
+                         FakeProcess(2, "large", 1.0, 0.0, 900, fds=5)])
+    top = engine(system)
+    assert [row.name for row in top.top(sort_by="rss")] == ["large", "small"]
+    assert [row.name for row in top.top(sort_by="fds")] == ["small", "large"]
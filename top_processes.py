@@ -0,0 +1,132 @@
+import heapq
+import threading
+import time
+from collections import namedtuple
+from operator import attrgetter
+
+import psutil
+
+ProcessRow = namedtuple("ProcessRow", ["pid", "name", "username", "cpu_percent", "memory_percent",
+                                       "rss", "io_rate", "num_fds"])
+
+SORT_KEYS = {
+    "cpu": "cpu_percent",
+    "rss": "rss",
+    "io": "io_rate",
+    "fds": "num_fds",
+}
+
+SORT_LABELS = {"cpu": "CPU", "rss": "RAM", "io": "IO", "fds": "FD"}
+
+_ACCESS_ERRORS = (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess)
+
+
+class TopProcessEngine:
+    """
+    Classifica dei processi con una sola attesa, indipendente dal numero di processi.
+
+    Invece di chiamare cpu_percent(interval=0.1) per ogni processo, acquisisce in un'unica
+    scansione i tempi CPU (e i contatori IO) di tutti i processi, attende una volta, ripete la
+    scansione e calcola le differenze. Se una scansione recente e' ancora valida viene usata
+    come primo passaggio e l'attesa viene saltata. I primi N sono selezionati con un heap.
+    Nome e utente, che non cambiano durante la vita del processo, sono memorizzati per
+    (pid, create_time).
+    """
+
+    def __init__(self, sample_interval=0.5, reuse_window=30.0, process_iter=psutil.process_iter,
+                 clock=time.monotonic):
+        self.sample_interval = sample_interval
+        self.reuse_window = reuse_window
+        self.process_iter = process_iter
+        self.clock = clock
+        self._static = {}
+        self._last_sweep = None  # (istante, scansione, con contatori IO)
+        self.last = None  # (istante, righe) dell'ultima classifica, per le metriche esportate
+        self._lock = threading.Lock()
+
+    def _static_info(self, proc, key):
+        info = self._static.get(key)
+        if info is None:
+            try:
+                name = proc.name()
+            except _ACCESS_ERRORS:
+                name = "?"
+            try:
+                username = proc.username()
+            except (_ACCESS_ERRORS + (KeyError,)):
+                username = "?"
+            info = self._static[key] = (name, username)
+        return info
+
+    def _sweep(self, with_io, detailed):
+        """Una scansione di tutti i processi: {pid: (create_time, cpu, io, proc, (rss, num_fds))}"""
+        result = {}
+        for proc in self.process_iter():
+            try:
+                with proc.oneshot():
+                    create_time = proc.create_time()
+                    times = proc.cpu_times()
+                    io = None
+                    if with_io:
+                        try:
+                            counters = proc.io_counters()
+                            io = counters.read_bytes + counters.write_bytes
+                        except (psutil.AccessDenied, AttributeError):
+                            io = None
+                    extra = None
+                    if detailed:
+                        rss = proc.memory_info().rss
+                        try:
+                            num_fds = proc.num_fds()
+                        except (psutil.AccessDenied, AttributeError):
+                            num_fds = 0
+                        extra = (rss, num_fds)
+                result[proc.pid] = (create_time, times.user + times.system, io, proc, extra)
+            except _ACCESS_ERRORS:
+                continue
+        return result
+
+    def top(self, limit=5, sort_by="cpu"):
+        """Restituisce i primi `limit` processi (ProcessRow) ordinati per `sort_by`"""
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"Ordinamento non supportato: {sort_by}")
+        with_io = sort_by == "io"
+
+        with self._lock:
+            now = self.clock()
+            previous = self._last_sweep
+            if (previous is None or now - previous[0] > self.reuse_window
+                    or now - previous[0] < self.sample_interval / 2 or (with_io and not previous[2])):
+                first = self._sweep(with_io, detailed=False)
+                start = self.clock()
+                time.sleep(self.sample_interval)
+            else:
+                # Usa la scansione precedente come primo passaggio: nessuna attesa
+                start, first = previous[0], previous[1]
+
+            second = self._sweep(with_io, detailed=True)
+            end = self.clock()
+            self._last_sweep = (end, second, with_io)
+            elapsed = max(end - start, 1e-6)
+
+            total_memory = psutil.virtual_memory().total
+            rows = []
+            for pid, (create_time, cpu, io, proc, extra) in second.items():
+                before = first.get(pid)
+                if before is not None and before[0] == create_time:
+                    cpu_percent = max(0.0, (cpu - before[1]) / elapsed * 100)
+                    io_rate = (io - before[2]) / elapsed if io is not None and before[2] is not None else 0.0
+                else:
+                    cpu_percent = io_rate = 0.0  # Processo nato tra le due scansioni
+                rss, num_fds = extra
+                name, username = self._static_info(proc, (pid, create_time))
+                rows.append(ProcessRow(pid, name, username, cpu_percent, rss * 100 / total_memory,
+                                       rss, io_rate, num_fds))
+
+            # Rimuove dalla cache i processi terminati
+            alive = {(pid, entry[0]) for pid, entry in second.items()}
+            for key in [k for k in self._static if k not in alive]:
+                del self._static[key]
+            self.last = (end, rows)
+
+        return heapq.nlargest(limit, rows, key=attrgetter(SORT_KEYS[sort_by]))